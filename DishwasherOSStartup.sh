@@ -18,6 +18,12 @@ else
 	echo "no old logfile found"
 fi
 
+# keep only the console output of the last run, runlog.log is rotated by DishwasherOS itself
+if test -f "runlog_complete.log";
+then
+	mv runlog_complete.log runlog_complete_old.log
+fi
+
 touch runlog.log
 echo "Start RUNLOG for DishwasherOS..." >> runlog.log
 
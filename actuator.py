@@ -0,0 +1,128 @@
+"""
+Non-blocking actuator worker for timed output sequences (buzzer patterns, reset pulses).
+
+Callers submit a sequence of (pin, level, hold seconds) steps on a named channel and return
+immediately. The worker thread runs all channels on their own schedule, so the control loop never
+sleeps on an output.
+
+Submit policies per channel:
+    queue       run the sequence after the pending sequences of the channel
+    replace     cancel the running and pending sequences and start the new one
+    coalesce    drop the sequence if an identical one is running or pending
+"""
+
+import logging
+import time
+from collections import deque
+from threading import Condition, Thread
+
+
+class _Channel:
+    def __init__(self):
+        self.pending = deque()
+        self.steps = None
+        self.index = 0
+        self.time_next = 0.0
+        self.idle = ()
+
+    @property
+    def is_busy(self):
+        return self.steps is not None or len(self.pending) > 0
+
+
+class ActuatorWorker:
+    QUEUE = 'queue'
+    REPLACE = 'replace'
+    COALESCE = 'coalesce'
+
+    def __init__(self, write_output, clock=time.monotonic):
+        """
+        :param write_output: function(pin, level) which sets an output
+        """
+        self.write_output = write_output
+        self.clock = clock
+        self.module_logger = logging.getLogger('DishwasherOS.Actuator')
+        self.condition = Condition()
+        self.channels = {}
+        self.is_stopping = False
+        self.thread = Thread(target=self._target, name='ActuatorWorker', daemon=True)
+        self.thread.start()
+
+    def submit(self, channel_name, steps, policy=QUEUE, idle=()):
+        """
+        submit a timed output sequence
+        :param steps: sequence of (pin, level, hold seconds)
+        :param idle: (pin, level) outputs which are restored when the sequence gets cancelled
+        """
+        steps = tuple(steps)
+        with self.condition:
+            channel = self.channels.setdefault(channel_name, _Channel())
+            if policy == self.COALESCE and (channel.steps == steps or steps in channel.pending):
+                return
+            if policy == self.REPLACE:
+                self._cancel(channel)
+            channel.idle = tuple(idle)
+            channel.pending.append(steps)
+            self.condition.notify()
+
+    def cancel(self, channel_name):
+        """stop the running and pending sequences of a channel and restore its idle outputs"""
+        with self.condition:
+            channel = self.channels.get(channel_name)
+            if channel is not None:
+                self._cancel(channel)
+                self.condition.notify_all()
+
+    def _cancel(self, channel):
+        channel.pending.clear()
+        if channel.steps is not None:
+            channel.steps = None
+            for pin, level in channel.idle:
+                self.write_output(pin, level)
+
+    def is_busy(self, channel_name=None) -> bool:
+        with self.condition:
+            if channel_name is not None:
+                channel = self.channels.get(channel_name)
+                return channel is not None and channel.is_busy
+            return any(channel.is_busy for channel in self.channels.values())
+
+    def wait_idle(self, timeout=None) -> bool:
+        """block until all sequences are finished, only for shutdown paths"""
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: not any(channel.is_busy for channel in self.channels.values()), timeout)
+
+    def stop(self):
+        with self.condition:
+            self.is_stopping = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def _target(self):
+        with self.condition:
+            while not self.is_stopping:
+                time_now = self.clock()
+                time_next = None
+                for channel in self.channels.values():
+                    if channel.steps is None and channel.pending:
+                        channel.steps = channel.pending.popleft()
+                        channel.index = 0
+                        channel.time_next = time_now
+                    # run all due steps of the channel
+                    while channel.steps is not None and channel.time_next <= time_now:
+                        if channel.index >= len(channel.steps):
+                            channel.steps = channel.pending.popleft() if channel.pending else None
+                            channel.index = 0
+                            continue
+                        pin, level, hold = channel.steps[channel.index]
+                        try:
+                            self.write_output(pin, level)
+                        except Exception:
+                            self.module_logger.exception('unable to set output %s', pin)
+                        channel.index += 1
+                        channel.time_next = time_now + hold
+                    if channel.steps is not None and (time_next is None or channel.time_next < time_next):
+                        time_next = channel.time_next
+                self.condition.notify_all()
+                self.condition.wait(None if time_next is None else max(0.0, time_next - self.clock()))
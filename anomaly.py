@@ -0,0 +1,279 @@
+"""
+Streaming anomaly detection on the process data samples of the running program.
+
+Every telemetry tick of the running program is passed to AnomalyDetector.add_sample(), which
+works in constant time and memory per sample. Two kinds of checks run on the stream:
+
+    live checks     heater active without power draw or temperature rise (heater_failure), inlet
+                    valve open (inlet_valve_stuck) or drain pump running (drain_clogged) for longer
+                    than physically plausible, raised within one sample interval
+    step checks     at the end of a step its duration, mean power draw, heating rate and the duty
+                    of every actuator are compared with the rolling statistics of the same
+                    (program, step) of the previous runs, raised if they deviate by more than
+                    `anomaly.zScore` standard deviations (after `anomaly.minRuns` runs)
+
+The rolling statistics are exponentially weighted mean and variance, so the baselines follow slow
+changes of the machine (e.g. calcification). They are kept in `anomaly.baselines` across runs.
+
+Active alerts are published with every process data sample (`"alerts":[...]`) on the telemetry
+path: status server, websocket and backend. Live alerts are cleared when the condition is gone,
+step alerts when the next step ends.
+"""
+
+import json
+import logging
+import math
+import os
+
+from process_sample import SensorValues
+from storage import atomic_write
+
+HEATER_FAILURE = 'heater_failure'
+INLET_VALVE_STUCK = 'inlet_valve_stuck'
+DRAIN_CLOGGED = 'drain_clogged'
+STEP_DURATION = 'step_duration'
+POWER_DRAW = 'power_draw'
+HEATING_RATE = 'heating_rate'
+ACTUATOR_DUTY = 'actuator_duty'
+
+# weight of a new run in the rolling statistics once enough runs are known
+_MIN_ALPHA = 0.2
+# deviations below these absolute values are never anomalous (duration s, power W, rate K/s, duty)
+_MIN_TOLERANCE = {'duration': 10.0, 'power': 50.0, 'heating_rate': 0.005, 'duty': 0.1}
+
+
+class RollingStat:
+    __slots__ = ('n', 'mean', 'var')
+
+    def __init__(self, n=0, mean=0.0, var=0.0):
+        self.n = n
+        self.mean = mean
+        self.var = var
+
+    def update(self, value):
+        """exponentially weighted mean and variance, equally weighted for the first runs"""
+        self.n += 1
+        alpha = max(1.0 / self.n, _MIN_ALPHA)
+        delta = value - self.mean
+        self.mean += alpha * delta
+        self.var = (1 - alpha) * (self.var + alpha * delta * delta)
+
+    def deviation(self, value, z_score, min_tolerance):
+        """signed deviation of value in standard deviations, 0 if it is within the tolerance"""
+        std = math.sqrt(self.var)
+        if abs(value - self.mean) <= max(z_score * std, min_tolerance):
+            return 0.0
+        return (value - self.mean) / max(std, min_tolerance / z_score)
+
+
+class StepBaseline:
+    """rolling statistics of one (program, step) over the previous runs"""
+    __slots__ = ('duration', 'power', 'heating_rate', 'duty')
+
+    def __init__(self):
+        self.duration = RollingStat()
+        self.power = RollingStat()
+        self.heating_rate = RollingStat()
+        self.duty = {name: RollingStat() for name in SensorValues.__slots__}
+
+    def to_dict(self) -> dict:
+        stats = {'duration': self.duration, 'power': self.power, 'heating_rate': self.heating_rate}
+        stats.update({'duty_' + name: stat for name, stat in self.duty.items()})
+        return {name: [stat.n, stat.mean, stat.var] for name, stat in stats.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        baseline = cls()
+        for name, values in data.items():
+            stat = RollingStat(*values)
+            if name.startswith('duty_'):
+                baseline.duty[name[5:]] = stat
+            else:
+                setattr(baseline, name, stat)
+        return baseline
+
+
+class _StepAccumulator:
+    """statistics of the current step of the running program"""
+    __slots__ = ('program', 'step', 'is_thermo_stop', 'time_start', 'time_last', 'active_time', 'power_sum',
+                 'power_samples', 'temperature_start', 'temperature_last')
+
+    def __init__(self, program, step, is_thermo_stop, time_now, temperature):
+        self.program = program
+        self.step = step
+        self.is_thermo_stop = is_thermo_stop
+        self.time_start = time_now
+        self.time_last = time_now
+        self.active_time = dict.fromkeys(SensorValues.__slots__, 0.0)
+        self.power_sum = 0.0
+        self.power_samples = 0
+        self.temperature_start = temperature
+        self.temperature_last = temperature
+
+
+class AnomalyDetector:
+    def __init__(self, z_score=4.0, min_runs=3, heater_min_power=1000, heating_min_rate=0.01,
+                 heating_check_delay=60.0, inlet_max_duration=180.0, drain_max_duration=120.0):
+        """
+        :param heater_min_power: watts drawn at least while the heater is on
+        :param heating_min_rate: degrees celsius per second the water heats at least while the heater is on
+        :param heating_check_delay: seconds of heating before the heater is checked
+        :param inlet_max_duration: seconds the inlet valve is open at most without interruption
+        :param drain_max_duration: seconds the drain pump runs at most without interruption
+        """
+        self.module_logger = logging.getLogger('DishwasherOS.Anomaly')
+        self.z_score = z_score
+        self.min_runs = min_runs
+        self.heater_min_power = heater_min_power
+        self.heating_min_rate = heating_min_rate
+        self.heating_check_delay = heating_check_delay
+        self.inlet_max_duration = inlet_max_duration
+        self.drain_max_duration = drain_max_duration
+        # (program, step) => StepBaseline
+        self.baselines = {}
+        self.step = None
+        # actuator name => time since which it is active without interruption
+        self.active_since = {}
+        self.temperature_heating_start = None
+        # alert kind => message, replaced as a whole on every change
+        self.live_alerts = {}
+        self.step_alerts = {}
+        self.alerts = ()
+
+    @classmethod
+    def from_config(cls, swconfig):
+        return cls(swconfig.anomaly_z_score, swconfig.anomaly_min_runs, swconfig.anomaly_heater_min_power,
+                   swconfig.anomaly_heating_min_rate, swconfig.anomaly_heating_check_delay,
+                   swconfig.anomaly_inlet_max_duration, swconfig.anomaly_drain_max_duration)
+
+    def load_baselines(self, file_path):
+        if not file_path or not os.path.exists(file_path):
+            return
+        try:
+            with open(file_path, 'r') as fd:
+                data = json.load(fd)
+            self.baselines = {tuple(int(i) for i in key.split(':')): StepBaseline.from_dict(values)
+                              for key, values in data.items()}
+        except (OSError, ValueError, TypeError) as e:
+            self.module_logger.warning('unable to load the anomaly baselines %s: %s', file_path, e)
+
+    def save_baselines(self, file_path):
+        if not file_path:
+            return
+        data = {'{}:{}'.format(*key): baseline.to_dict() for key, baseline in sorted(self.baselines.items())}
+        atomic_write(file_path, json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+    def add_sample(self, time_now, snapshot, temperature, apower, sensor_values: SensorValues) -> tuple:
+        """
+        add a sample of the running program, returns the kinds of the active alerts
+        :param time_now: monotonic time of the sample
+        :param apower: power draw in watts or None without electricity meter
+        """
+        step = self.step
+        if step is not None:
+            # the interval since the last sample belongs to the step and actuator states of the last sample
+            interval = time_now - step.time_last
+            for name in self.active_since:
+                step.active_time[name] += interval
+            step.time_last = time_now
+            step.temperature_last = temperature
+        if step is None or step.step != snapshot.step_operational or step.program != snapshot.selected_program:
+            if step is not None:
+                self._finish_step(step, time_now)
+            step = self.step = _StepAccumulator(snapshot.selected_program, snapshot.step_operational,
+                                                snapshot.is_thermo_stop, time_now, temperature)
+        if apower is not None:
+            step.power_sum += apower
+            step.power_samples += 1
+
+        for name in SensorValues.__slots__:
+            if getattr(sensor_values, name):
+                self.active_since.setdefault(name, time_now)
+            else:
+                self.active_since.pop(name, None)
+        self._check_live(time_now, temperature, apower)
+        return self.alerts
+
+    def _check_live(self, time_now, temperature, apower):
+        alerts = {}
+        heating_since = self.active_since.get('heating')
+        if heating_since is None:
+            self.temperature_heating_start = None
+        elif self.temperature_heating_start is None:
+            self.temperature_heating_start = temperature
+        elif time_now - heating_since >= self.heating_check_delay:
+            heating_rate = (temperature - self.temperature_heating_start) / (time_now - heating_since)
+            if apower is not None and apower < self.heater_min_power:
+                alerts[HEATER_FAILURE] = 'heater on, but only {} W power draw'.format(apower)
+            elif heating_rate < self.heating_min_rate:
+                alerts[HEATER_FAILURE] = 'heater on for {:.0f}s, but the water heats with {:.3f} K/s only'.format(
+                    time_now - heating_since, heating_rate)
+        inlet_since = self.active_since.get('valve_inlet')
+        if inlet_since is not None and time_now - inlet_since > self.inlet_max_duration:
+            alerts[INLET_VALVE_STUCK] = 'inlet valve open for {:.0f}s'.format(time_now - inlet_since)
+        drain_since = self.active_since.get('pump_drain')
+        if drain_since is not None and time_now - drain_since > self.drain_max_duration:
+            alerts[DRAIN_CLOGGED] = 'drain pump running for {:.0f}s'.format(time_now - drain_since)
+        if alerts.keys() != self.live_alerts.keys():
+            self._log_changes(self.live_alerts, alerts)
+            self.live_alerts = alerts
+            self._publish()
+
+    def _finish_step(self, step, time_now):
+        """compare the finished step with its baseline, then add it to the baseline"""
+        duration = time_now - step.time_start
+        if duration <= 0:
+            return
+        values = {'duration': duration}
+        if step.power_samples:
+            values['power'] = step.power_sum / step.power_samples
+        if step.is_thermo_stop:
+            values['heating_rate'] = (step.temperature_last - step.temperature_start) / duration
+        duties = {name: active_time / duration for name, active_time in step.active_time.items()}
+
+        baseline = self.baselines.get((step.program, step.step))
+        if baseline is None:
+            baseline = self.baselines[(step.program, step.step)] = StepBaseline()
+        alerts = {}
+        if baseline.duration.n >= self.min_runs:
+            kinds = {'duration': STEP_DURATION, 'power': POWER_DRAW, 'heating_rate': HEATING_RATE}
+            for name, value in values.items():
+                stat = getattr(baseline, name)
+                deviation = stat.deviation(value, self.z_score, _MIN_TOLERANCE[name])
+                if stat.n >= self.min_runs and deviation:
+                    alerts[kinds[name]] = 'step {} {} {:.3g} (mean {:.3g}, {:+.1f} sigma)'.format(
+                        step.step, name, value, stat.mean, deviation)
+            for name, duty in duties.items():
+                deviation = baseline.duty[name].deviation(duty, self.z_score, _MIN_TOLERANCE['duty'])
+                if deviation:
+                    alerts[ACTUATOR_DUTY] = 'step {} {} duty {:.2f} (mean {:.2f}, {:+.1f} sigma)'.format(
+                        step.step, name, duty, baseline.duty[name].mean, deviation)
+        for name, value in values.items():
+            getattr(baseline, name).update(value)
+        for name, duty in duties.items():
+            baseline.duty[name].update(duty)
+        if alerts or self.step_alerts:
+            self._log_changes(self.step_alerts, alerts)
+            self.step_alerts = alerts
+            self._publish()
+
+    def finish_run(self, time_now):
+        """close the last step at the end of the program"""
+        if self.step is not None:
+            self._finish_step(self.step, time_now)
+            self.step = None
+        self.active_since = {}
+        self.live_alerts = {}
+        self.step_alerts = {}
+        self._publish()
+
+    def _log_changes(self, old_alerts, new_alerts):
+        for kind, message in new_alerts.items():
+            if kind not in old_alerts:
+                self.module_logger.warning('anomaly %s: %s', kind, message)
+        for kind in old_alerts:
+            if kind not in new_alerts:
+                self.module_logger.info('anomaly %s cleared', kind)
+
+    def _publish(self):
+        self.alerts = tuple(sorted(set(self.live_alerts) | set(self.step_alerts)))
@@ -0,0 +1,120 @@
+"""
+tracemalloc benchmark for the process data tick.
+
+Compares the former per-tick dict construction (process_data dict, nested sensor dict, JSON body
+and serial frame) with the preallocated ProcessSample record and its encoders.
+Hardware reads are replaced by constant values, so the script runs on any machine.
+
+    python benchmark_process_sample.py [ticks]
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+
+from process_sample import ProcessSample, encode_backend_json, encode_serial_frame
+
+SESSION_ID = int(time.time())
+DEVICE_IDENTIFIER = '00:00:5e:00:53:af'
+
+
+def _read_actuator_sensor_values_dict():
+    return {
+        'pump_drain': 0,
+        'pump_circulation': 1,
+        'valve_inlet': 0,
+        'valve_outlet': 0,
+        'heating': 1
+    }
+
+
+def tick_dict(tick):
+    """process data tick as implemented before the ProcessSample record"""
+    process_data = {
+        'session_id': SESSION_ID,
+        'device_identifier': DEVICE_IDENTIFIER,
+        'program_runtime': tick,
+        'program_progress_percent': tick % 100,
+        'program_step_operational': 20,
+        'program_step_sequence': 3,
+        'program_selected_id': 6,
+        'program_estimated_runtime': 3300,
+        'program_time_start': SESSION_ID,
+        'program_time_end': None,
+        'program_time_left_step': 120,
+        'program_time_left_sequence': 600,
+        'program_time_left_program': 3300 - tick,
+        'machine_temperature': 47.5,
+        'machine_sensor_values': _read_actuator_sensor_values_dict(),
+        'machine_aenergy': 33,
+        'machine_apower': 2100
+    }
+    serial_data = "ETE{}PR{}T{}M0U{}E{}A{}H{}X".format(
+        str(int(process_data['program_time_left_program'])).zfill(4),
+        str(int(process_data['program_progress_percent'])).zfill(3),
+        str(int(process_data['machine_temperature'])).zfill(2),
+        str(int(process_data['machine_sensor_values']['pump_circulation'])),
+        str(int(process_data['machine_sensor_values']['valve_inlet'])),
+        str(int(process_data['machine_sensor_values']['valve_outlet'])),
+        str(int(process_data['machine_sensor_values']['heating']))
+    ).encode('utf-8')
+    # requests serializes the json argument with json.dumps
+    body = json.dumps(process_data).encode('utf-8')
+    return serial_data, body
+
+
+SAMPLE = ProcessSample(SESSION_ID, DEVICE_IDENTIFIER)
+
+
+def tick_sample(tick):
+    """process data tick with the preallocated ProcessSample record"""
+    sample = SAMPLE
+    sample.program_runtime = tick
+    sample.program_progress_percent = tick % 100
+    sample.program_step_operational = 20
+    sample.program_step_sequence = 3
+    sample.program_selected_id = 6
+    sample.program_estimated_runtime = 3300
+    sample.program_time_start = SESSION_ID
+    sample.program_time_end = None
+    sample.program_time_left_step = 120
+    sample.program_time_left_sequence = 600
+    sample.program_time_left_program = 3300 - tick
+    sample.machine_temperature = 47.5
+    sensor_values = sample.machine_sensor_values
+    sensor_values.pump_drain = 0
+    sensor_values.pump_circulation = 1
+    sensor_values.valve_inlet = 0
+    sensor_values.valve_outlet = 0
+    sensor_values.heating = 1
+    sample.machine_aenergy = 33
+    sample.machine_apower = 2100
+    return encode_serial_frame(sample), encode_backend_json(sample)
+
+
+def measure(tick_function, ticks):
+    """return (peak allocated bytes per tick, seconds per tick)"""
+    tick_function(0)
+    peak_total = 0
+    tracemalloc.start()
+    for tick in range(ticks):
+        tracemalloc.reset_peak()
+        current_before = tracemalloc.get_traced_memory()[0]
+        tick_function(tick)
+        peak_total += tracemalloc.get_traced_memory()[1] - current_before
+    tracemalloc.stop()
+
+    time_start = time.perf_counter()
+    for tick in range(ticks):
+        tick_function(tick)
+    duration = time.perf_counter() - time_start
+    return peak_total / ticks, duration / ticks
+
+
+if __name__ == "__main__":
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print('process data tick benchmark with {} ticks'.format(ticks))
+    for name, function in (('dict', tick_dict), ('ProcessSample', tick_sample)):
+        peak, duration = measure(function, ticks)
+        print('{:>14}: {:8.0f} B peak allocation/tick  {:6.2f} us/tick'.format(name, peak, duration * 1e6))
@@ -0,0 +1,201 @@
+"""
+Crash-safe checkpoint journal of the running program.
+
+Every state change of the running program (start, step transition, thermo-stop, end) appends one
+fixed size record to the journal file:
+
+    magic, session_id, selected_program, step_operational, step_sequence, time_start, time_end,
+    time_step_operational_start, thermostop_starttemp, estimated_runtime, aenergy_init, crc32
+
+The record is handed to the kernel with one `os.write` on the calling thread (a few microseconds,
+it survives a crash of the process), a background thread makes it durable with `fdatasync` (it
+survives a power loss shortly after). A torn last record fails its CRC and is ignored, the record
+before it is still valid. The journal is truncated at the start of the next session, so it never
+holds more than the records of one run.
+
+After a crash or power loss during a run the last record is read back at startup. If the run is
+not finished, not too old and the machine is still running according to its GPIO inputs, the
+WashingProgram and the ProcessDataProvider continue the run with the same session id and the same
+initial meter reading, so the energy of the run before the interruption is still counted.
+"""
+
+import logging
+import os
+import struct
+import time
+import zlib
+from threading import Condition, Thread
+from typing import NamedTuple
+
+_MAGIC = 0xD15E
+_RECORD = struct.Struct('<HxxqhhhxxqqdffdI')
+# time_start and time_end of a run without them
+_NO_TIME = -1
+
+
+class Checkpoint(NamedTuple):
+    session_id: int
+    selected_program: int
+    step_operational: int
+    step_sequence: int
+    time_start: int
+    time_end: int
+    time_step_operational_start: float
+    thermostop_starttemp: float
+    estimated_runtime: float
+    # energy counter of the electricity meter at the start of the run in Wh, 0 without meter
+    aenergy_init: float = 0.0
+
+    @property
+    def is_finished(self) -> bool:
+        return self.time_end is not None
+
+    def encode(self) -> bytes:
+        fields = (_MAGIC, self.session_id, self.selected_program, self.step_operational, self.step_sequence,
+                  self.time_start, _NO_TIME if self.time_end is None else self.time_end,
+                  self.time_step_operational_start, self.thermostop_starttemp, self.estimated_runtime,
+                  self.aenergy_init)
+        data = _RECORD.pack(*fields, 0)
+        return data[:-4] + struct.pack('<I', zlib.crc32(data[:-4]))
+
+    @classmethod
+    def decode(cls, data: bytes):
+        """the checkpoint of a record, None if the record is torn or corrupted"""
+        if len(data) != _RECORD.size:
+            return None
+        fields = _RECORD.unpack(data)
+        if fields[0] != _MAGIC or fields[-1] != zlib.crc32(data[:-4]):
+            return None
+        (magic, session_id, selected_program, step_operational, step_sequence, time_start, time_end,
+         time_step_operational_start, thermostop_starttemp, estimated_runtime, aenergy_init, crc) = fields
+        return cls(session_id, selected_program, step_operational, step_sequence, time_start,
+                   None if time_end == _NO_TIME else time_end, time_step_operational_start,
+                   thermostop_starttemp, estimated_runtime, aenergy_init)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, session_id, aenergy_init=0.0):
+        return cls(session_id, snapshot.selected_program, snapshot.step_operational, snapshot.step_sequence,
+                   snapshot.time_start, snapshot.time_end, snapshot.time_step_operational_start,
+                   snapshot.thermostop_starttemp, snapshot.estimated_runtime, aenergy_init)
+
+
+def read_last_checkpoint(path):
+    """the last valid record of a journal, None if there is none"""
+    try:
+        with open(path, 'rb') as fd:
+            data = fd.read()
+    except FileNotFoundError:
+        return None
+    # records are appended whole, a crash can only tear the last one
+    for end in range(len(data) - len(data) % _RECORD.size, 0, -_RECORD.size):
+        checkpoint = Checkpoint.decode(data[end - _RECORD.size:end])
+        if checkpoint is not None:
+            return checkpoint
+    return None
+
+
+class CheckpointJournal:
+    def __init__(self, path, session_id=None):
+        self.module_logger = logging.getLogger('DishwasherOS.Checkpoint')
+        self.path = path
+        self.session_id = session_id
+        # function which returns the initial meter reading of the run, set with the data provider
+        self.get_aenergy_init = None
+        self.last_checkpoint = None
+        self.fd = None
+        self.condition = Condition()
+        self.is_dirty = False
+        self.is_stopping = False
+        self.thread = Thread(target=self._target, name='CheckpointSync', daemon=True)
+        self.thread.start()
+
+    def record(self, snapshot):
+        """append a record for a changed program state, called with every new ProgramSnapshot"""
+        if snapshot.time_start is None or self.session_id is None:
+            # no running program
+            return
+        aenergy_init = self.get_aenergy_init() if self.get_aenergy_init is not None else 0.0
+        checkpoint = Checkpoint.from_snapshot(snapshot, self.session_id, aenergy_init)
+        if checkpoint == self.last_checkpoint:
+            return
+        try:
+            if self.last_checkpoint is None or self.last_checkpoint.session_id != checkpoint.session_id:
+                # a new session replaces the records of the previous run
+                self._open(truncate=True)
+            elif self.fd is None:
+                self._open(truncate=False)
+            os.write(self.fd, checkpoint.encode())
+        except OSError:
+            self.module_logger.exception('unable to write the checkpoint journal %s', self.path)
+            return
+        self.last_checkpoint = checkpoint
+        with self.condition:
+            self.is_dirty = True
+            self.condition.notify()
+
+    def resume(self, checkpoint: Checkpoint):
+        """continue the journal of a resumed session"""
+        self.session_id = checkpoint.session_id
+        self.last_checkpoint = checkpoint
+        try:
+            self._open(truncate=False)
+            # drop a torn last record, the next records stay aligned
+            size = os.fstat(self.fd).st_size
+            os.ftruncate(self.fd, size - size % _RECORD.size)
+        except OSError:
+            self.module_logger.exception('unable to open the checkpoint journal %s', self.path)
+
+    def _open(self, truncate):
+        if self.fd is not None:
+            os.close(self.fd)
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        if truncate:
+            flags |= os.O_TRUNC
+        self.fd = os.open(self.path, flags, 0o644)
+
+    def _target(self):
+        while True:
+            with self.condition:
+                while not self.is_dirty and not self.is_stopping:
+                    self.condition.wait()
+                if not self.is_dirty:
+                    return
+                self.is_dirty = False
+                fd = self.fd
+            try:
+                os.fdatasync(fd)
+            except OSError:
+                self.module_logger.exception('unable to sync the checkpoint journal %s', self.path)
+
+    def stop(self):
+        """make the written records durable and stop the sync thread"""
+        with self.condition:
+            self.is_stopping = True
+            self.condition.notify()
+        self.thread.join()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def validate_checkpoint(checkpoint: Checkpoint, machine, swconfig, clock=time.time):
+    """
+    check if an interrupted run can be resumed, returns the reason why not or None
+    The machine is considered running if one of the actuator inputs is active. Pauses of the
+    dishwasher intern program (e.g. drying) have no active actuator, a checkpoint which is younger
+    than `checkpointResumeWindow` seconds is resumed without this evidence.
+    """
+    if checkpoint.is_finished:
+        return 'the run is finished'
+    time_now = clock()
+    if time_now < checkpoint.time_start:
+        return 'the clock is behind the start of the run'
+    if checkpoint.estimated_runtime and time_now - checkpoint.time_start > 2 * checkpoint.estimated_runtime:
+        return 'the run is more than twice as old as its estimated runtime'
+    sensor_values = machine.read_actuator_sensor_values()
+    if any(getattr(sensor_values, name) for name in sensor_values.__slots__):
+        return None
+    if time_now - checkpoint.time_step_operational_start <= swconfig.checkpoint_resume_window:
+        return None
+    return 'no actuator is active and the last step started {:.0f}s ago'.format(
+        time_now - checkpoint.time_step_operational_start)
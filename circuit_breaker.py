@@ -0,0 +1,94 @@
+"""
+Circuit breaker for the remote endpoints (backend and electricity meter).
+
+closed      requests pass, consecutive failures are counted
+open        requests are rejected without any network I/O until the backoff has expired
+half_open   a single request is let through as health probe, its result closes or reopens the breaker
+
+The backoff grows exponentially with every reopening and is randomized by a jitter factor, so
+several endpoints (or devices) do not retry in lockstep.
+"""
+
+import logging
+import random
+import time
+from threading import Lock
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=3, backoff_initial=2.0, backoff_max=300.0, jitter=0.2,
+                 on_state_change=None, clock=time.monotonic):
+        self.name = name
+        self.module_logger = logging.getLogger('DishwasherOS.CircuitBreaker')
+        self.failure_threshold = failure_threshold
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.on_state_change = on_state_change
+        self.clock = clock
+        self.lock = Lock()
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.open_count = 0
+        self.time_retry = 0.0
+        # metrics
+        self.total_failures = 0
+        self.total_rejected = 0
+
+    def allow_request(self) -> bool:
+        """return True if a request may be sent, in the open state this costs no I/O at all"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() >= self.time_retry:
+                self._set_state(self.HALF_OPEN)
+                return True
+            self.total_rejected += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self.open_count = 0
+                self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.total_failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                backoff = min(self.backoff_max, self.backoff_initial * 2 ** self.open_count)
+                backoff *= random.uniform(1 - self.jitter, 1 + self.jitter)
+                self.open_count += 1
+                self.time_retry = self.clock() + backoff
+                self._set_state(self.OPEN)
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        old_state = self.state
+        self.state = state
+        if state == self.OPEN:
+            self.module_logger.warning('circuit breaker %s %s -> %s, retry in %.0fs', self.name, old_state, state,
+                                       self.time_retry - self.clock())
+        else:
+            self.module_logger.info('circuit breaker %s %s -> %s', self.name, old_state, state)
+        if self.on_state_change is not None:
+            self.on_state_change(self)
+
+    def snapshot(self) -> dict:
+        """metrics of the breaker"""
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'open_count': self.open_count,
+            'retry_in': max(0, round(self.time_retry - self.clock())) if self.state == self.OPEN else 0,
+            'total_failures': self.total_failures,
+            'total_rejected': self.total_rejected
+        }
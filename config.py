@@ -1,3 +1,5 @@
+import os
+
 import yaml
 
 
@@ -43,6 +45,54 @@ class HardwareConfig(Config):
     def get_address(self, name):
         return self._hwconfig.get('addresses').get(name)
 
+    @property
+    def onewire_sensors(self):
+        """name => address of the 1-Wire temperature sensors, the sensor 'main' is addresses.sesorTemp"""
+        sensors = {'main': self.get_address('sesorTemp')}
+        sensors.update(self._hwconfig.get('oneWire', {}).get('sensors') or {})
+        return sensors
+
+    @property
+    def onewire_resolutions(self):
+        return self._hwconfig.get('oneWire', {}).get('resolution') or {}
+
+    @property
+    def onewire_read_interval(self):
+        return self._hwconfig.get('oneWire', {}).get('readInterval', 1)
+
+    @property
+    def w1_devices_path(self):
+        return self._hwconfig.get('peripherals', {}).get('w1DevicesPath', '/sys/bus/w1/devices')
+
+    @property
+    def network_address_path(self):
+        """file with the mac address which identifies the machine"""
+        return self._hwconfig.get('peripherals', {}).get('networkAddressPath', '/sys/class/net/wlan0/address')
+
+    @property
+    def edge_trace_enabled(self):
+        return self._hwconfig.get('edgeTrace', {}).get('enabled', False)
+
+    @property
+    def edge_trace_pins(self):
+        """names of the traced inputs, the actuator inputs by default"""
+        return self._hwconfig.get('edgeTrace', {}).get('pins') or ['sensorPinMotor', 'sensorPinUmwelz',
+                                                                   'sensorPinEinlauf', 'sensorPinAblauf',
+                                                                   'sensorPinHeizen']
+
+    @property
+    def edge_trace_buffer_records(self):
+        return self._hwconfig.get('edgeTrace', {}).get('bufferRecords', 4096)
+
+    @property
+    def edge_trace_flush_interval(self):
+        return self._hwconfig.get('edgeTrace', {}).get('flushInterval', 5)
+
+    @property
+    def selector_bounce_time(self):
+        """GPIO bounce time of the program selector inputs in milliseconds"""
+        return self._hwconfig.get('selectorBounceTime', 50)
+
 
 class SoftwareConfig(Config):
 
@@ -62,6 +112,18 @@ class SoftwareConfig(Config):
     def electricity_meter_ip(self):
         return self._swconfig.get('electricityMeterIP')
 
+    @property
+    def electricity_meter_path(self):
+        return self._swconfig.get('electricityMeterPath', '/rpc/Switch.GetStatus?id=0')
+
+    @property
+    def projector_serial_port(self):
+        return self._swconfig.get('projectorSerialPort', '/dev/ttyS0')
+
+    @property
+    def projector_baudrate(self):
+        return self._swconfig.get('projectorBaudrate', 9600)
+
     @property
     def logging_directory(self):
         return self._swconfig.get('loggingDirectory')
@@ -70,6 +132,259 @@ class SoftwareConfig(Config):
     def data_repeated_timer_interval(self):
         return self._swconfig.get('sendProcessDataRepeatedTimerInterval')
 
+    @property
+    def telemetry_adaptive(self):
+        """False reports every tick to the backend and the MQTT broker, see sampling_policy.py"""
+        return self._swconfig.get('telemetry', {}).get('adaptive', True)
+
+    @property
+    def telemetry_interval_min(self):
+        return self._swconfig.get('telemetry', {}).get('intervalMin', self.data_repeated_timer_interval or 1)
+
+    @property
+    def telemetry_interval_max(self):
+        return self._swconfig.get('telemetry', {}).get('intervalMax', 15)
+
+    @property
+    def telemetry_interval_idle(self):
+        return self._swconfig.get('telemetry', {}).get('intervalIdle', 30)
+
+    @property
+    def telemetry_interval_afterrunning(self):
+        return self._swconfig.get('telemetry', {}).get('intervalAfterrunning', 10)
+
+    @property
+    def telemetry_transition_hold(self):
+        return self._swconfig.get('telemetry', {}).get('transitionHold', 10)
+
+    @property
+    def log_level(self):
+        return self._swconfig.get('logging', {}).get('level', 'DEBUG')
+
+    @property
+    def log_max_bytes(self):
+        return self._swconfig.get('logging', {}).get('maxBytes', 1048576)
+
+    @property
+    def log_backup_count(self):
+        return self._swconfig.get('logging', {}).get('backupCount', 5)
+
+    @property
+    def log_buffer_records(self):
+        return self._swconfig.get('logging', {}).get('bufferRecords', 1000)
+
+    @property
+    def log_json_format(self):
+        return self._swconfig.get('logging', {}).get('jsonFormat', False)
+
+    @property
+    def log_console(self):
+        return self._swconfig.get('logging', {}).get('console', True)
+
+    @property
+    def profiling_mode(self):
+        """None, 'sample' or 'cprofile', see profiler.py"""
+        return self._swconfig.get('profiling', {}).get('mode')
+
+    @property
+    def profiling_sample_interval(self):
+        return self._swconfig.get('profiling', {}).get('sampleInterval', 0.005)
+
+    @property
+    def profiling_report_top(self):
+        return self._swconfig.get('profiling', {}).get('reportTop', 15)
+
+    @property
+    def anomaly_enabled(self):
+        return self._swconfig.get('anomaly', {}).get('enabled', True)
+
+    @property
+    def anomaly_baselines(self):
+        """rolling step statistics of the previous runs (see anomaly.py)"""
+        return self._swconfig.get('anomaly', {}).get('baselines', os.path.join(self.logging_directory or '.', 'anomaly_baselines.json'))
+
+    @property
+    def anomaly_z_score(self):
+        return self._swconfig.get('anomaly', {}).get('zScore', 4.0)
+
+    @property
+    def anomaly_min_runs(self):
+        return self._swconfig.get('anomaly', {}).get('minRuns', 3)
+
+    @property
+    def anomaly_heater_min_power(self):
+        return self._swconfig.get('anomaly', {}).get('heaterMinPower', 1000)
+
+    @property
+    def anomaly_heating_min_rate(self):
+        return self._swconfig.get('anomaly', {}).get('heatingMinRate', 0.01)
+
+    @property
+    def anomaly_heating_check_delay(self):
+        return self._swconfig.get('anomaly', {}).get('heatingCheckDelay', 60)
+
+    @property
+    def anomaly_inlet_max_duration(self):
+        return self._swconfig.get('anomaly', {}).get('inletMaxDuration', 180)
+
+    @property
+    def anomaly_drain_max_duration(self):
+        return self._swconfig.get('anomaly', {}).get('drainMaxDuration', 120)
+
+    @property
+    def resync_signatures(self):
+        """actuator signature file learned by resync.py, None to only use the sync rules of the program definition"""
+        return self._swconfig.get('resync', {}).get('signatures')
+
+    @property
+    def resync_threshold(self):
+        return self._swconfig.get('resync', {}).get('threshold', 0.9)
+
+    @property
+    def resync_window(self):
+        return self._swconfig.get('resync', {}).get('window', 6)
+
+    @property
+    def watchdog_enabled(self):
+        return self._swconfig.get('watchdog', {}).get('enabled', True)
+
+    @property
+    def watchdog_check_interval(self):
+        return self._swconfig.get('watchdog', {}).get('checkInterval', 1.0)
+
+    @property
+    def watchdog_grace(self):
+        return self._swconfig.get('watchdog', {}).get('grace', 5.0)
+
+    @property
+    def watchdog_hardware_device(self):
+        """e.g. /dev/watchdog, None to leave the hardware watchdog alone"""
+        return self._swconfig.get('watchdog', {}).get('hardwareDevice')
+
+    @property
+    def watchdog_hardware_timeout(self):
+        return self._swconfig.get('watchdog', {}).get('hardwareTimeout', 15)
+
+    @property
+    def run_archive_directory(self):
+        """columnar archive of the finished runs (see run_archive.py, needs numpy), None to disable it"""
+        return self._swconfig.get('runArchiveDirectory')
+
+    @property
+    def checkpoint_journal(self):
+        """checkpoint journal of the running program (see checkpoint.py), None to disable the resume"""
+        return self._swconfig.get('checkpointJournal', os.path.join(self.logging_directory or '.', 'checkpoint.journal'))
+
+    @property
+    def checkpoint_resume_window(self):
+        return self._swconfig.get('checkpointResumeWindow', 900)
+
+    @property
+    def storage_sync_interval(self):
+        return self._swconfig.get('storageSyncInterval', 30)
+
+    @property
+    def storage_sync_bytes(self):
+        return self._swconfig.get('storageSyncBytes', 65536)
+
+    @property
+    def program_definition(self):
+        return self._swconfig.get('programDefinition')
+
+    @property
+    def selection_probe_settle_time(self):
+        return self._swconfig.get('selectionProbeSettleTime', 0.5)
+
+    @property
+    def selection_debounce_time(self):
+        return self._swconfig.get('selectionDebounceTime', 0.2)
+
+    @property
+    def selection_fallback_interval(self):
+        return self._swconfig.get('selectionFallbackInterval', 30)
+
+    @property
+    def request_timeout(self):
+        return self._swconfig.get('requestTimeout', 3)
+
+    @property
+    def circuit_breaker_settings(self) -> dict:
+        settings = self._swconfig.get('circuitBreaker') or {}
+        return {
+            'failure_threshold': settings.get('failureThreshold', 3),
+            'backoff_initial': settings.get('backoffInitial', 2),
+            'backoff_max': settings.get('backoffMax', 300),
+            'jitter': settings.get('jitter', 0.2)
+        }
+
+    @property
+    def mqtt_enabled(self):
+        return self._swconfig.get('mqtt', {}).get('enabled', False)
+
+    @property
+    def mqtt_host(self):
+        return self._swconfig.get('mqtt', {}).get('host', 'localhost')
+
+    @property
+    def mqtt_port(self):
+        return self._swconfig.get('mqtt', {}).get('port', 1883)
+
+    @property
+    def mqtt_username(self):
+        return self._swconfig.get('mqtt', {}).get('username')
+
+    @property
+    def mqtt_password(self):
+        return self._swconfig.get('mqtt', {}).get('password')
+
+    @property
+    def mqtt_base_topic(self):
+        return self._swconfig.get('mqtt', {}).get('baseTopic', 'dishwasheros')
+
+    @property
+    def mqtt_keepalive(self):
+        return self._swconfig.get('mqtt', {}).get('keepalive', 60)
+
+    @property
+    def mqtt_qos(self):
+        return self._swconfig.get('mqtt', {}).get('qos', 1)
+
+    @property
+    def mqtt_inflight_window(self):
+        return self._swconfig.get('mqtt', {}).get('inflightWindow', 10)
+
+    @property
+    def mqtt_per_field(self):
+        return self._swconfig.get('mqtt', {}).get('perField', False)
+
+    @property
+    def telemetry_process_enabled(self):
+        return self._swconfig.get('telemetryProcess', {}).get('enabled', False)
+
+    @property
+    def telemetry_process_ring_slots(self):
+        return self._swconfig.get('telemetryProcess', {}).get('ringSlots', 256)
+
+    @property
+    def telemetry_process_poll_interval(self):
+        return self._swconfig.get('telemetryProcess', {}).get('pollInterval', 0.05)
+
+    @property
+    def telemetry_process_restart_delay(self):
+        return self._swconfig.get('telemetryProcess', {}).get('restartDelay', 5)
+
+    @property
+    def telemetry_process_hang_timeout(self):
+        return self._swconfig.get('telemetryProcess', {}).get('hangTimeout', 60)
+
+    @property
+    def status_server_port(self):
+        return self._swconfig.get('statusServerPort')
+
+    @property
+    def status_history_length(self):
+        return self._swconfig.get('statusHistoryLength', 300)
+
     @property
     def program_afterrunning_cycle(self):
         return self._swconfig.get('afterrunningCycleDuration')
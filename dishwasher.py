@@ -1,9 +1,14 @@
+from actuator import ActuatorWorker
 from config import HardwareConfig
+from edge_trace import EdgeTraceRecorder
+from onewire import OneWireBus
+from process_sample import SensorValues, SelectorValues
+from resync import ACTUATOR_BITS, ALL_ACTUATORS
 import RPi.GPIO as GPIO
-import time
 import logging
 import subprocess
 import sys
+import time
 
 
 class Dishwasher:
@@ -22,6 +27,53 @@ class Dishwasher:
         self.in_wash_program = False
         self.step_transition_triggered = False
         self.debug_led_state = True
+        # timed output sequences run on their own thread, the control loop never sleeps on an output
+        self.actuators = ActuatorWorker(GPIO.output)
+        # all temperature sensors are converted together on their own thread
+        self.onewire = OneWireBus(self.hwconfig.onewire_sensors, self.hwconfig.onewire_resolutions,
+                                  self.hwconfig.onewire_read_interval, self.hwconfig.w1_devices_path)
+        self.onewire.start()
+
+        # resolve the input pins once, they are read on every process data tick
+        self._selector_pins = (
+            ('pinP4', self.hwconfig.get_input_pin('sensorPinP4')),
+            ('pinP6', self.hwconfig.get_input_pin('sensorPinP6')),
+            ('pinP7', self.hwconfig.get_input_pin('sensorPinP7')),
+            ('pinP9', self.hwconfig.get_input_pin('sensorPinP9')),
+            ('pinP10', self.hwconfig.get_input_pin('sensorPinP10')),
+            ('pinP11', self.hwconfig.get_input_pin('sensorPinP11')),
+            ('pinP12', self.hwconfig.get_input_pin('sensorPinP12'))
+        )
+        self._actuator_pins = (
+            ('pump_drain', self.hwconfig.get_input_pin('sensorPinMotor')),
+            ('pump_circulation', self.hwconfig.get_input_pin('sensorPinUmwelz')),
+            ('valve_inlet', self.hwconfig.get_input_pin('sensorPinEinlauf')),
+            ('valve_outlet', self.hwconfig.get_input_pin('sensorPinAblauf')),
+            ('heating', self.hwconfig.get_input_pin('sensorPinHeizen'))
+        )
+        self._actuator_mask_pins = tuple((ACTUATOR_BITS[name], pin) for name, pin in self._actuator_pins)
+
+        # optional journal of all edges of the actuator inputs, see edge_trace.py
+        self.edge_trace = None
+        self._time_motor_rising = 0.0
+        if self.hwconfig.edge_trace_enabled:
+            self.edge_trace = EdgeTraceRecorder(self._get_edge_trace_pins(), GPIO.input,
+                                                self.hwconfig.edge_trace_buffer_records,
+                                                self.hwconfig.edge_trace_flush_interval)
+
+    def _get_edge_trace_pins(self) -> dict:
+        """name => pin of the traced inputs, the actuator inputs are named like the SensorValues"""
+        actuator_names = {pin: name for name, pin in self._actuator_pins}
+        selector_pins = {pin for _, pin in self._selector_pins}
+        pins = {}
+        for input_name in self.hwconfig.edge_trace_pins:
+            pin = self.hwconfig.get_input_pin(input_name)
+            if pin is None or pin in selector_pins:
+                # the edge detection of the selector inputs belongs to the program selection
+                self.module_logger.warning('input %s can not be traced', input_name)
+                continue
+            pins[actuator_names.get(pin, input_name)] = pin
+        return pins
 
     def init_gpios(self):
         """initialize all GPIO inputs and outputs"""
@@ -36,21 +88,45 @@ class Dishwasher:
             GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
 
         # create interrupt event handler
-        GPIO.add_event_detect(self.hwconfig.get_input_pin('sensorPinMotor'), GPIO.RISING,
-                              bouncetime=50)
-        GPIO.add_event_callback(self.hwconfig.get_input_pin('sensorPinMotor'),
-                                self.step_transition_detected)
+        motor_pin = self.hwconfig.get_input_pin('sensorPinMotor')
+        if self.edge_trace is None:
+            GPIO.add_event_detect(motor_pin, GPIO.RISING, bouncetime=50)
+            GPIO.add_event_callback(motor_pin, self.step_transition_detected)
+            return
+        # the traced inputs report both edges without debouncing, the step transition debounces itself
+        GPIO.add_event_detect(motor_pin, GPIO.BOTH)
+        for pin in self.edge_trace.pins.values():
+            if pin != motor_pin:
+                GPIO.add_event_detect(pin, GPIO.BOTH)
+            GPIO.add_event_callback(pin, self.edge_trace.on_edge)
+        GPIO.add_event_callback(motor_pin, self._motor_edge_detected)
+
+    def enable_selection_events(self, callback):
+        """call callback(channel) on every edge of the program selector inputs"""
+        for _, pin in self._selector_pins:
+            GPIO.add_event_detect(pin, GPIO.BOTH, callback=callback,
+                                  bouncetime=self.hwconfig.selector_bounce_time)
+
+    def disable_selection_events(self):
+        for _, pin in self._selector_pins:
+            GPIO.remove_event_detect(pin)
 
     def dispose_gpios(self):
         """cleanup GPIO pins after the program has finished."""
         if self.in_wash_program:
             self.module_logger.warning('GPIO cleanup in active program run called, aborting!')
         else:
+            # let running buzzer and reset sequences finish before the outputs are released
+            self.actuators.wait_idle(10)
+            self.actuators.stop()
+            self.onewire.stop()
+            if self.edge_trace is not None:
+                self.edge_trace.stop()
             GPIO.cleanup()
 
     def get_mac_address(self):
         """the mac address of the device wlan0 is used as a clear identifier of the machine"""
-        response_bytes = subprocess.run(['cat', '/sys/class/net/wlan0/address'], stdout=subprocess.PIPE)
+        response_bytes = subprocess.run(['cat', self.hwconfig.network_address_path], stdout=subprocess.PIPE)
         string = response_bytes.stdout.decode('utf-8')
         string = string.replace('\n', '')
         return string.strip()
@@ -63,46 +139,61 @@ class Dishwasher:
             # self.module_logger.debug('step transition outside of program run detected')
             pass
 
-    def read_program_sensor_values(self) -> dict[str, bool]:
-        """return all GPIO Inputs for program selection detection"""
-        return {
-            'pinP4': GPIO.input(self.hwconfig.get_input_pin('sensorPinP4')),
-            'pinP6': GPIO.input(self.hwconfig.get_input_pin('sensorPinP6')),
-            'pinP7': GPIO.input(self.hwconfig.get_input_pin('sensorPinP7')),
-            'pinP9': GPIO.input(self.hwconfig.get_input_pin('sensorPinP9')),
-            'pinP10': GPIO.input(self.hwconfig.get_input_pin('sensorPinP10')),
-            'pinP11': GPIO.input(self.hwconfig.get_input_pin('sensorPinP11')),
-            'pinP12': GPIO.input(self.hwconfig.get_input_pin('sensorPinP12'))
-        }
-
-    def read_actuator_sensor_values(self) -> dict[str, bool]:
-        """return all GPIO actuator stats"""
-        return {
-            'pump_drain': GPIO.input(self.hwconfig.get_input_pin('sensorPinMotor')),
-            'pump_circulation': GPIO.input(self.hwconfig.get_input_pin('sensorPinUmwelz')),
-            'valve_inlet': GPIO.input(self.hwconfig.get_input_pin('sensorPinEinlauf')),
-            'valve_outlet': GPIO.input(self.hwconfig.get_input_pin('sensorPinAblauf')),
-            'heating': GPIO.input(self.hwconfig.get_input_pin('sensorPinHeizen'))
-        }
+    def _motor_edge_detected(self, channel):
+        """rising edges of the motor input with the 50 ms bounce time of the untraced event detection"""
+        time_now = time.monotonic()
+        if GPIO.input(channel) and time_now - self._time_motor_rising >= 0.05:
+            self._time_motor_rising = time_now
+            self.step_transition_detected(channel)
+
+    def start_edge_trace(self, directory, time_start, step=None):
+        """start the edge journal of the run, a no-op without edge trace"""
+        if self.edge_trace is not None:
+            self.edge_trace.start_run(directory, time_start, step)
+
+    def trace_step(self, step):
+        if self.edge_trace is not None:
+            self.edge_trace.mark_step(step)
+
+    def stop_edge_trace(self):
+        if self.edge_trace is not None:
+            self.edge_trace.stop_run()
+
+    def read_program_sensor_values(self, selector_values: SelectorValues = None) -> SelectorValues:
+        """fill and return all GPIO Inputs for program selection detection"""
+        if selector_values is None:
+            selector_values = SelectorValues()
+        for name, pin in self._selector_pins:
+            setattr(selector_values, name, GPIO.input(pin))
+        return selector_values
+
+    def read_actuator_sensor_values(self, sensor_values: SensorValues = None) -> SensorValues:
+        """fill and return all GPIO actuator stats"""
+        if sensor_values is None:
+            sensor_values = SensorValues()
+        for name, pin in self._actuator_pins:
+            setattr(sensor_values, name, GPIO.input(pin))
+        return sensor_values
+
+    def read_actuator_mask(self, care_mask=ALL_ACTUATORS) -> int:
+        """bit mask of the actuator inputs (see resync.py), only the inputs of care_mask are read"""
+        mask = 0
+        for bit, pin in self._actuator_mask_pins:
+            if care_mask & bit and GPIO.input(pin):
+                mask |= bit
+        return mask
 
     def read_input(self, sensor_name: str) -> bool:
         """return bool GPIO value of one input sensor"""
         return GPIO.input(self.hwconfig.get_input_pin(sensor_name))
 
     def read_temperature(self) -> float:
-        """read & convert the temperature sensor from bus"""
-        w1_device_file = "/sys/bus/w1/devices/{}/w1_slave".format(self.hwconfig.get_address('sesorTemp'))
-        try:
-            file = open(w1_device_file)
-            file_content = file.read()
-            file.close()
-            # read and convert temperature value
-            string_value = file_content.split("\n")[1].split(" ")[9]
-            temperature = round(float(string_value[2:]) / 1000, 1)
-        except OSError:
-            self.module_logger.error("unable to read temperature due to an OSError (file: {})".format(w1_device_file))
-            temperature = 0.0
-        return temperature
+        """last converted temperature of the main sensor, never blocks on the bus"""
+        return self.onewire.get_temperature('main')
+
+    def read_temperatures(self) -> dict:
+        """name => last converted temperature of all 1-Wire sensors"""
+        return self.onewire.get_temperatures()
 
     def set_all_relays(self, set_state: bool):
         """set all GPIO program relay outputs to set_state"""
@@ -113,12 +204,10 @@ class Dishwasher:
         GPIO.output(self.hwconfig.get_output_pin('relayPinP4'), mode)
 
     def set_buzzer(self, passes: int):
-        pin_name = self.hwconfig.get_output_pin('relayPinSummer')
-        for i in range(0, passes):
-            GPIO.output(pin_name, GPIO.LOW)
-            time.sleep(0.5)
-            GPIO.output(pin_name, GPIO.HIGH)
-            time.sleep(1)
+        """queue `passes` beeps, returns immediately"""
+        pin = self.hwconfig.get_output_pin('relayPinSummer')
+        self.actuators.submit('buzzer', [(pin, GPIO.LOW, 0.5), (pin, GPIO.HIGH, 1)] * passes,
+                              idle=[(pin, GPIO.HIGH)])
 
     def set_lamp(self, enable: bool):
         mode = GPIO.HIGH if enable is True else GPIO.LOW
@@ -133,9 +222,10 @@ class Dishwasher:
     def reset_projector(self):
         """workaround for freezing projector microcontroller"""
         self.module_logger.info('reset projector microcontroller')
-        GPIO.output(self.hwconfig.get_output_pin('pinResetProjector'), GPIO.LOW)
-        time.sleep(0.15)
-        GPIO.output(self.hwconfig.get_output_pin('pinResetProjector'), GPIO.HIGH)
+        pin = self.hwconfig.get_output_pin('pinResetProjector')
+        # a reset which is still pending makes another one needless
+        self.actuators.submit('projector', [(pin, GPIO.LOW, 0.15), (pin, GPIO.HIGH, 0)],
+                              policy=ActuatorWorker.COALESCE, idle=[(pin, GPIO.HIGH)])
 
     def set_main_relay(self, enable: bool):
         mode = GPIO.LOW if enable is True else GPIO.HIGH
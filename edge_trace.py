@@ -0,0 +1,288 @@
+"""
+High resolution trace of the GPIO input edges (setting `hardware.edgeTrace.enabled`).
+
+The program loop samples the actuator inputs once per second, short pulses of the valves, pumps and
+the heater and their exact timing are lost. The EdgeTraceRecorder is subscribed to both edges of
+the traced input pins and appends one record per edge to a binary journal per run
+(`<time_start>_EdgeTrace.bin` in the logging directory):
+
+    header  magic, version, pin count, time_start, (pin number, name) of every traced pin
+    record  monotonic_ns, pin, level
+
+Two pseudo pins carry the context of the edges: STEP_PIN records the operational step (level) at
+every step transition, CLOCK_PIN records pair the monotonic clock with the wall clock, they are
+written at the start of the trace and again after a resume, so the edges of a run which spans a
+reboot stay on one time axis.
+
+The GPIO callbacks only pack the record into a preallocated buffer. A full buffer is swapped with
+the second one and written by a background thread in one batch, so the memory is bounded and the
+callbacks never do I/O. Edges are dropped (and counted) only if both buffers are full.
+
+The journal is read with EdgeTrace, which derives per-pin duty cycles and the step timeline:
+
+    python edge_trace.py <journal>
+"""
+
+import logging
+import os
+import struct
+import sys
+import time
+from threading import Event, Lock, Thread
+
+_MAGIC = b'DWET'
+_VERSION = 1
+_HEADER = struct.Struct('<4sHHq')
+_PIN_ENTRY = struct.Struct('<B23s')
+RECORD = struct.Struct('<QBB')
+# pseudo pins of the records which are no edges
+STEP_PIN = 0xFF
+CLOCK_PIN = 0xFE
+
+
+class EdgeTraceRecorder:
+    def __init__(self, pins: dict, read_level, buffer_records=4096, flush_interval=5.0):
+        """
+        :param pins: name => BCM pin number of the traced inputs
+        :param read_level: function which reads the level of a pin, e.g. GPIO.input
+        :param buffer_records: records of each of the two buffers
+        :param flush_interval: seconds until a partly filled buffer is written
+        """
+        self.module_logger = logging.getLogger('DishwasherOS.EdgeTrace')
+        self.pins = pins
+        self.read_level = read_level
+        self.buffer_records = buffer_records
+        self.flush_interval = flush_interval
+        self.buffers = [bytearray(buffer_records * RECORD.size), bytearray(buffer_records * RECORD.size)]
+        self.active = 0
+        self.fill = 0
+        # (buffer, record count) handed over to the writer thread
+        self.pending = None
+        self.dropped = 0
+        self.lock = Lock()
+        # serializes the writes of the writer thread and of stop_run
+        self.write_lock = Lock()
+        self.fd = None
+        self.is_recording = False
+        self.event_flush = Event()
+        self.event_stop = Event()
+        self.thread = Thread(target=self._target, name='EdgeTrace', daemon=True)
+        self.thread.start()
+
+    def on_edge(self, channel):
+        """GPIO edge callback"""
+        time_ns = time.monotonic_ns()
+        if self.is_recording:
+            self.record(time_ns, channel, self.read_level(channel))
+
+    def record(self, time_ns, pin, level):
+        with self.lock:
+            if self.fill == self.buffer_records:
+                if self.pending is not None:
+                    self.dropped += 1
+                    return
+                self._swap()
+            RECORD.pack_into(self.buffers[self.active], self.fill * RECORD.size, time_ns, pin, level)
+            self.fill += 1
+
+    def _swap(self):
+        """hand the active buffer over to the writer thread, must be called with the lock"""
+        self.pending = (self.buffers[self.active], self.fill)
+        self.active = 1 - self.active
+        self.fill = 0
+        self.event_flush.set()
+
+    def mark_step(self, step):
+        """record the operational step at a step transition"""
+        if self.is_recording:
+            self.record(time.monotonic_ns(), STEP_PIN, step)
+
+    def start_run(self, directory, time_start, step=None):
+        """start the journal of a run, the journal of a resumed run is continued"""
+        path = os.path.join(directory, '{}_EdgeTrace.bin'.format(int(time_start)))
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if os.fstat(fd).st_size == 0:
+            header = _HEADER.pack(_MAGIC, _VERSION, len(self.pins), int(time_start))
+            header += b''.join(_PIN_ENTRY.pack(pin, name.encode('utf-8')) for name, pin in self.pins.items())
+            os.write(fd, header)
+        self.fd = fd
+        self.is_recording = True
+        time_ns = time.monotonic_ns()
+        self.record(time_ns, CLOCK_PIN, 0)
+        self.record(time.time_ns(), CLOCK_PIN, 1)
+        # the levels at the start, every later level change is an edge
+        for pin in self.pins.values():
+            self.record(time_ns, pin, self.read_level(pin))
+        if step is not None:
+            self.record(time_ns, STEP_PIN, step)
+        self.module_logger.info('trace the edges of %s to %s', ', '.join(self.pins), path)
+
+    def stop_run(self):
+        """write all records and close the journal"""
+        if self.fd is None:
+            return
+        self.is_recording = False
+        # the first pass writes a batch which the writer thread has not written yet, the second one the rest
+        for _ in range(2):
+            with self.write_lock:
+                with self.lock:
+                    if self.pending is None:
+                        self._swap()
+                self._flush()
+        with self.write_lock:
+            os.close(self.fd)
+            self.fd = None
+        if self.dropped:
+            self.module_logger.warning('%s edges dropped, increase edgeTrace.bufferRecords', self.dropped)
+            self.dropped = 0
+
+    def _flush(self):
+        """write the pending buffer, must be called with the write lock"""
+        with self.lock:
+            pending = self.pending
+        if pending is None or self.fd is None:
+            return
+        buffer, count = pending
+        if count:
+            try:
+                os.write(self.fd, memoryview(buffer)[:count * RECORD.size])
+            except OSError:
+                self.module_logger.exception('unable to write the edge trace')
+        with self.lock:
+            self.pending = None
+
+    def _target(self):
+        while not self.event_stop.is_set():
+            if not self.event_flush.wait(self.flush_interval):
+                # write the partly filled buffer
+                with self.lock:
+                    if self.pending is None and self.fill:
+                        self._swap()
+            self.event_flush.clear()
+            with self.write_lock:
+                self._flush()
+
+    def stop(self):
+        self.stop_run()
+        self.event_stop.set()
+        self.event_flush.set()
+        self.thread.join()
+
+
+class StepSpan:
+    __slots__ = ('step', 'start', 'end', 'duty', 'edges')
+
+    def __init__(self, step, start, end, duty, edges):
+        self.step = step
+        self.start = start
+        self.end = end
+        # name => share of the span the input was high
+        self.duty = duty
+        # name => rising edges in the span
+        self.edges = edges
+
+
+class EdgeTrace:
+    """edges of a journal, times in seconds since the start of the run"""
+
+    def __init__(self, time_start, pins: dict, levels: dict, steps: list, time_end):
+        self.time_start = time_start
+        # pin number => name
+        self.pins = pins
+        # name => [(time, level)] in time order, the first entry is the level at the start
+        self.levels = levels
+        # [(time, step)]
+        self.steps = steps
+        self.time_end = time_end
+
+    @classmethod
+    def read(cls, file_path):
+        with open(file_path, 'rb') as fd:
+            data = fd.read()
+        magic, version, pin_count, time_start = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError('{} is no edge trace journal'.format(file_path))
+        offset = _HEADER.size
+        pins = {}
+        for _ in range(pin_count):
+            pin, name = _PIN_ENTRY.unpack_from(data, offset)
+            pins[pin] = name.rstrip(b'\0').decode('utf-8')
+            offset += _PIN_ENTRY.size
+        levels = {name: [] for name in pins.values()}
+        steps = []
+        # wall clock minus monotonic clock of the current trace segment
+        clock_offset = None
+        monotonic_reference = None
+        time_ns = time_start * 1000000000
+        end = offset + (len(data) - offset) // RECORD.size * RECORD.size
+        for time_raw, pin, level in RECORD.iter_unpack(data[offset:end]):
+            if pin == CLOCK_PIN:
+                if level == 0:
+                    monotonic_reference = time_raw
+                elif monotonic_reference is not None:
+                    clock_offset = time_raw - monotonic_reference
+                continue
+            if clock_offset is None:
+                # journal without clock reference, the first record is the start of the run
+                clock_offset = time_start * 1000000000 - time_raw
+            time_ns = time_raw + clock_offset
+            time_now = time_ns / 1e9 - time_start
+            if pin == STEP_PIN:
+                steps.append((time_now, level))
+            elif pin in pins:
+                history = levels[pins[pin]]
+                if not history or history[-1][1] != level:
+                    history.append((time_now, level))
+        return cls(time_start, pins, levels, steps, time_ns / 1e9 - time_start)
+
+    def intervals(self, name, start=None, end=None) -> list:
+        """(start, end) of the high phases of an input within [start, end]"""
+        start = 0.0 if start is None else start
+        end = self.time_end if end is None else end
+        intervals = []
+        time_high = None
+        for time_now, level in self.levels[name]:
+            if level and time_high is None:
+                time_high = max(time_now, start)
+            elif not level and time_high is not None:
+                if min(time_now, end) > time_high:
+                    intervals.append((time_high, min(time_now, end)))
+                time_high = None
+            if time_now >= end:
+                break
+        if time_high is not None and end > time_high:
+            intervals.append((time_high, end))
+        return intervals
+
+    def duty_cycles(self, start=None, end=None) -> dict:
+        """name => share of [start, end] the input was high"""
+        start = 0.0 if start is None else start
+        end = self.time_end if end is None else end
+        if end <= start:
+            return {name: 0.0 for name in self.levels}
+        return {name: sum(e - s for s, e in self.intervals(name, start, end)) / (end - start)
+                for name in self.levels}
+
+    def step_timeline(self) -> list:
+        """StepSpan of every operational step in the order of the run"""
+        spans = []
+        for i, (time_now, step) in enumerate(self.steps):
+            time_next = self.steps[i + 1][0] if i + 1 < len(self.steps) else self.time_end
+            edges = {name: sum(1 for t, level in history[1:] if level and time_now <= t < time_next)
+                     for name, history in self.levels.items()}
+            spans.append(StepSpan(step, time_now, time_next, self.duty_cycles(time_now, time_next), edges))
+        return spans
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print('usage: python edge_trace.py <journal>')
+        sys.exit(1)
+    trace = EdgeTrace.read(sys.argv[1])
+    names = list(trace.levels)
+    print('run {}, {:.1f}s traced'.format(trace.time_start, trace.time_end))
+    print('duty cycles: ' + ', '.join('{} {:.1%}'.format(name, duty) for name, duty in trace.duty_cycles().items()))
+    print('{:>5} {:>8} {:>8}  {}'.format('step', 'start', 'duration', '  '.join('{:>16}'.format(n) for n in names)))
+    for span in trace.step_timeline():
+        print('{:>5} {:>8.1f} {:>8.1f}  {}'.format(span.step, span.start, span.end - span.start, '  '.join(
+            '{:>10.1%} {:>4}x'.format(span.duty[name], span.edges[name]) for name in names)))
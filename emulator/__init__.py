@@ -0,0 +1,22 @@
+"""
+Emulators of the peripherals besides the GPIOs, for tests of the full I/O path on any Linux machine.
+
+    FakeW1Bus           w1 sysfs tree with bulk conversion, conversion delay and temperature curves
+                        (hardware.peripherals.w1DevicesPath)
+    ProjectorEmulator   pseudo terminal which parses and checks the frames of the serial projector
+                        (projectorSerialPort)
+    MeterEmulator       HTTP server with the Switch.GetStatus RPC of the electricity meter and a power
+                        profile (electricityMeterIP)
+
+All three run until stop() is called. `python -m emulator` starts them together and prints the
+settings which point DishwasherOS to them.
+
+    FakeMqttClient      in-process stand-in of the paho-mqtt client and the broker, passed to the
+                        MqttSink in tests (mqtt.enabled)
+"""
+
+from emulator.curves import PiecewiseCurve
+from emulator.meter import MeterEmulator
+from emulator.mqtt import FakeMqttClient
+from emulator.projector import ProjectorEmulator
+from emulator.w1 import FakeW1Bus
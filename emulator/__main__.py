@@ -0,0 +1,53 @@
+"""
+Start all emulators and print the settings which point DishwasherOS to them:
+
+    python -m emulator [--directory DIR] [--meter-port PORT]
+"""
+
+import argparse
+import os
+import signal
+import tempfile
+
+from emulator import FakeW1Bus, MeterEmulator, ProjectorEmulator
+
+# heating of a washing program: fill, heat to 55 degrees celsius, hold, cool down
+_TEMPERATURE_CURVE = [(0, 20), (120, 20), (1000, 55), (1600, 55), (2000, 35)]
+# idle, circulation pump, heater on while heating
+_POWER_PROFILE = [(0, 5), (60, 80), (120, 2100), (1000, 80), (2000, 5)]
+
+parser = argparse.ArgumentParser(description='peripheral emulators of DishwasherOS')
+parser.add_argument('--directory', help='directory of the fake sysfs files, a temporary one by default')
+parser.add_argument('--meter-port', type=int, default=0)
+parser.add_argument('--address', default='28-0000058f94d2', help='address of the main temperature sensor')
+args = parser.parse_args()
+
+directory = args.directory or tempfile.mkdtemp(prefix='dishwasheros_emulator_')
+w1_directory = os.path.join(directory, 'w1_devices')
+os.makedirs(w1_directory, exist_ok=True)
+network_address_path = os.path.join(directory, 'wlan0_address')
+with open(network_address_path, 'w') as fd:
+    fd.write('b8:27:eb:00:00:01\n')
+
+w1_bus = FakeW1Bus(w1_directory, {args.address: _TEMPERATURE_CURVE}).start()
+projector = ProjectorEmulator().start()
+meter = MeterEmulator(_POWER_PROFILE, port=args.meter_port).start()
+
+print('settings.yaml:')
+print('  hardware:')
+print('    addresses: {{sesorTemp: {}}}'.format(args.address))
+print('    peripherals: {{w1DevicesPath: {}, networkAddressPath: {}}}'.format(w1_directory, network_address_path))
+print('  software:')
+print('    electricityMeterIP: {}'.format(meter.address))
+print('    projectorSerialPort: {}'.format(projector.port))
+print('running, stop with Ctrl-C')
+try:
+    signal.pause()
+except KeyboardInterrupt:
+    pass
+finally:
+    w1_bus.stop()
+    meter.stop()
+    projector.stop()
+    print(projector.report())
+    print('{} meter requests, {} bulk conversions'.format(meter.requests, w1_bus.conversions))
@@ -0,0 +1,33 @@
+"""Programmable curves of the emulated values over the seconds since the start of the emulator."""
+
+import bisect
+
+
+class PiecewiseCurve:
+    def __init__(self, points, is_step=False):
+        """
+        :param points: (seconds, value) in time order, the value is constant before the first and after the last point
+        :param is_step: hold every value until the next point instead of interpolating
+        """
+        self.times = [float(t) for t, _ in points]
+        self.values = [float(v) for _, v in points]
+        self.is_step = is_step
+
+    def __call__(self, time_now) -> float:
+        i = bisect.bisect_right(self.times, time_now)
+        if i == 0:
+            return self.values[0]
+        if i == len(self.times) or self.is_step:
+            return self.values[i - 1]
+        t0, t1 = self.times[i - 1], self.times[i]
+        v0, v1 = self.values[i - 1], self.values[i]
+        return v0 + (v1 - v0) * (time_now - t0) / (t1 - t0)
+
+
+def as_curve(curve):
+    """a curve from a callable, a list of points or a constant"""
+    if callable(curve):
+        return curve
+    if isinstance(curve, (int, float)):
+        return PiecewiseCurve([(0, curve)])
+    return PiecewiseCurve(curve)
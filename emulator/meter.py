@@ -0,0 +1,72 @@
+"""
+Electricity meter with the Switch.GetStatus RPC of the Shelly devices (see
+ProcessDataProvider.get_electricity_meter_metrics), the power follows a programmable profile and
+the energy counter integrates it.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from emulator.curves import as_curve
+
+
+class MeterRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        meter = self.server.meter
+        if self.path.split('?', 1)[0] != '/rpc/Switch.GetStatus' or meter.is_offline:
+            self.send_error(404)
+            return
+        meter.requests += 1
+        apower, aenergy = meter.read()
+        payload = json.dumps({'id': 0, 'output': True, 'apower': apower,
+                              'aenergy': {'total': aenergy}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MeterEmulator:
+    def __init__(self, power_profile=0.0, aenergy_init=1000.0, port=0, host='127.0.0.1'):
+        """
+        :param power_profile: watts over the seconds since start (callable, points or constant)
+        :param aenergy_init: Wh of the energy counter at the start
+        :param port: 0 selects a free port
+        """
+        self.power_profile = as_curve(power_profile)
+        self.aenergy = aenergy_init
+        self.time_start = time.monotonic()
+        self.time_last = self.time_start
+        self.requests = 0
+        self.is_offline = False
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), MeterRequestHandler)
+        self.server.daemon_threads = True
+        self.server.meter = self
+        self.address = '{}:{}'.format(host, self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever, name='MeterEmulator', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def read(self):
+        """current power in W and energy counter in Wh"""
+        with self.lock:
+            time_now = time.monotonic()
+            # trapezoid of the profile since the last reading
+            apower_last = self.power_profile(self.time_last - self.time_start)
+            apower = self.power_profile(time_now - self.time_start)
+            self.aenergy += (apower_last + apower) / 2 * (time_now - self.time_last) / 3600
+            self.time_last = time_now
+            return int(apower), round(self.aenergy, 3)
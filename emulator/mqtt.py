@@ -0,0 +1,115 @@
+"""
+In-process stand-in of the paho-mqtt client together with its broker, for tests of the MqttSink
+(see mqtt_sink.py) without a network.
+
+The broker side keeps every message and the retained payload of every topic. The QoS 1
+acknowledgements are released by acknowledge(), so a test decides when the in-flight window of the
+sink drains. drop_connection() loses the connection and publishes the Last Will, reconnect()
+restores it like the automatic reconnect of paho-mqtt.
+"""
+
+import threading
+
+# paho-mqtt result codes
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+class MessageInfo:
+    """result of publish(), like paho.mqtt.client.MQTTMessageInfo"""
+    __slots__ = ('rc', 'mid')
+
+    def __init__(self, rc, mid):
+        self.rc = rc
+        self.mid = mid
+
+
+class FakeMqttClient:
+    def __init__(self):
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_publish = None
+        self.will = None
+        self.username = None
+        self.address = None
+        self.is_connected = False
+        self.is_looping = False
+        # (topic, payload, qos) of every message which reached the broker, in order
+        self.messages = []
+        # topic => retained payload
+        self.retained = {}
+        # message ids which are not acknowledged yet, oldest first
+        self.unacknowledged = []
+        self.mid = 0
+        self.lock = threading.Lock()
+
+    def will_set(self, topic, payload=None, qos=0, retain=False):
+        self.will = (topic, payload, qos, retain)
+
+    def username_pw_set(self, username, password=None):
+        self.username = username
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def connect_async(self, host, port=1883, keepalive=60):
+        self.address = (host, port)
+
+    def loop_start(self):
+        """the broker accepts the connection at once"""
+        self.is_looping = True
+        self.reconnect()
+
+    def loop_stop(self):
+        self.is_looping = False
+
+    def disconnect(self):
+        """clean disconnect, the Last Will is not published"""
+        self.is_connected = False
+        with self.lock:
+            self.unacknowledged.clear()
+
+    def publish(self, topic, payload=None, qos=0, retain=False) -> MessageInfo:
+        with self.lock:
+            if not self.is_connected:
+                return MessageInfo(MQTT_ERR_NO_CONN, 0)
+            self.mid += 1
+            self.messages.append((topic, payload, qos))
+            if retain:
+                self.retained[topic] = payload
+            if qos > 0:
+                self.unacknowledged.append(self.mid)
+            return MessageInfo(MQTT_ERR_SUCCESS, self.mid)
+
+    def acknowledge(self, count=None) -> int:
+        """acknowledge the oldest `count` messages (all if None), returns the number acknowledged"""
+        with self.lock:
+            count = len(self.unacknowledged) if count is None else min(count, len(self.unacknowledged))
+            mids = self.unacknowledged[:count]
+            del self.unacknowledged[:count]
+        for mid in mids:
+            self.on_publish(self, None, mid)
+        return len(mids)
+
+    def drop_connection(self):
+        """lose the connection, the broker publishes the Last Will and the acknowledgements are lost"""
+        with self.lock:
+            self.is_connected = False
+            self.unacknowledged.clear()
+            if self.will is not None:
+                topic, payload, qos, retain = self.will
+                self.messages.append((topic, payload, qos))
+                if retain:
+                    self.retained[topic] = payload
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, None, 1)
+
+    def reconnect(self):
+        self.is_connected = True
+        if self.on_connect is not None:
+            self.on_connect(self, None, {}, 0, None)
+
+    def published_payloads(self, topic) -> list:
+        """payloads of a topic in the order they reached the broker"""
+        with self.lock:
+            return [payload for message_topic, payload, qos in self.messages if message_topic == topic]
@@ -0,0 +1,106 @@
+"""
+Serial projector on a pseudo terminal, the slave device replaces /dev/ttyS0 (setting
+`projectorSerialPort`). Every frame is parsed and checked against the format of
+process_sample.encode_serial_frame:
+
+    ETE<time left, 4 digits>PR<progress, 3 digits>T<temperature, 2 digits>M0U<0|1>E<0|1>A<0|1>H<0|1>X
+
+Bytes which do not form a valid frame are counted and kept for the test report.
+"""
+
+import os
+import re
+import select
+import threading
+import time
+import tty
+
+_FRAME = re.compile(rb'ETE(\d{4})PR(\d{3})T(\d{2})M0U([01])E([01])A([01])H([01])X')
+# invalid frames kept for the report
+_MAX_INVALID_FRAMES = 20
+
+
+class ProjectorFrame:
+    __slots__ = ('time_received', 'time_left', 'progress', 'temperature', 'pump_circulation', 'valve_inlet',
+                 'valve_outlet', 'heating')
+
+    def __init__(self, time_received, match):
+        self.time_received = time_received
+        self.time_left, self.progress, self.temperature = (int(match.group(i)) for i in (1, 2, 3))
+        self.pump_circulation, self.valve_inlet, self.valve_outlet, self.heating = (
+            int(match.group(i)) for i in (4, 5, 6, 7))
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ProjectorEmulator:
+    def __init__(self, history_length=1000):
+        self.master_fd, self.slave_fd = os.openpty()
+        # no echo and no line processing, the bytes arrive as written
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self.history_length = history_length
+        self.frames = []
+        self.frame_count = 0
+        self.invalid_frames = []
+        self.invalid_count = 0
+        self.buffer = b''
+        self.lock = threading.Lock()
+        self.event_stop = threading.Event()
+        self.thread = threading.Thread(target=self._target, name='ProjectorEmulator', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.event_stop.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    @property
+    def last_frame(self):
+        with self.lock:
+            return self.frames[-1] if self.frames else None
+
+    def _target(self):
+        while not self.event_stop.is_set():
+            readable, _, _ = select.select([self.master_fd], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                data = os.read(self.master_fd, 4096)
+            except OSError:
+                # the last writer has closed the port
+                time.sleep(0.01)
+                continue
+            self._parse(data)
+
+    def _parse(self, data: bytes):
+        time_now = time.time()
+        self.buffer += data
+        *frames, self.buffer = self.buffer.split(b'X')
+        with self.lock:
+            for frame in frames:
+                frame += b'X'
+                match = _FRAME.fullmatch(frame)
+                if match is None:
+                    self.invalid_count += 1
+                    if len(self.invalid_frames) < _MAX_INVALID_FRAMES:
+                        self.invalid_frames.append(frame)
+                    continue
+                self.frame_count += 1
+                self.frames.append(ProjectorFrame(time_now, match))
+                if len(self.frames) > self.history_length:
+                    del self.frames[0]
+
+    def report(self) -> str:
+        with self.lock:
+            lines = ['{} valid frames, {} invalid frames'.format(self.frame_count, self.invalid_count)]
+            lines.extend('invalid: {!r}'.format(frame) for frame in self.invalid_frames)
+            if self.frames:
+                lines.append('last frame: {}'.format(self.frames[-1].as_dict()))
+        return '\n'.join(lines)
@@ -0,0 +1,123 @@
+"""
+Fake w1 sysfs tree of the kernel driver w1_therm (see onewire.py) in an ordinary directory.
+
+    <directory>/w1_bus_master1/therm_bulk_read      'trigger' starts a conversion, -1 while it runs, 1 after it
+    <directory>/<address>/temperature               millidegrees of the last conversion
+    <directory>/<address>/w1_slave                  the two lines of a single read with CRC check
+    <directory>/<address>/resolution                bits, sets the conversion delay
+
+An ordinary file can not convert on read, so a background thread watches the trigger and writes the
+values of the temperature curves after the conversion delay, w1_slave is refreshed every
+update_interval seconds.
+"""
+
+import os
+import threading
+import time
+
+from emulator.curves import as_curve
+from onewire import _CONVERSION_TIME
+
+
+def _write_file(path, content):
+    """replace the file at once, a reader never sees a partly written file"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as fd:
+        fd.write(content)
+    os.replace(temp_path, path)
+
+
+def _read_file(path) -> str:
+    try:
+        with open(path, 'r') as fd:
+            return fd.read().strip()
+    except OSError:
+        return ''
+
+
+class FakeW1Bus:
+    def __init__(self, directory, sensors: dict, resolution=12, conversion_delay=None, bulk_read=True,
+                 update_interval=1.0, poll_interval=0.005):
+        """
+        :param sensors: address => temperature curve (callable of the seconds since start, points or constant)
+        :param conversion_delay: seconds of a bulk conversion, None for the delay of the configured resolution
+        :param bulk_read: False emulates a kernel without therm_bulk_read
+        """
+        self.directory = directory
+        self.sensors = {address: as_curve(curve) for address, curve in sensors.items()}
+        self.conversion_delay = conversion_delay
+        self.update_interval = update_interval
+        self.poll_interval = poll_interval
+        self.bulk_read_path = os.path.join(directory, 'w1_bus_master1', 'therm_bulk_read') if bulk_read else None
+        self.failing = set()
+        self.conversions = 0
+        self.time_start = time.monotonic()
+        self.event_stop = threading.Event()
+        self.thread = threading.Thread(target=self._target, name='FakeW1Bus', daemon=True)
+
+        os.makedirs(os.path.join(directory, 'w1_bus_master1'), exist_ok=True)
+        if self.bulk_read_path is not None:
+            _write_file(self.bulk_read_path, '0')
+        for address in self.sensors:
+            os.makedirs(os.path.join(directory, address), exist_ok=True)
+            _write_file(os.path.join(directory, address, 'resolution'), str(resolution))
+        self._write_values()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.event_stop.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def set_failing(self, address, is_failing=True):
+        """let a sensor fail the CRC check and vanish from the bulk conversion"""
+        if is_failing:
+            self.failing.add(address)
+        else:
+            self.failing.discard(address)
+
+    def get_conversion_delay(self) -> float:
+        if self.conversion_delay is not None:
+            return self.conversion_delay
+        resolutions = [_read_file(os.path.join(self.directory, address, 'resolution')) for address in self.sensors]
+        return max((_CONVERSION_TIME.get(int(r) if r.isdigit() else 12, 0.75) for r in resolutions), default=0.0)
+
+    def temperature(self, address) -> float:
+        """current value of the temperature curve of a sensor"""
+        return self.sensors[address](time.monotonic() - self.time_start)
+
+    def _write_values(self, is_bulk=False):
+        for address in self.sensors:
+            path = os.path.join(self.directory, address)
+            millidegrees = int(round(self.temperature(address) * 1000))
+            if address in self.failing:
+                _write_file(os.path.join(path, 'w1_slave'), '00 00 00 00 00 00 00 00 00 : crc=00 NO\n'
+                                                            '00 00 00 00 00 00 00 00 00 t=0\n')
+                if is_bulk and os.path.exists(os.path.join(path, 'temperature')):
+                    os.remove(os.path.join(path, 'temperature'))
+                continue
+            _write_file(os.path.join(path, 'w1_slave'), '72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n'
+                                                        '72 01 4b 46 7f ff 0e 10 57 t={}\n'.format(millidegrees))
+            if is_bulk or not os.path.exists(os.path.join(path, 'temperature')):
+                _write_file(os.path.join(path, 'temperature'), str(millidegrees))
+
+    def _target(self):
+        time_done = None
+        time_update = time.monotonic() + self.update_interval
+        while not self.event_stop.wait(self.poll_interval):
+            time_now = time.monotonic()
+            if self.bulk_read_path is not None:
+                if time_done is None and _read_file(self.bulk_read_path) == 'trigger':
+                    _write_file(self.bulk_read_path, '-1')
+                    time_done = time_now + self.get_conversion_delay()
+                elif time_done is not None and time_now >= time_done:
+                    self._write_values(is_bulk=True)
+                    _write_file(self.bulk_read_path, '1')
+                    self.conversions += 1
+                    time_done = None
+            if time_now >= time_update:
+                time_update = time_now + self.update_interval
+                self._write_values()
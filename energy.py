@@ -0,0 +1,156 @@
+"""
+Per-step energy attribution from the power samples of the electricity meter.
+
+The EnergyAccountant integrates the `apower` readings of every telemetry tick (trapezoidal rule)
+and attributes the energy of each interval to the operational step which was active during it.
+At program end the table is written as `<time_start>_EnergyRecord.csv`:
+
+    program;step;sequence;thermo_stop;duration;samples;energy_wh;peak_w
+
+The summaries across all recorded runs are computed with numpy (only needed offline):
+
+    python energy.py [logging_directory]
+"""
+
+import glob
+import os
+import sys
+from threading import Lock
+
+# intervals without a power reading longer than this (e.g. meter unreachable) are not integrated
+_MAX_SAMPLE_GAP = 30.0
+
+
+class StepEnergy:
+    __slots__ = ('step', 'sequence', 'thermo_stop', 'duration', 'samples', 'energy_ws', 'peak_w')
+
+    def __init__(self, step, sequence, thermo_stop):
+        self.step = step
+        self.sequence = sequence
+        self.thermo_stop = thermo_stop
+        self.duration = 0.0
+        self.samples = 0
+        self.energy_ws = 0.0
+        self.peak_w = 0
+
+    @property
+    def energy_wh(self):
+        return self.energy_ws / 3600
+
+
+class EnergyAccountant:
+    """streaming integration of the power samples of one program run"""
+
+    def __init__(self, max_sample_gap=_MAX_SAMPLE_GAP):
+        self.max_sample_gap = max_sample_gap
+        self.lock = Lock()
+        self.steps = {}
+        self.time_last = None
+        self.power_last = None
+        self.step_last = None
+        self.unmeasured_duration = 0.0
+
+    def add_sample(self, time_now, apower, step, sequence, thermo_stop=False):
+        """add a power reading in watts, the interval since the last reading belongs to the last step"""
+        with self.lock:
+            step_energy = self.steps.get(step)
+            if step_energy is None:
+                step_energy = self.steps[step] = StepEnergy(step, sequence, thermo_stop)
+            step_energy.samples += 1
+            step_energy.peak_w = max(step_energy.peak_w, apower)
+            if self.time_last is not None:
+                interval = time_now - self.time_last
+                if 0 < interval <= self.max_sample_gap:
+                    last_energy = self.steps[self.step_last]
+                    last_energy.duration += interval
+                    last_energy.energy_ws += (self.power_last + apower) / 2 * interval
+                elif interval > 0:
+                    self.unmeasured_duration += interval
+            self.time_last = time_now
+            self.power_last = apower
+            self.step_last = step
+
+    def total_wh(self) -> float:
+        with self.lock:
+            return sum(step_energy.energy_ws for step_energy in self.steps.values()) / 3600
+
+    def sequence_wh(self) -> dict:
+        """energy per sequence in Wh"""
+        sequences = {}
+        with self.lock:
+            for step_energy in self.steps.values():
+                sequences[step_energy.sequence] = sequences.get(step_energy.sequence, 0.0) + step_energy.energy_wh
+        return sequences
+
+    def to_csv(self, program) -> str:
+        """the per-step energy table of the run"""
+        with self.lock:
+            return ''.join(
+                '{};{};{};{:d};{:.0f};{};{:.3f};{}\n'.format(
+                    program, s.step, s.sequence, s.thermo_stop, s.duration, s.samples, s.energy_wh, s.peak_w)
+                for s in sorted(self.steps.values(), key=lambda step_energy: step_energy.step))
+
+
+def load_energy_records(logging_directory):
+    """load all energy records into one numpy array with the columns of the record"""
+    import numpy as np
+
+    tables = []
+    for file_path in sorted(glob.glob(os.path.join(logging_directory, '*_EnergyRecord.csv'))):
+        table = np.loadtxt(file_path, delimiter=';', ndmin=2)
+        if table.size == 0:
+            continue
+        run = np.full((table.shape[0], 1), int(os.path.basename(file_path).split('_')[0]))
+        tables.append(np.hstack((run, table)))
+    if not tables:
+        return np.empty((0, 9))
+    # columns: time_start, program, step, sequence, thermo_stop, duration, samples, energy_wh, peak_w
+    return np.vstack(tables)
+
+
+def summarize_energy_records(records, top=10) -> str:
+    """cross-run summary: mean energy per program and the most expensive steps"""
+    import numpy as np
+
+    if records.shape[0] == 0:
+        return 'no energy records\n'
+    runs = records[:, 0].astype(np.int64)
+    programs = records[:, 1].astype(np.int64)
+    steps = records[:, 2].astype(np.int64)
+    energy = records[:, 7]
+    lines = []
+
+    # energy per run, then mean over the runs of each program
+    run_ids, run_index = np.unique(runs, return_inverse=True)
+    run_energy = np.bincount(run_index, weights=energy)
+    run_program = np.zeros(len(run_ids), dtype=np.int64)
+    run_program[run_index] = programs
+    lines.append('{:>7} {:>5} {:>10} {:>10} {:>10}'.format('program', 'runs', 'mean Wh', 'min Wh', 'max Wh'))
+    for program in np.unique(run_program):
+        program_energy = run_energy[run_program == program]
+        lines.append('{:>7} {:>5} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+            program, len(program_energy), program_energy.mean(), program_energy.min(), program_energy.max()))
+
+    # mean energy of every (program, step) over the runs which ran the step
+    keys, key_index = np.unique(programs * 1000 + steps, return_inverse=True)
+    step_energy = np.bincount(key_index, weights=energy)
+    step_runs = np.bincount(key_index)
+    step_mean = step_energy / step_runs
+    thermo_stop = np.zeros(len(keys), dtype=bool)
+    thermo_stop[key_index] = records[:, 4] > 0
+    lines.append('')
+    lines.append('{:>7} {:>5} {:>7} {:>10} {:>10}'.format('program', 'step', 'heating', 'mean Wh', 'share %'))
+    program_mean = {program: run_energy[run_program == program].mean() for program in np.unique(run_program)}
+    for i in np.argsort(-step_mean)[:top]:
+        program, step = divmod(int(keys[i]), 1000)
+        share = step_mean[i] / program_mean[program] * 100 if program_mean[program] else 0
+        lines.append('{:>7} {:>5} {:>7} {:>10.1f} {:>10.1f}'.format(
+            program, step, 'yes' if thermo_stop[i] else '', step_mean[i], share))
+    return '\n'.join(lines) + '\n'
+
+
+if __name__ == "__main__":
+    from config import SoftwareConfig
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else SoftwareConfig().logging_directory
+    print(summarize_energy_records(load_energy_records(directory)), end='')
@@ -0,0 +1,79 @@
+"""
+Event driven lifecycle of the dishwasher.
+
+    ProgramSelectionState -> WaitForBackendState -> RunningState -> AfterrunningState
+        -> ZeroPositionState -> ShutdownState
+
+Events are posted to a queue from any thread (GPIO callbacks, timers, the states themselves) and
+dispatched on the thread which runs the lifecycle. The transition table (operational_states.py) is
+compiled into one state instance per class up front, so dispatching an event is a dict lookup.
+Without events the active state is polled with its own rate: the selection only wakes up for
+selector edges and the fallback probe, the running program is polled every second. Every wait
+is announced to the watchdog, a poll or event handler which blocks is reported as a stall.
+"""
+
+import logging
+import queue
+
+import profiler
+import watchdog
+from operational_states import TRANSITIONS, ProgramSelectionState
+
+
+class Lifecycle:
+    def __init__(self, machine, program, data_provider, status_server=None, transitions=None,
+                 initial_state=ProgramSelectionState):
+        self.module_logger = logging.getLogger('DishwasherOS.Lifecycle')
+        self.machine = machine
+        self.program = program
+        self.data_provider = data_provider
+        self.status_server = status_server
+        self.events = queue.Queue()
+        self.is_stopping = False
+
+        # compile the transition table
+        transitions = transitions if transitions is not None else TRANSITIONS
+        self.states = {state_class: state_class(self) for state_class in transitions}
+        for state_class, state in self.states.items():
+            state.transitions = {event: self.states[next_state_class]
+                                 for event, next_state_class in transitions[state_class].items()}
+        self.initial_state = self.states[initial_state]
+        self.state = None
+
+    def post(self, event):
+        """queue an event for the active state, can be called from any thread"""
+        self.events.put(event)
+
+    def stop(self):
+        """leave the event loop after the current event"""
+        self.is_stopping = True
+
+    def run(self):
+        """run the lifecycle on the calling thread until a final state stops it"""
+        self._enter(self.initial_state)
+        while not self.is_stopping:
+            timeout = self.state.poll_timeout()
+            watchdog.beat('lifecycle', timeout)
+            try:
+                event = self.events.get(timeout=timeout)
+            except queue.Empty:
+                with profiler.phase(self.state.get_profile_phase()):
+                    self.state.on_poll()
+                continue
+            next_state = self.state.on_event(event)
+            if next_state is self.state:
+                continue
+            with profiler.phase(self.state.get_profile_phase()):
+                self.state.on_exit()
+            self._enter(next_state)
+        watchdog.retire('lifecycle')
+
+    def _enter(self, state):
+        self.module_logger.info('lifecycle %s -> %s', self.state, state)
+        previous_state = self.state
+        self.state = state
+        if state.report_mode is not None and (previous_state is None or
+                                              previous_state.report_mode != state.report_mode):
+            self.data_provider.set_report_mode(state.report_mode)
+        with profiler.phase(state.get_profile_phase()):
+            state.on_enter()
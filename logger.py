@@ -1,4 +1,10 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+
+from config import SoftwareConfig
 
 """
 logger helper class for writing debug logs and save heating csv
@@ -9,28 +15,98 @@ WARNING     30
 INFO        20
 DEBUG       10
 NOTSET      0
+
+All records of the 'DishwasherOS' logger are put into a queue and written by a background listener
+thread, so logging never does console or SD card I/O on the calling thread. Use lazy %-style
+arguments (module_logger.debug('step %s', step)), the message is only formatted if the level is
+enabled and then on the listener thread.
 """
 
-def setup_logger():
+
+_listener = None
+_file_buffer = None
+
+
+class JsonFormatter(logging.Formatter):
+    """format a log record as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler which leaves the message formatting to the listener thread.
+    Log arguments must therefore not be modified after the logging call.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logger(swconfig: SoftwareConfig = None, file_name='runlog.log'):
+    global _listener, _file_buffer
+    swconfig = swconfig if swconfig is not None else SoftwareConfig()
     lg = logging.getLogger('DishwasherOS')
-    lg.setLevel(logging.DEBUG)
+    lg.setLevel(swconfig.log_level)
 
-    # create console handler
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.DEBUG)
+    if swconfig.log_json_format:
+        formatter = JsonFormatter(datefmt='%Y-%m-%d_%H:%M:%S')
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s|%(levelname)s|%(message)s',
+            '%Y-%m-%d_%H:%M:%S'
+        )
 
-    # create file handler
-    fh = logging.FileHandler('runlog.log')
+    handlers = []
+    if swconfig.log_console:
+        # create console handler
+        ch = logging.StreamHandler()
+        ch.setLevel(logging.DEBUG)
+        ch.setFormatter(formatter)
+        handlers.append(ch)
+
+    # create size based rotating file handler
+    fh = logging.handlers.RotatingFileHandler(file_name, maxBytes=swconfig.log_max_bytes,
+                                              backupCount=swconfig.log_backup_count)
     fh.setLevel(logging.DEBUG)
+    fh.setFormatter(formatter)
+    # buffer the records for the SD card, warnings and errors are written immediately
+    # and the buffer is flushed periodically by the StorageManager (see flush_file_log)
+    _file_buffer = logging.handlers.MemoryHandler(swconfig.log_buffer_records, flushLevel=logging.WARNING,
+                                                  target=fh)
+    _file_buffer.setLevel(logging.DEBUG)
+    handlers.append(_file_buffer)
 
-    formatter = logging.Formatter(
-        '%(asctime)s|%(levelname)s|%(message)s',
-        '%Y-%m-%d_%H:%M:%S'
-    )
+    log_queue = queue.SimpleQueue()
+    lg.addHandler(DeferredQueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # write all queued records before the interpreter exits
+    atexit.register(stop_logger)
+
+    # lg.info("logger start")
+
+
+def flush_file_log():
+    """write the buffered log records to the log file"""
+    if _file_buffer is not None:
+        _file_buffer.flush()
 
-    ch.setFormatter(formatter)
-    fh.setFormatter(formatter)
-    lg.addHandler(ch)
-    lg.addHandler(fh)
 
-    # lg.info("logger start")
\ No newline at end of file
+def stop_logger():
+    """write all queued log records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    flush_file_log()
@@ -1,9 +1,17 @@
-import time
 import os
 import logger
+import profiler
+import watchdog
+from checkpoint import CheckpointJournal, read_last_checkpoint, validate_checkpoint
 from dishwasher import Dishwasher
+from lifecycle import Lifecycle
+from operational_states import ProgramSelectionState, RunningState
 from program import WashingProgram
 from process_data import ProcessDataProvider
+from sample_ring import SampleRing
+from status_server import StatusServer
+from storage import StorageManager
+from telemetry_process import RECORD, RingSampleWriter, TelemetrySupervisor
 import logging
 
 logger.setup_logger()
@@ -18,97 +26,77 @@ if IN_DEVELOPMENT_RUN:
 dishwasher = Dishwasher()
 dishwasher.init_gpios()
 program = WashingProgram(dishwasher)
-data_provider = ProcessDataProvider(program)
-
-# get selected program
-dishwasher.set_buzzer(1)
-program.find_selected_program()
-
-while program.selected_program == 2:
-    module_logger.info('no program selected by user... waiting and try again after 30 sec.')
-    time.sleep(30)
-    program.find_selected_program()
-
-module_logger.info("start with washing program '{}' (nr {})".format(program.get_program_name(), program.selected_program))
-module_logger.info("estimated program duration: {} min".format(int(program.estimated_runtime/60)))
-
-# start the dishwasher intern program
-program.start_program()
-
-# define variables for in_program loop
-step_transition = 0
-running_loop_counter = 0
-current_temperature = 0.0
-
-while dishwasher.in_wash_program:
-    step_transition_is_triggered = dishwasher.step_transition_triggered
-    dishwasher.step_transition_triggered = False
-
-    old_step_operational = program.step_operational
-    time_left_step = program.get_time_left_operationalstep()
-    runtime_step_operational = time.time() - program.time_step_operational_start
-    current_temperature = dishwasher.read_temperature()
-
-    # process step transition in program module
-    if step_transition_is_triggered:
-        if step_transition == 0:
-            if old_step_operational in [7, 19, 38, 40]:
-                # TODO log heating step here
-                pass
-            module_logger.debug('step {} with overshoot of {}s'.format(old_step_operational, time_left_step))
-            if abs(time_left_step) > 10:
-                module_logger.warning('unusually large runtime deviation detected!')
-            program.get_next_step_operational()
-        step_transition += 1
-    elif program.step_operational >= 56 and time_left_step < 0:
-        step_transition = 0
-        program.get_next_step_operational()
-    else:
-        step_transition = 0
-
-    # check for hardware-software step desynchronization
-    program.check_program_sync()
-
-    # write cvs log column to file
-    data_provider.write_csv_data_record()
-
-    if program.step_operational != old_step_operational:
-        # the program has gone one step forward
-        module_logger.info('begin new step {} with runtime {}s'.format(program.step_operational,
-                                                                        program.get_time_left_operationalstep()))
-        if program.is_thermo_stop():
-            module_logger.debug('in a heating phase to {} °C'.format(program.get_target_temp()))
-
-        # workaround for freezing projector microcontroller # TODO fix projector firmware :/
-        if program.step_operational in [9, 15, 25, 35, 50]:
-            dishwasher.reset_projector()
-
-    running_loop_counter += 1
-    dishwasher.flip_debug_led()
-    time.sleep(1)
-
-delta_prediction = int(program.get_current_runtime() - program.estimated_runtime)
-module_logger.info('program end reached after {} minutes'.format(int(program.get_current_runtime() / 60)))
-module_logger.info('difference from the prediction of {} seconds'.format(delta_prediction))
-module_logger.info('used electricity: {} Wh'.format(data_provider.get_program_aenergy()))
-
-data_provider.write_csv_program_completion_record()
-
-dishwasher.set_buzzer(4)
-module_logger.info('wait for 0-position...')
-# the input pin 'heating' is used as a trigger for the 0-position
-while not dishwasher.read_input('sensorPinHeizen'):
-    dishwasher.flip_debug_led()
-    time.sleep(0.2)
-
-# wait some time for the dishwasher to run in stop position
-time.sleep(10)
-data_provider.timer.stop()
-dishwasher.set_lamp(True)
-dishwasher.set_buzzer(1)
-module_logger.info('program has finished successfully')
-dishwasher.dispose_gpios()
+if profiler.setup_profiler(program.swconfig) is not None:
+    module_logger.info('program run in profiling mode')
+watchdog.setup_watchdog(program.swconfig)
+storage = StorageManager(program.swconfig.storage_sync_interval, program.swconfig.storage_sync_bytes)
+storage.register_flush(logger.flush_file_log)
+storage.install_signal_handlers()
+
+# continue a run which was interrupted by a crash or power loss
+journal = None
+checkpoint = None
+if program.swconfig.checkpoint_journal:
+    checkpoint = read_last_checkpoint(program.swconfig.checkpoint_journal)
+    if checkpoint is not None:
+        reason = validate_checkpoint(checkpoint, dishwasher, program.swconfig)
+        if reason is not None:
+            module_logger.info('checkpoint of session %s is not resumed: %s', checkpoint.session_id, reason)
+            checkpoint = None
+    journal = CheckpointJournal(program.swconfig.checkpoint_journal)
+    if checkpoint is not None:
+        module_logger.warning('resume the interrupted session %s in step %s', checkpoint.session_id,
+                              checkpoint.step_operational)
+        journal.resume(checkpoint)
+        program.resume_program(checkpoint)
+    program.on_snapshot = journal.record
+
+session_id = checkpoint.session_id if checkpoint is not None else None
+telemetry_supervisor = None
+if program.swconfig.telemetry_process_enabled:
+    # the telemetry runs in its own process, see telemetry_process.py
+    ring = SampleRing.create('dishwasheros_samples', RECORD.size, program.swconfig.telemetry_process_ring_slots)
+    data_provider = RingSampleWriter(program, ring, session_id)
+    telemetry_supervisor = TelemetrySupervisor(data_provider, program.swconfig.telemetry_process_restart_delay,
+                                               program.swconfig.telemetry_process_hang_timeout)
+else:
+    data_provider = ProcessDataProvider(program, storage, session_id)
+if checkpoint is not None and checkpoint.aenergy_init:
+    # count the energy of the run from its start, not from the resume
+    data_provider.electricity_aenergy_init = checkpoint.aenergy_init
+if telemetry_supervisor is not None:
+    telemetry_supervisor.start()
+if journal is not None:
+    journal.session_id = data_provider.session_id
+    journal.get_aenergy_init = lambda: data_provider.electricity_aenergy_init
+
+status_server = None
+if program.swconfig.status_server_port and telemetry_supervisor is None:
+    status_server = StatusServer(data_provider.status_cache, program.swconfig.status_server_port)
+    status_server.start()
+
+# run the lifecycle from the program selection to the shutdown state
+lifecycle = Lifecycle(dishwasher, program, data_provider, status_server,
+                      initial_state=RunningState if checkpoint is not None else ProgramSelectionState)
+lifecycle.run()
+if journal is not None:
+    journal.stop()
+if telemetry_supervisor is not None:
+    telemetry_supervisor.stop()
+    ring.close()
+    ring.unlink()
+
+if profiler.is_enabled():
+    profile_file_name = '{}_Profile.txt'.format(int(program.time_start or 0))
+    profiler.write_report(os.path.join(program.swconfig.logging_directory, profile_file_name))
+
+if watchdog.is_enabled():
+    watchdog_file_name = '{}_Watchdog.txt'.format(int(program.time_start or 0))
+    watchdog.write_report(os.path.join(program.swconfig.logging_directory, watchdog_file_name))
 
 if not IN_DEVELOPMENT_RUN:
+    # write all staged data and queued log records before the shutdown
+    storage.stop()
+    logger.stop_logger()
     # shutdown the raspberry pi
     os.system("sudo shutdown -h now")
@@ -0,0 +1,179 @@
+"""
+MQTT publishing of the process data (setting `mqtt.enabled`), in addition to the HTTP backend.
+
+One persistent connection to the broker, all messages are retained, so a new subscriber gets the
+last state at once:
+
+    <baseTopic>/<device>/status             online / offline, offline is the Last Will
+    <baseTopic>/<device>/is_alive           is_alive JSON of the backend API
+    <baseTopic>/<device>/state              process data JSON of the backend API
+    <baseTopic>/<device>/field/<name>       one JSON value per field (`mqtt.perField`), only on change
+
+The Last Will is on the status topic and not on is_alive: is_alive carries the JSON of the backend
+API, a will there would replace it with a payload of another format for every subscriber.
+
+The telemetry thread never waits for the network: publish_state() only replaces the latest payload
+of each topic and wakes the sender thread. The sender publishes the latest payloads with QoS 1 as
+long as fewer than `mqtt.inflightWindow` messages are unacknowledged, payloads which are replaced
+before they are sent are never published, so a slow or lost connection costs neither memory nor
+bandwidth.
+
+The client is paho-mqtt (`pip install paho-mqtt`) unless another client with the same interface
+is passed, e.g. the in-process stand-in emulator.FakeMqttClient for tests.
+"""
+
+import json
+import logging
+import threading
+from collections import deque
+
+try:
+    import paho.mqtt.client as paho_mqtt
+except ImportError:
+    paho_mqtt = None
+
+STATUS_ONLINE = b'online'
+STATUS_OFFLINE = b'offline'
+
+
+def create_paho_client(client_id):
+    if paho_mqtt is None:
+        raise RuntimeError('paho-mqtt is required for the MQTT publishing')
+    if hasattr(paho_mqtt, 'CallbackAPIVersion'):
+        return paho_mqtt.Client(paho_mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+    return paho_mqtt.Client(client_id=client_id)
+
+
+class MqttSink:
+    def __init__(self, client, base_topic, device_identifier, qos=1, inflight_window=10, per_field=False):
+        """
+        :param client: paho-mqtt client or a client with the same interface
+        :param inflight_window: QoS 1 messages which may be unacknowledged at the same time
+        """
+        self.module_logger = logging.getLogger('DishwasherOS.MQTT')
+        self.client = client
+        self.topic = '{}/{}'.format(base_topic.rstrip('/'), device_identifier.replace(':', ''))
+        self.qos = qos
+        self.inflight_window = inflight_window
+        self.per_field = per_field
+        self.is_connected = False
+        # topic => latest payload which is not published yet
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        # message ids of the unacknowledged messages, only used by the sender thread
+        self.inflight = set()
+        # acknowledged message ids, appended by the client thread, None after a reconnect
+        self.acknowledged = deque()
+        # field name => last published JSON value
+        self.field_values = {}
+        self.published = 0
+        self.event_wakeup = threading.Event()
+        self.event_stop = threading.Event()
+        self.thread = threading.Thread(target=self._target, name='MqttSink', daemon=True)
+
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_publish = self._on_publish
+        client.will_set(self.topic + '/status', STATUS_OFFLINE, qos, retain=True)
+
+    @classmethod
+    def from_config(cls, swconfig, device_identifier, client=None):
+        if client is None:
+            client = create_paho_client('dishwasheros-{}'.format(device_identifier.replace(':', '')))
+            if swconfig.mqtt_username:
+                client.username_pw_set(swconfig.mqtt_username, swconfig.mqtt_password)
+        return cls(client, swconfig.mqtt_base_topic, device_identifier, swconfig.mqtt_qos,
+                   swconfig.mqtt_inflight_window, swconfig.mqtt_per_field)
+
+    def start(self, host, port=1883, keepalive=60):
+        """connect in the background, the client reconnects by itself after a lost connection"""
+        self.module_logger.info('publish to mqtt://%s:%s/%s', host, port, self.topic)
+        self.client.reconnect_delay_set(1, 60)
+        self.client.connect_async(host, port, keepalive)
+        self.client.loop_start()
+        self.thread.start()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code != 0:
+            self.module_logger.warning('mqtt connection refused: %s', reason_code)
+            return
+        self.module_logger.info('mqtt connected')
+        self.is_connected = True
+        # the messages of the lost connection are redelivered by the client, they no longer count
+        self.acknowledged.append(None)
+        self._stage(self.topic + '/status', STATUS_ONLINE)
+
+    def _on_disconnect(self, client, userdata, *args):
+        if self.is_connected:
+            self.module_logger.warning('mqtt connection lost')
+        self.is_connected = False
+        self.event_wakeup.set()
+
+    def _on_publish(self, client, userdata, mid, *args):
+        self.acknowledged.append(mid)
+        self.event_wakeup.set()
+
+    def _stage(self, topic, payload: bytes):
+        with self.pending_lock:
+            self.pending[topic] = payload
+        self.event_wakeup.set()
+
+    def publish_is_alive(self, payload: bytes):
+        self._stage(self.topic + '/is_alive', payload)
+
+    def publish_state(self, payload: bytes, sample=None):
+        """
+        :param payload: process data JSON of the backend API
+        :param sample: ProcessSample of the payload, needed for the per-field topics
+        """
+        self._stage(self.topic + '/state', payload)
+        if self.per_field and sample is not None:
+            for name, value in sample.as_dict().items():
+                value = json.dumps(value, separators=(',', ':')).encode('utf-8')
+                if self.field_values.get(name) != value:
+                    self.field_values[name] = value
+                    self._stage('{}/field/{}'.format(self.topic, name), value)
+
+    def _target(self):
+        while not self.event_stop.is_set():
+            self.event_wakeup.wait()
+            self.event_wakeup.clear()
+            self._send_pending()
+
+    def _send_pending(self):
+        while self.acknowledged:
+            mid = self.acknowledged.popleft()
+            if mid is None:
+                self.inflight.clear()
+            else:
+                self.inflight.discard(mid)
+        while self.is_connected and len(self.inflight) < self.inflight_window:
+            with self.pending_lock:
+                if not self.pending:
+                    return
+                topic = next(iter(self.pending))
+                payload = self.pending.pop(topic)
+            info = self.client.publish(topic, payload, self.qos, retain=True)
+            if info.rc != 0:
+                # not connected anymore, keep the payload unless it was replaced in the meantime
+                with self.pending_lock:
+                    self.pending.setdefault(topic, payload)
+                return
+            self.published += 1
+            if self.qos > 0:
+                self.inflight.add(info.mid)
+
+    def stop(self, timeout=5.0):
+        """publish the offline status and the pending payloads, then disconnect"""
+        self._stage(self.topic + '/status', STATUS_OFFLINE)
+        if self.thread.is_alive():
+            waited = 0.0
+            while self.is_connected and (self.pending or self.inflight or self.acknowledged) and waited < timeout:
+                self.event_stop.wait(0.05)
+                waited += 0.05
+                self.event_wakeup.set()
+            self.event_stop.set()
+            self.event_wakeup.set()
+            self.thread.join()
+        self.client.disconnect()
+        self.client.loop_stop()
@@ -1,28 +0,0 @@
-from state import State
-
-
-# https://python-3-patterns-idioms-test.readthedocs.io/en/latest/StateMachine.html
-# Start of our states
-class LockedState(State):
-    """
-    The state which indicates that there are limited device capabilities.
-    """
-
-    def on_event(self, event):
-        if event == 'pin_entered':
-            return UnlockedState()
-
-        return self
-
-
-class UnlockedState(State):
-    """
-    The state which indicates that there are no limitations on device
-    capabilities.
-    """
-
-    def on_event(self, event):
-        if event == 'device_locked':
-            return LockedState()
-
-        return self
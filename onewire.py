@@ -0,0 +1,184 @@
+"""
+1-Wire temperature sensors (DS18B20 and compatibles) on the w1 sysfs interface of the Linux kernel.
+
+All sensors of the bus are converted together: one `trigger` written to the `therm_bulk_read` file
+of the bus master starts the conversion on every sensor, afterwards each sensor only returns its
+converted value. The conversions run on a background thread, so reading a temperature never
+blocks on the bus and an additional sensor does not add another conversion time. The resolution
+of every sensor can be lowered to shorten the conversion (9 bit: 94 ms, 12 bit: 750 ms).
+
+Kernels without bulk read support fall back to reading the sensors one after another, still on
+the background thread.
+"""
+
+import glob
+import logging
+import os
+import time
+from threading import Event, Thread
+
+W1_DEVICES_PATH = '/sys/bus/w1/devices'
+
+# conversion time in seconds by resolution in bits
+_CONVERSION_TIME = {9: 0.094, 10: 0.188, 11: 0.375, 12: 0.75}
+# family codes of the 1-Wire thermometers supported by the w1_therm driver
+_THERMOMETER_FAMILIES = ('10', '22', '28', '3b', '42')
+
+
+def _read_file(path) -> str:
+    with open(path, 'r') as fd:
+        return fd.read().strip()
+
+
+def _write_file(path, value):
+    with open(path, 'w') as fd:
+        fd.write(str(value))
+
+
+class OneWireSensor:
+    __slots__ = ('name', 'address', 'path', 'resolution', 'is_failing')
+
+    def __init__(self, name, address, path):
+        self.name = name
+        self.address = address
+        self.path = path
+        self.resolution = 12
+        self.is_failing = False
+
+
+class OneWireBus:
+    def __init__(self, sensors: dict = None, resolutions: dict = None, read_interval=1.0,
+                 devices_path=W1_DEVICES_PATH):
+        """
+        :param sensors: name => address of the known sensors, other sensors on the bus are named by their address
+        :param resolutions: name => resolution in bits (9-12)
+        :param read_interval: seconds between the start of two bulk conversions
+        """
+        self.module_logger = logging.getLogger('DishwasherOS.OneWire')
+        self.devices_path = devices_path
+        self.read_interval = read_interval
+        self.sensors = []
+        # name => temperature in degrees celsius or None, replaced as a whole after every conversion
+        self.values = {}
+        self.event_stop = Event()
+        self.thread = None
+
+        names = {address: name for name, address in (sensors or {}).items()}
+        for address in sorted(set(self.discover()) | set(names)):
+            sensor = OneWireSensor(names.get(address, address), address, os.path.join(devices_path, address))
+            self.sensors.append(sensor)
+        for sensor in self.sensors:
+            self._init_resolution(sensor, (resolutions or {}).get(sensor.name))
+        self.bulk_read_paths = glob.glob(os.path.join(devices_path, 'w1_bus_master*', 'therm_bulk_read'))
+        self.module_logger.info('1-Wire sensors %s, bulk read %s',
+                                ', '.join('{}={} ({} bit)'.format(s.name, s.address, s.resolution) for s in self.sensors),
+                                'available' if self.bulk_read_paths else 'not available')
+
+    def discover(self) -> list:
+        """addresses of all thermometers on the bus"""
+        addresses = []
+        for path in glob.glob(os.path.join(self.devices_path, '*-*')):
+            address = os.path.basename(path)
+            if address.split('-')[0].lower() in _THERMOMETER_FAMILIES:
+                addresses.append(address)
+        return addresses
+
+    def _init_resolution(self, sensor: OneWireSensor, resolution):
+        resolution_path = os.path.join(sensor.path, 'resolution')
+        if resolution is not None:
+            try:
+                _write_file(resolution_path, int(resolution))
+            except OSError:
+                self.module_logger.warning('unable to set the resolution of sensor %s to %s bit', sensor.name, resolution)
+        try:
+            sensor.resolution = int(_read_file(resolution_path))
+        except (OSError, ValueError):
+            sensor.resolution = int(resolution) if resolution is not None else 12
+
+    @property
+    def conversion_time(self) -> float:
+        return max((_CONVERSION_TIME.get(sensor.resolution, 0.75) for sensor in self.sensors), default=0.0)
+
+    def start(self):
+        """read all sensors once and continue the conversions on the background thread"""
+        self.read_all()
+        self.thread = Thread(target=self._target, name='OneWire', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.event_stop.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def get_temperature(self, name) -> float:
+        """last converted temperature of a sensor, 0.0 if the sensor is unknown or failing"""
+        value = self.values.get(name)
+        return value if value is not None else 0.0
+
+    def get_temperatures(self) -> dict:
+        """name => last converted temperature of all sensors, the dict is never modified"""
+        return self.values
+
+    def _target(self):
+        time_next = time.monotonic() + self.read_interval
+        while not self.event_stop.wait(max(0.0, time_next - time.monotonic())):
+            time_next += self.read_interval
+            try:
+                self.read_all()
+            except Exception:
+                self.module_logger.exception('1-Wire conversion failed')
+
+    def read_all(self) -> dict:
+        """convert and read all sensors (blocking)"""
+        is_bulk_read = self._bulk_convert()
+        values = {}
+        for sensor in self.sensors:
+            values[sensor.name] = self._read_sensor(sensor, is_bulk_read)
+        self.values = values
+        return values
+
+    def _bulk_convert(self) -> bool:
+        """start the conversion on all sensors and wait for it, returns False without bulk read support"""
+        if not self.bulk_read_paths:
+            return False
+        try:
+            for path in self.bulk_read_paths:
+                _write_file(path, 'trigger')
+        except OSError:
+            self.module_logger.warning('unable to trigger the bulk conversion, reading the sensors one by one')
+            self.bulk_read_paths = []
+            return False
+        conversion_time = self.conversion_time
+        time_timeout = time.monotonic() + 2 * conversion_time + 0.1
+        self.event_stop.wait(conversion_time)
+        # -1: conversion running, 1: values available, 0: no bulk conversion pending
+        while time.monotonic() < time_timeout:
+            try:
+                if all(_read_file(path) != '-1' for path in self.bulk_read_paths):
+                    return True
+            except OSError:
+                return False
+            self.event_stop.wait(0.01)
+        # timeout, the sensors return the value of their last finished conversion
+        return True
+
+    def _read_sensor(self, sensor: OneWireSensor, is_bulk_read):
+        try:
+            if is_bulk_read:
+                # returns the value of the bulk conversion without a new conversion
+                temperature = int(_read_file(os.path.join(sensor.path, 'temperature'))) / 1000
+            else:
+                file_content = _read_file(os.path.join(sensor.path, 'w1_slave'))
+                lines = file_content.split('\n')
+                if len(lines) < 2 or not lines[0].endswith('YES'):
+                    raise ValueError('crc check failed')
+                temperature = int(lines[1].rsplit('t=', 1)[1]) / 1000
+        except (OSError, ValueError, IndexError) as e:
+            if not sensor.is_failing:
+                sensor.is_failing = True
+                self.module_logger.error('unable to read temperature sensor %s (%s): %s', sensor.name, sensor.address, e)
+            return None
+        if sensor.is_failing:
+            sensor.is_failing = False
+            self.module_logger.info('temperature sensor %s recovered', sensor.name)
+        return round(temperature, 1)
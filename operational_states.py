@@ -1,16 +1,75 @@
-import requests
+import logging
+import time
 
+import profiler
+from process_data import REPORT_AFTERRUNNING, REPORT_IS_ALIVE, REPORT_PROCESS_DATA
 from state import State
 
+# lifecycle events, posted to the event queue of the Lifecycle
+EVENT_SELECTOR_CHANGED = 'selector_changed'
+EVENT_PROGRAM_SELECTED = 'program_selected'
+EVENT_BACKEND_RELEASED = 'backend_released'
+EVENT_PROGRAM_FINISHED = 'program_finished'
+EVENT_ZERO_POSITION_REACHED = 'zero_position_reached'
+EVENT_MACHINE_STOPPED = 'machine_stopped'
+
+# steps at which the projector gets reset, workaround for freezing projector microcontroller
+# TODO fix projector firmware :/
+PROJECTOR_RESET_STEPS = frozenset((9, 15, 25, 35, 50))
+
+module_logger = logging.getLogger('DishwasherOS.Lifecycle')
+
 
 class ProgramSelectionState(State):
     """
     The state which indicates that the operator sill need to select a program.
+    The selection is probed once the selector inputs are quiet for the debounce time after an edge,
+    without edges the relays are only toggled every selection fallback interval.
     formerly state 1
     """
+    report_mode = REPORT_IS_ALIVE
+    profile_phase = profiler.PHASE_SELECTION
+
+    def __init__(self, lifecycle):
+        super().__init__(lifecycle)
+        self.time_probe = None
+
+    def on_enter(self):
+        self.machine.set_buzzer(1)
+        self.time_probe = None
+        self.machine.enable_selection_events(self.selection_edge_detected)
+        self.probe_selected_program()
+
+    def on_exit(self):
+        self.machine.disable_selection_events()
+
+    def selection_edge_detected(self, channel):
+        """GPIO callback for edges on the program selector inputs"""
+        if self.program.is_user_selection_edge():
+            self.lifecycle.post(EVENT_SELECTOR_CHANGED)
+
+    def poll_timeout(self):
+        if self.time_probe is None:
+            return self.swconfig.selection_fallback_interval
+        return max(0.0, self.time_probe - time.monotonic())
+
+    def on_event(self, event):
+        if event == EVENT_SELECTOR_CHANGED:
+            # debounce, wait until the selector inputs have settled
+            self.time_probe = time.monotonic() + self.swconfig.selection_debounce_time
+            return self
+        return super().on_event(event)
+
+    def on_poll(self):
+        self.time_probe = None
+        self.probe_selected_program()
 
-    def program_selected(self):
-        return WaitForBackendState(self.machine)
+    def probe_selected_program(self):
+        self.program.find_selected_program()
+        if self.program.selected_program == 2:
+            module_logger.info('no program selected by user... waiting for the program selector')
+        else:
+            self.lifecycle.post(EVENT_PROGRAM_SELECTED)
 
 
 class WaitForBackendState(State):
@@ -18,12 +77,136 @@ class WaitForBackendState(State):
     The state in which the machine is waiting for a backend answer and delays the start of the program as required
     formerly state 2
     """
+    report_mode = REPORT_IS_ALIVE
+    profile_phase = profiler.PHASE_SELECTION
+
+    def on_enter(self):
+        # the backend has no start delay API yet, the start is released at once
+        self.lifecycle.post(EVENT_BACKEND_RELEASED)
+
+
+class RunningState(State):
+    """
+    The state in which the washing program runs, polled with full resolution.
+    """
+    poll_interval = 1.0
+    report_mode = REPORT_PROCESS_DATA
+
+    def get_profile_phase(self):
+        return profiler.PHASE_HEATING if self.program.snapshot.is_thermo_stop else profiler.PHASE_NORMAL_STEP
+
+    def on_enter(self):
+        if self.machine.in_wash_program:
+            # resumed from a checkpoint, the dishwasher intern program is still running
+            module_logger.info("resume washing program '%s' (nr %s) in step %s", self.program.get_program_name(),
+                               self.program.selected_program, self.program.step_operational)
+        else:
+            module_logger.info("start with washing program '%s' (nr %s)", self.program.get_program_name(),
+                               self.program.selected_program)
+            module_logger.info('estimated program duration: %d min', self.program.estimated_runtime / 60)
+            # start the dishwasher intern program
+            self.program.start_program()
+        self.machine.start_edge_trace(self.program.swconfig.logging_directory, self.program.time_start,
+                                      self.program.step_operational)
+
+    def on_poll(self):
+        machine = self.machine
+        program = self.program
+        step_transition_is_triggered = machine.step_transition_triggered
+        machine.step_transition_triggered = False
+
+        old_step_operational = program.step_operational
+
+        # process step transition in program module
+        program.process_step_transition(step_transition_is_triggered)
+
+        # check for hardware-software step desynchronization
+        program.check_program_sync()
+
+        # write cvs log column to file
+        self.lifecycle.data_provider.write_csv_data_record(step_transition_is_triggered)
+
+        if program.step_operational != old_step_operational:
+            # the program has gone one step forward
+            machine.trace_step(program.step_operational)
+            self.lifecycle.data_provider.request_process_data()
+            module_logger.info('begin new step %s with runtime %ss', program.step_operational,
+                               program.get_time_left_operationalstep())
+            if program.is_thermo_stop():
+                module_logger.debug('in a heating phase to %s °C', program.get_target_temp())
+            if program.step_operational in PROJECTOR_RESET_STEPS:
+                machine.reset_projector()
+
+        machine.flip_debug_led()
+        if not machine.in_wash_program:
+            self.lifecycle.post(EVENT_PROGRAM_FINISHED)
+
+
+class AfterrunningState(State):
+    """
+    The state after the final step, the machine runs out until it reaches the 0-position.
+    """
+    poll_interval = 0.2
+    report_mode = REPORT_AFTERRUNNING
+    profile_phase = profiler.PHASE_AFTERRUNNING
+
+    def on_enter(self):
+        program = self.program
+        data_provider = self.lifecycle.data_provider
+        delta_prediction = int(program.get_current_runtime() - program.estimated_runtime)
+        module_logger.info('program end reached after %d minutes', program.get_current_runtime() / 60)
+        module_logger.info('difference from the prediction of %s seconds', delta_prediction)
+        module_logger.info('used electricity: %s Wh', data_provider.get_program_aenergy())
+
+        data_provider.write_csv_program_completion_record()
+        self.machine.stop_edge_trace()
+
+        self.machine.set_buzzer(4)
+        module_logger.info('wait for 0-position...')
+
+    def on_poll(self):
+        self.machine.flip_debug_led()
+        # the input pin 'heating' is used as a trigger for the 0-position
+        if self.machine.read_input('sensorPinHeizen'):
+            self.lifecycle.post(EVENT_ZERO_POSITION_REACHED)
+
+
+class ZeroPositionState(State):
+    """
+    The state in which the machine has reached the 0-position and runs in stop position.
+    """
+    # wait some time for the dishwasher to run in stop position
+    poll_interval = 10.0
+    report_mode = REPORT_AFTERRUNNING
+    profile_phase = profiler.PHASE_AFTERRUNNING
+
+    def on_poll(self):
+        self.lifecycle.post(EVENT_MACHINE_STOPPED)
+
 
-    def __init__(self, dishwasher):
-        super().__init__(dishwasher)
+class ShutdownState(State):
+    """
+    The final state, stops all services and releases the GPIOs.
+    """
+    report_mode = REPORT_IS_ALIVE
 
+    def on_enter(self):
+        self.lifecycle.data_provider.stop()
+        if self.lifecycle.status_server is not None:
+            self.lifecycle.status_server.stop()
+        self.machine.set_lamp(True)
+        self.machine.set_buzzer(1)
+        module_logger.info('program has finished successfully')
+        self.machine.dispose_gpios()
+        self.lifecycle.stop()
 
-    def doBackendCall(self):
-        # start a backend request
-        post_reg = requests.post('')
 
+# state => {event: next state}, compiled into State.transitions by the Lifecycle
+TRANSITIONS = {
+    ProgramSelectionState: {EVENT_PROGRAM_SELECTED: WaitForBackendState},
+    WaitForBackendState: {EVENT_BACKEND_RELEASED: RunningState},
+    RunningState: {EVENT_PROGRAM_FINISHED: AfterrunningState},
+    AfterrunningState: {EVENT_ZERO_POSITION_REACHED: ZeroPositionState},
+    ZeroPositionState: {EVENT_MACHINE_STOPPED: ShutdownState},
+    ShutdownState: {}
+}
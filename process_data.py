@@ -7,42 +7,131 @@ import os
 
 import serial
 import logging
-import traceback
 import requests
 import json
-from threading import Event, Thread
+import profiler
+import watchdog
+from threading import Event, Lock, Thread
 from program import WashingProgram
+from process_sample import ProcessSample, SensorValues, encode_backend_json, encode_is_alive_json, encode_serial_frame
+from circuit_breaker import CircuitBreaker
+from anomaly import AnomalyDetector
+from energy import EnergyAccountant
+from mqtt_sink import MqttSink
+from run_archive import RunArchive
+from sampling_policy import AdaptiveSamplingPolicy
+from status_server import StatusCache
+from storage import StorageManager, atomic_append, atomic_write
 
+_JSON_HEADERS = {'Content-Type': 'application/json'}
 
-def _format_integer(value, digits = None):
-    if digits:
-        return str(int(value)).zfill(digits)
-    else:
-        return str(int(value))
+# report modes, set by the lifecycle states (see operational_states.py)
+REPORT_IS_ALIVE = 'is_alive'
+REPORT_PROCESS_DATA = 'process_data'
+REPORT_AFTERRUNNING = 'afterrunning'
 
 
 class ProcessDataProvider:
-    def __init__(self, program: WashingProgram):
-        self.session_id = int(time.time())
+    def __init__(self, program: WashingProgram, storage: StorageManager, session_id=None, start_timer=True):
+        """
+        :param session_id: continue the session of a resumed run (see checkpoint.py)
+        :param start_timer: False if the samples are driven from outside (see telemetry_process.py)
+        """
+        self.session_id = session_id if session_id is not None else int(time.time())
         self.program = program
+        self.storage = storage
         self.swconfig = program.swconfig
         self.module_logger = logging.getLogger('DishwasherOS.ProcessData')
-        self.module_logger.info('initialize ProcessDataProvider with [session_id:{}]'.format(self.session_id))
-
-        self.data_report_state = 0
-        """ data_report_state list:
-            0   =>  only report is_alive, before program selection
-            1   =>  report process_data, active process
-            2   =>  report limited process_data, in afterrunning cycle
-            3   =>  only report is_alive, program ended
+        self.module_logger.info('initialize ProcessDataProvider with [session_id:%s]', self.session_id)
+
+        self.report_mode = REPORT_IS_ALIVE
+        """ report modes:
+            is_alive        =>  only report is_alive, before the program start and after the afterrunning cycle
+            process_data    =>  report process_data, active process
+            afterrunning    =>  report limited process_data, in afterrunning cycle
         """
-        self.last_process_data_report = False
-        self.backend_is_working = True
+        # the lifecycle and the timer thread both switch the report mode
+        self.report_mode_lock = Lock()
+
+        # snapshots of the collected process data for local consumers (see status_server.py)
+        self.status_cache = StatusCache(self.swconfig.status_history_length)
+
+        # one circuit breaker per remote endpoint, failing endpoints cost nothing on the hot path
+        self.breakers = {
+            name: CircuitBreaker(name, on_state_change=self.publish_endpoint_health,
+                                 **self.swconfig.circuit_breaker_settings)
+            for name in ('backend_run_state', 'backend_is_alive', 'electricity_meter')
+        }
+        self.publish_endpoint_health()
+
         self.electricity_meter_connected = False
         self.electricity_aenergy_init = 0.0
         self.read_initial_aenergy()
+        # energy per operational step, integrated from the apower readings of the running program
+        self.energy = EnergyAccountant()
+        # streaming anomaly checks of the running program, None if disabled
+        self.anomaly_detector = None
+        if self.swconfig.anomaly_enabled:
+            self.anomaly_detector = AnomalyDetector.from_config(self.swconfig)
+            self.anomaly_detector.load_baselines(self.swconfig.anomaly_baselines)
 
-        self.timer = SendProcessDataRepeatedTimer(self.swconfig.data_repeated_timer_interval, self.collect_process_data)
+        # optional persistent MQTT connection in addition to the backend, see mqtt_sink.py
+        self.mqtt_sink = None
+        if self.swconfig.mqtt_enabled:
+            try:
+                self.mqtt_sink = MqttSink.from_config(self.swconfig, self.program.machine.device_identifier)
+                self.mqtt_sink.start(self.swconfig.mqtt_host, self.swconfig.mqtt_port, self.swconfig.mqtt_keepalive)
+            except RuntimeError as e:
+                self.module_logger.warning('mqtt publishing disabled: %s', e)
+                self.mqtt_sink = None
+
+        # preallocated record which is filled in place on every tick
+        self.sample = ProcessSample(self.session_id, self.program.machine.device_identifier)
+        # the data record rows are written on the lifecycle thread, they get their own record
+        self.record_sensor_values = SensorValues()
+
+        # which ticks are reported to the backend and the MQTT broker, None reports every tick
+        self.sampling_policy = AdaptiveSamplingPolicy.from_config(self.swconfig) if self.swconfig.telemetry_adaptive else None
+        self.timer = None
+        # evaluates the last completed run, see write_csv_program_completion_record
+        self.post_run_thread = None
+        if start_timer:
+            self.timer = SendProcessDataRepeatedTimer(self.swconfig.data_repeated_timer_interval,
+                                                      self.collect_process_data)
+
+    def set_report_mode(self, report_mode, expected=None):
+        """
+        switch what the timer reports, see the report modes in __init__
+
+        :param expected: only switch if the report mode is still this one, the timer thread must not
+            overwrite a newer report mode of the lifecycle
+        """
+        with self.report_mode_lock:
+            if report_mode == self.report_mode or (expected is not None and self.report_mode != expected):
+                return
+            self.module_logger.info('report mode %s -> %s', self.report_mode, report_mode)
+            self.report_mode = report_mode
+        self.request_process_data()
+
+    def request_process_data(self):
+        """report at once instead of waiting for the next timer tick, e.g. after a step transition"""
+        if self.sampling_policy is not None:
+            self.sampling_policy.request_report()
+        if self.timer is not None:
+            self.timer.trigger()
+
+    def stop(self):
+        """stop the timer, wait for the evaluation of the last run and close the MQTT connection"""
+        if self.timer is not None:
+            self.timer.stop()
+        self.wait_post_run()
+        if self.mqtt_sink is not None:
+            self.mqtt_sink.stop()
+
+    def publish_endpoint_health(self, breaker: CircuitBreaker = None):
+        """publish the state of all circuit breakers to the status cache"""
+        health = {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+        self.status_cache.publish_health(json.dumps(health).encode('utf-8'))
 
     def read_initial_aenergy(self):
         """try to read and store the inital value of total aenergy from rpc electricity meter"""
@@ -51,7 +140,7 @@ class ProcessDataProvider:
         if electricity_aenergy_init is not None:
             self.electricity_meter_connected = True
             self.electricity_aenergy_init = float(electricity_aenergy_init)
-            self.module_logger.info('electricity meter connected with %s Wh' % self.electricity_aenergy_init)
+            self.module_logger.info('electricity meter connected with %s Wh', self.electricity_aenergy_init)
         else:
             self.module_logger.warning('electricity meter not found!')
 
@@ -70,153 +159,226 @@ class ProcessDataProvider:
             return metrics
         base_url = self.swconfig.electricity_meter_ip
         base_url = base_url.rstrip('/').lstrip('http://')
-        target_api_url = 'http://' + base_url + '/rpc/Switch.GetStatus?id=0'
+        target_api_url = 'http://' + base_url + self.swconfig.electricity_meter_path
+        breaker = self.breakers['electricity_meter']
+        if not breaker.allow_request():
+            return metrics
         try:
-            response = requests.get(target_api_url, verify=False)
+            response = requests.get(target_api_url, verify=False, timeout=self.swconfig.request_timeout)
             if response.ok:
                 data = json.loads(response.content)
-                metrics['aenergy'] = data.get('aenergy').get('total')
-                metrics['apower'] = int(data.get('apower')) if data.get('apower') is not None else None
+                aenergy = data.get('aenergy').get('total')
+                apower = int(data.get('apower')) if data.get('apower') is not None else None
+                metrics['aenergy'] = aenergy
+                metrics['apower'] = apower
         except requests.exceptions.RequestException as e:
-            pass
+            breaker.record_failure()
+        except (ValueError, TypeError, AttributeError) as e:
+            # a malformed answer ends a half-open probe like any other failure
+            if breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0:
+                self.module_logger.warning('malformed electricity meter response: %r', e)
+            breaker.record_failure()
+        else:
+            # an error response counts as a failure, a meter answering 5xx must open the breaker
+            if response.ok:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
         # self.module_logger.debug('electricity_meter_metrics request ' + json.dumps(metrics))
         return metrics
 
     def collect_process_data(self):
         """thread function to collect & transfer process data"""
-        if self.program.time_start is None or self.data_report_state == 3:
-            self.send_is_alive_backend()
+        with profiler.phase(profiler.PHASE_TELEMETRY):
+            self._collect_process_data()
+
+    def _collect_process_data(self):
+        # take one consistent snapshot of the program state, all values of the sample derive from it
+        snapshot = self.program.snapshot
+        report_mode = self.report_mode
+        policy = self.sampling_policy
+        if report_mode == REPORT_IS_ALIVE or snapshot.time_start is None:
+            self.send_is_alive_backend(policy is None or policy.is_idle_report_due())
             return
-        if self.program.time_start is not None and self.data_report_state == 0:
-            # start report for process_data
-            self.data_report_state = 1
-            self.module_logger.info('start data_report_state 1')
-        if self.program.time_end is not None and self.data_report_state == 1:
-            if not self.last_process_data_report:
-                self.last_process_data_report = True
-                self.module_logger.debug('prepare data_report_state 2')
-            else:
-                # start afterrunning cycle
-                self.data_report_state = 2
-                self.module_logger.info('start data_report_state 2 (afterrunning cycle)')
-        if self.data_report_state == 2:
-            current_time = int(time.time())
-            afterrunning_time_left = self.swconfig.program_afterrunning_cycle - (current_time - self.program.time_end)
+        time_now = self.program.clock()
+        afterrunning_time_left = None
+        if report_mode == REPORT_AFTERRUNNING and snapshot.time_end is not None:
+            afterrunning_time_left = self.swconfig.program_afterrunning_cycle - (int(time_now) - snapshot.time_end)
             if afterrunning_time_left < 0:
-                self.data_report_state = 3
-                self.module_logger.info('start data_report_state 3')
+                self.set_report_mode(REPORT_IS_ALIVE, expected=REPORT_AFTERRUNNING)
                 return
-        runtime = self.program.get_current_runtime()
-        time_left = self.program.get_time_left_program() if self.data_report_state == 1 else 0
-        if time_left + runtime == 0:
-            progress_percent = 0
-        elif self.program.time_end is None:
-            progress_percent = int((runtime / (time_left + runtime)) * 100)
-        else:
-            progress_percent = 100
         electricity_metrics = self.get_electricity_meter_metrics()
-        process_data = {
-            'session_id': self.session_id,
-            'device_identifier': self.program.machine.device_identifier,
-            'program_runtime': runtime,
-            'program_progress_percent': progress_percent,
-            'program_step_operational': self.program.step_operational,
-            'program_step_sequence': self.program.step_sequence,
-            'program_selected_id': self.program.selected_program,
-            'program_estimated_runtime': self.program.estimated_runtime,
-            'program_time_start': self.program.time_start,
-            'program_time_end': self.program.time_end,
-            'program_time_left_step': self.program.get_time_left_operationalstep() if self.data_report_state != 2 else afterrunning_time_left,
-            'program_time_left_sequence': self.program.get_time_left_sequence_step() if self.data_report_state != 2 else afterrunning_time_left,
-            'program_time_left_program': time_left,
-            'machine_temperature': self.program.machine.read_temperature(),
-            'machine_sensor_values': self.program.machine.read_actuator_sensor_values(),
-            'machine_aenergy': self.get_program_aenergy(electricity_metrics['aenergy']),
-            'machine_apower': electricity_metrics['apower']
-        }
-        # use process_data dict to distribute it to all endpoints
-        self.send_process_data_serial_projector(process_data)
-        self.send_process_data_backend(process_data)
+        # fill the preallocated process sample in place
+        sample = self.sample
+        sample.fill_program_values(snapshot, time_now, self.program.machine.read_temperature(), afterrunning_time_left)
+        sample.machine_temperatures = self.program.machine.read_temperatures()
+        self.program.machine.read_actuator_sensor_values(sample.machine_sensor_values)
+        sample.machine_aenergy = self.get_program_aenergy(electricity_metrics['aenergy'])
+        sample.machine_apower = electricity_metrics['apower']
+        if report_mode == REPORT_PROCESS_DATA:
+            time_monotonic = time.monotonic()
+            if sample.machine_apower is not None:
+                self.energy.add_sample(time_monotonic, sample.machine_apower, snapshot.step_operational,
+                                       snapshot.step_sequence, snapshot.is_thermo_stop)
+            if self.anomaly_detector is not None and snapshot.time_end is None:
+                sample.alerts = self.anomaly_detector.add_sample(
+                    time_monotonic, snapshot, sample.machine_temperature, sample.machine_apower,
+                    sample.machine_sensor_values)
+        # encode the sample once per sink and distribute it to all endpoints,
+        # the local displays follow every tick, the network reports follow the sampling policy
+        backend_payload = encode_backend_json(sample)
+        self.status_cache.publish(backend_payload)
+        self.send_process_data_serial_projector(sample)
+        if policy is not None:
+            if report_mode == REPORT_AFTERRUNNING:
+                is_report_due = policy.is_afterrunning_report_due()
+            else:
+                is_report_due = policy.is_running_report_due(snapshot, sample.machine_sensor_values,
+                                                              sample.program_time_left_step)
+            if not is_report_due:
+                return
+        self.send_process_data_backend(backend_payload)
+        if self.mqtt_sink is not None:
+            self.mqtt_sink.publish_state(backend_payload, sample)
 
-    def send_process_data_serial_projector(self, process_data):
-        if self.program.time_start is None:
+    def send_process_data_serial_projector(self, sample: ProcessSample):
+        if sample.program_time_start is None:
             return
-        if self.program.time_start is not None and self.program.time_end is None:
-            serial_data = "ETE{}PR{}T{}M0U{}E{}A{}H{}X".format(
-                _format_integer(process_data['program_time_left_program'], 4),
-                _format_integer(process_data['program_progress_percent'], 3),
-                _format_integer(process_data['machine_temperature'], 2),
-                _format_integer(process_data['machine_sensor_values']['pump_circulation']),
-                _format_integer(process_data['machine_sensor_values']['valve_inlet']),
-                _format_integer(process_data['machine_sensor_values']['valve_outlet']),
-                _format_integer(process_data['machine_sensor_values']['heating'])
-            )
-        else:
-            serial_data = "ETE0000PR111T00M0U0E0A0H0X"
+        serial_data = encode_serial_frame(sample)
 
-        serial_communicator = serial.Serial('/dev/ttyS0', 9600, timeout=0.5)
+        serial_communicator = serial.Serial(self.swconfig.projector_serial_port, self.swconfig.projector_baudrate,
+                                            timeout=0.5)
         serial_communicator.flush()
         try:
-            serial_communicator.write(serial_data.encode('utf-8'))
-            # self.module_logger.debug('send data to ttySO: ' + serial_data)
+            serial_communicator.write(serial_data)
+            # self.module_logger.debug('send data to ttySO: ' + serial_data.decode('utf-8'))
         except Exception as e:
             # or maybe serial.SerialException
-            self.module_logger.error(traceback.format_exc())
+            self.module_logger.error('unable to write to serial projector', exc_info=True)
         serial_communicator.close()
 
-    def send_process_data_backend(self, process_data):
+    def post_backend(self, endpoint, path, payload: bytes):
+        """post payload to the backend, skipped without any I/O while the endpoint breaker is open"""
+        breaker = self.breakers[endpoint]
+        if not breaker.allow_request():
+            return
         base_url = self.swconfig.backend_base_url
         base_url = base_url.rstrip('/')
-        target_api_url = base_url + '/insert/run_state/'
+        target_api_url = base_url + path
         try:
-            requests.post(target_api_url, verify=False, json=process_data)
+            response = requests.post(target_api_url, verify=False, data=payload, headers=_JSON_HEADERS,
+                                     timeout=self.swconfig.request_timeout)
         except requests.exceptions.RequestException as e:
             # backend call raised an exception
-            if self.backend_is_working:
+            if breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0:
                 self.module_logger.exception('backend call raised an exception')
-                self.backend_is_working = False
+            breaker.record_failure()
         else:
-            self.backend_is_working = True
+            if response.ok:
+                breaker.record_success()
+                return
+            if breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0:
+                self.module_logger.warning('backend call %s answered %s', path, response.status_code)
+            breaker.record_failure()
 
-    def send_is_alive_backend(self):
-        base_url = self.swconfig.backend_base_url
-        base_url = base_url.rstrip('/')
-        target_api_url = base_url + '/insert/is_alive/'
-        process_data = {
-            'session_id': self.session_id,
-            'device_identifier': self.program.machine.device_identifier}
-        try:
-            requests.post(target_api_url, verify=False, json=process_data)
-        except requests.exceptions.RequestException as e:
-            # backend call raised an exception
-            if self.backend_is_working:
-                self.module_logger.exception('backend call raised an exception')
-                self.backend_is_working = False
-        else:
-            self.backend_is_working = True
-
-    def write_csv_data_record(self):
-        time_start = self.program.time_start
-        logger_file_name = '{}_DataRecord.csv'.format(int(time_start))
-        logger_file_path = os.path.join(self.swconfig.logging_directory, logger_file_name)
-        with open(logger_file_path, 'a') as fd:
-            timestamp = time.strftime('%H:%M:%S')
-            runtime = self.program.get_current_runtime()
-            fd.write('{time};{runtime};{termostop};{step};{temp}\n'.format(
-                time=timestamp, runtime=runtime, termostop=self.program.is_thermo_stop(),
-                step=self.program.step_operational, temp=self.program.machine.read_temperature()))
+    def send_process_data_backend(self, payload: bytes):
+        self.post_backend('backend_run_state', '/insert/run_state/', payload)
+
+    def send_is_alive_backend(self, report=True):
+        """:param report: post to the backend and the MQTT broker, otherwise only update the status cache"""
+        payload = encode_is_alive_json(self.sample)
+        self.status_cache.publish(payload)
+        if not report:
+            return
+        self.post_backend('backend_is_alive', '/insert/is_alive/', payload)
+        if self.mqtt_sink is not None:
+            self.mqtt_sink.publish_is_alive(payload)
+
+    def get_csv_data_record_path(self):
+        logger_file_name = '{}_DataRecord.csv'.format(int(self.program.time_start))
+        return os.path.join(self.swconfig.logging_directory, logger_file_name)
+
+    def write_csv_data_record(self, step_transition_triggered=False):
+        """stage one row of the data record of the running program, the format is read by replay.py"""
+        snapshot = self.program.snapshot
+        sensor_values = self.program.machine.read_actuator_sensor_values(self.record_sensor_values)
+        temperature = self.program.machine.read_temperature()
+        time_now = self.program.clock()
+        timestamp = time.strftime('%H:%M:%S')
+        self.storage.append(self.get_csv_data_record_path(),
+                            '{time};{runtime};{termostop};{step};{temp};{program};{time_left};'
+                            '{drain};{circulation};{inlet};{outlet};{heating};{transition}\n'.format(
+                                time=timestamp, runtime=snapshot.get_current_runtime(time_now),
+                                termostop=snapshot.is_thermo_stop, step=snapshot.step_operational, temp=temperature,
+                                program=snapshot.selected_program,
+                                time_left=snapshot.get_time_left_program(time_now, temperature),
+                                drain=sensor_values.pump_drain, circulation=sensor_values.pump_circulation,
+                                inlet=sensor_values.valve_inlet, outlet=sensor_values.valve_outlet,
+                                heating=sensor_values.heating, transition=int(step_transition_triggered)))
 
     def write_csv_program_completion_record(self):
+        # publish the complete data record of this run
+        self.storage.complete(self.get_csv_data_record_path())
         record_file_path = os.path.join(self.swconfig.logging_directory, 'RunningLog.csv')
-        self.module_logger.debug('write {}'.format(record_file_path))
-        with open(record_file_path, 'a') as fd:
-            fd.write('{start_time};{program};{duration_est};{duration_real};{aenergy}\n'.format(
-                start_time=self.program.time_start,
-                program=self.program.selected_program,
-                duration_est=int(self.program.estimated_runtime),
-                duration_real=self.program.get_current_runtime(),
-                aenergy=self.get_program_aenergy()
-            ))
+        self.module_logger.debug('write %s', record_file_path)
+        atomic_append(record_file_path, '{start_time};{program};{duration_est};{duration_real};{aenergy}\n'.format(
+            start_time=self.program.time_start,
+            program=self.program.selected_program,
+            duration_est=int(self.program.estimated_runtime),
+            duration_real=self.program.get_current_runtime(),
+            aenergy=self.get_program_aenergy()
+        ).encode('utf-8'))
+        # the evaluation of the run writes several files, it must not block the lifecycle thread
+        self.wait_post_run()
+        self.post_run_thread = Thread(target=self.evaluate_run, name='PostRun',
+                                      args=(self.program.time_start, self.program.selected_program, time.monotonic()))
+        self.post_run_thread.start()
+
+    def evaluate_run(self, time_start, selected_program, time_end):
+        """post-run thread function, energy record, anomaly baselines and run archive of a completed run"""
+        self.write_csv_energy_record(time_start, selected_program)
+        self.save_anomaly_baselines(time_end)
+        self.archive_run(time_start)
+
+    def wait_post_run(self):
+        """wait for the evaluation of the last completed run"""
+        if self.post_run_thread is not None:
+            self.post_run_thread.join()
+            self.post_run_thread = None
+
+    def write_csv_energy_record(self, time_start, selected_program):
+        """write the per-step energy table of the run, see energy.py"""
+        if not self.energy.steps:
+            return
+        self.module_logger.info('integrated energy: %.1f Wh, per sequence %s', self.energy.total_wh(),
+                                {sequence: round(wh, 1) for sequence, wh in sorted(self.energy.sequence_wh().items())})
+        record_file_path = os.path.join(self.swconfig.logging_directory, '{}_EnergyRecord.csv'.format(int(time_start)))
+        atomic_write(record_file_path, self.energy.to_csv(selected_program).encode('utf-8'))
+
+    def save_anomaly_baselines(self, time_end):
+        """add the statistics of the run to the anomaly baselines, see anomaly.py"""
+        if self.anomaly_detector is None:
+            return
+        self.anomaly_detector.finish_run(time_end)
+        self.sample.alerts = ()
+        try:
+            self.anomaly_detector.save_baselines(self.swconfig.anomaly_baselines)
+        except OSError as e:
+            self.module_logger.warning('unable to save the anomaly baselines: %s', e)
+
+    def archive_run(self, time_start):
+        """add the completed run to the columnar run archive, see run_archive.py"""
+        archive_directory = self.swconfig.run_archive_directory
+        if not archive_directory:
+            return
+        try:
+            archive = RunArchive(archive_directory, self.program.definition)
+            try:
+                archive.archive_run(self.swconfig.logging_directory, time_start)
+            finally:
+                archive.close()
+        except Exception as e:
+            self.module_logger.warning('unable to archive the run: %s', e)
 
 
 class SendProcessDataRepeatedTimer(object):
@@ -228,19 +390,35 @@ class SendProcessDataRepeatedTimer(object):
         self.function = function
         self.args = args
         self.kwargs = kwargs
-        self.start = time.time()
         self.event = Event()
+        self.event_trigger = Event()
         self.thread = Thread(target=self._target)
         self.thread.start()
 
     def _target(self):
-        while not self.event.wait(self._time):
+        time_next = time.monotonic() + self.interval
+        while not self.event.is_set():
+            timeout = max(0.0, time_next - time.monotonic())
+            watchdog.beat('telemetry', timeout)
+            if self.event_trigger.wait(timeout):
+                # triggered call, the schedule restarts from now
+                self.event_trigger.clear()
+                if self.event.is_set():
+                    break
+                time_next = time.monotonic()
             self.function(*self.args, **self.kwargs)
+            # keep the schedule free of drift, calls missed by a slow call are skipped
+            time_next += self.interval
+            time_now = time.monotonic()
+            if time_next < time_now:
+                time_next = time_now + self.interval - (time_now - time_next) % self.interval
+        watchdog.retire('telemetry')
 
-    @property
-    def _time(self):
-        return self.interval - ((time.time() - self.start) % self.interval)
+    def trigger(self):
+        """call the function at once"""
+        self.event_trigger.set()
 
     def stop(self):
         self.event.set()
+        self.event_trigger.set()
         self.thread.join()
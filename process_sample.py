@@ -0,0 +1,192 @@
+"""
+Preallocated process data records and the encoders for all process data sinks.
+
+A ProcessSample is allocated once by the ProcessDataProvider and filled in place on every tick.
+The sinks serialize directly from the record instead of building and picking apart dicts.
+"""
+
+
+# input name of the hardware configuration => attribute of SensorValues
+ACTUATOR_INPUTS = {
+    'sensorPinMotor': 'pump_drain',
+    'sensorPinUmwelz': 'pump_circulation',
+    'sensorPinEinlauf': 'valve_inlet',
+    'sensorPinAblauf': 'valve_outlet',
+    'sensorPinHeizen': 'heating'
+}
+
+
+class SensorValues:
+    """GPIO actuator states of the dishwasher"""
+    __slots__ = ('pump_drain', 'pump_circulation', 'valve_inlet', 'valve_outlet', 'heating')
+
+    def __init__(self):
+        self.pump_drain = 0
+        self.pump_circulation = 0
+        self.valve_inlet = 0
+        self.valve_outlet = 0
+        self.heating = 0
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class SelectorValues:
+    """GPIO inputs used for the program selection detection"""
+    __slots__ = ('pinP4', 'pinP6', 'pinP7', 'pinP9', 'pinP10', 'pinP11', 'pinP12')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+
+class ProcessSample:
+    """one process data record, see ProcessDataProvider.collect_process_data()"""
+    __slots__ = (
+        'session_id',
+        'device_identifier',
+        'program_runtime',
+        'program_progress_percent',
+        'program_step_operational',
+        'program_step_sequence',
+        'program_selected_id',
+        'program_estimated_runtime',
+        'program_time_start',
+        'program_time_end',
+        'program_time_left_step',
+        'program_time_left_sequence',
+        'program_time_left_program',
+        'machine_temperature',
+        'machine_temperatures',
+        'machine_sensor_values',
+        'machine_aenergy',
+        'machine_apower',
+        'alerts'
+    )
+
+    def __init__(self, session_id=0, device_identifier=''):
+        for name in self.__slots__:
+            setattr(self, name, None)
+        self.session_id = session_id
+        self.device_identifier = device_identifier
+        self.machine_sensor_values = SensorValues()
+        self.machine_temperatures = {}
+        # kinds of the active anomaly alerts (see anomaly.py)
+        self.alerts = ()
+
+    def fill_program_values(self, snapshot, time_now, temperature, afterrunning_time_left=None):
+        """
+        fill the program values from a ProgramSnapshot (see program.py),
+        in the afterrunning cycle the time left values are replaced by the time left of the cycle
+        """
+        runtime = snapshot.get_current_runtime(time_now)
+        if afterrunning_time_left is None:
+            time_left = snapshot.get_time_left_program(time_now, temperature)
+            self.program_time_left_step = snapshot.get_time_left_operationalstep(time_now, temperature)
+            self.program_time_left_sequence = snapshot.get_time_left_sequence_step(time_now, temperature)
+        else:
+            time_left = 0
+            self.program_time_left_step = afterrunning_time_left
+            self.program_time_left_sequence = afterrunning_time_left
+        if time_left + runtime == 0:
+            self.program_progress_percent = 0
+        elif snapshot.time_end is None:
+            self.program_progress_percent = int((runtime / (time_left + runtime)) * 100)
+        else:
+            self.program_progress_percent = 100
+        self.program_runtime = runtime
+        self.program_step_operational = snapshot.step_operational
+        self.program_step_sequence = snapshot.step_sequence
+        self.program_selected_id = snapshot.selected_program
+        self.program_estimated_runtime = snapshot.estimated_runtime
+        self.program_time_start = snapshot.time_start
+        self.program_time_end = snapshot.time_end
+        self.program_time_left_program = time_left
+        self.machine_temperature = temperature
+
+    def as_dict(self) -> dict:
+        """return the record in the dict layout of the backend API"""
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['machine_sensor_values'] = self.machine_sensor_values.as_dict()
+        data['alerts'] = list(self.alerts)
+        return data
+
+
+def _json_value(value) -> str:
+    """encode int, float or None values as JSON literal"""
+    if value is None:
+        return 'null'
+    return str(value)
+
+
+def _json_string(value) -> str:
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _json_values(values: dict) -> str:
+    """encode a dict of name => int, float or None as JSON object"""
+    return '{' + ','.join(_json_string(name) + ':' + _json_value(value) for name, value in values.items()) + '}'
+
+
+_BACKEND_JSON_TEMPLATE = (
+    '{{"session_id":{},"device_identifier":{},"program_runtime":{},"program_progress_percent":{},'
+    '"program_step_operational":{},"program_step_sequence":{},"program_selected_id":{},'
+    '"program_estimated_runtime":{},"program_time_start":{},"program_time_end":{},'
+    '"program_time_left_step":{},"program_time_left_sequence":{},"program_time_left_program":{},'
+    '"machine_temperature":{},"machine_temperatures":{},"machine_sensor_values":{{"pump_drain":{},"pump_circulation":{},'
+    '"valve_inlet":{},"valve_outlet":{},"heating":{}}},"machine_aenergy":{},"machine_apower":{},"alerts":[{}]}}'
+)
+
+
+def encode_backend_json(sample: ProcessSample) -> bytes:
+    """encode the record as JSON body for the backend endpoint /insert/run_state/"""
+    sensor_values = sample.machine_sensor_values
+    return _BACKEND_JSON_TEMPLATE.format(
+        _json_value(sample.session_id),
+        _json_string(sample.device_identifier),
+        _json_value(sample.program_runtime),
+        _json_value(sample.program_progress_percent),
+        _json_value(sample.program_step_operational),
+        _json_value(sample.program_step_sequence),
+        _json_value(sample.program_selected_id),
+        _json_value(sample.program_estimated_runtime),
+        _json_value(sample.program_time_start),
+        _json_value(sample.program_time_end),
+        _json_value(sample.program_time_left_step),
+        _json_value(sample.program_time_left_sequence),
+        _json_value(sample.program_time_left_program),
+        _json_value(sample.machine_temperature),
+        _json_values(sample.machine_temperatures),
+        _json_value(sensor_values.pump_drain),
+        _json_value(sensor_values.pump_circulation),
+        _json_value(sensor_values.valve_inlet),
+        _json_value(sensor_values.valve_outlet),
+        _json_value(sensor_values.heating),
+        _json_value(sample.machine_aenergy),
+        _json_value(sample.machine_apower),
+        ','.join(_json_string(alert) for alert in sample.alerts)
+    ).encode('utf-8')
+
+
+def encode_is_alive_json(sample: ProcessSample) -> bytes:
+    """encode the record as JSON body for the backend endpoint /insert/is_alive/"""
+    return '{{"session_id":{},"device_identifier":{}}}'.format(
+        _json_value(sample.session_id),
+        _json_string(sample.device_identifier)
+    ).encode('utf-8')
+
+
+def encode_serial_frame(sample: ProcessSample) -> bytes:
+    """encode the record as frame for the serial projector"""
+    if sample.program_time_start is None or sample.program_time_end is not None:
+        return b'ETE0000PR111T00M0U0E0A0H0X'
+    sensor_values = sample.machine_sensor_values
+    return b'ETE%04dPR%03dT%02dM0U%dE%dA%dH%dX' % (
+        sample.program_time_left_program,
+        sample.program_progress_percent,
+        sample.machine_temperature,
+        sensor_values.pump_circulation,
+        sensor_values.valve_inlet,
+        sensor_values.valve_outlet,
+        sensor_values.heating
+    )
@@ -0,0 +1,202 @@
+"""
+Opt-in profiling of the execution phases of a wash.
+
+Enabled by the environment variable PROFILE_MODE (like IN_DEV_MODE) or the setting
+`profiling.mode`, both accept `sample` or `cprofile`:
+
+    sample      a background thread samples the stacks of all threads which are in a tagged phase,
+                low overhead, suited for a real wash on the device
+    cprofile    one cProfile profile per phase, exact call counts but slows the tagged code down
+
+Code is tagged with `with profiler.phase(profiler.PHASE_HEATING): ...`. Without profiling the
+phase context is a shared no-op. The report is written by write_report() at program end, the
+replay engine (python replay.py --profile) uses the same phases to find hotspots offline.
+"""
+
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+PHASE_SELECTION = 'selection'
+PHASE_HEATING = 'heating'
+PHASE_NORMAL_STEP = 'normal_step'
+PHASE_TELEMETRY = 'telemetry'
+PHASE_AFTERRUNNING = 'afterrunning'
+
+MODE_SAMPLE = 'sample'
+MODE_CPROFILE = 'cprofile'
+
+_NULL_PHASE = contextlib.nullcontext()
+_MAX_STACK_DEPTH = 64
+
+_profiler = None
+
+
+class _PhaseStats:
+    __slots__ = ('calls', 'total', 'max')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class PhaseProfiler:
+    def __init__(self, mode=MODE_SAMPLE, sample_interval=0.005, report_top=15):
+        if mode not in (MODE_SAMPLE, MODE_CPROFILE):
+            raise ValueError('unknown profiling mode {!r}'.format(mode))
+        self.mode = mode
+        self.sample_interval = sample_interval
+        self.report_top = report_top
+        self.lock = threading.Lock()
+        self.stats = defaultdict(_PhaseStats)
+        # thread id => name of the active phase
+        self.active_phases = {}
+        # sample mode: phase => Counter of stacks, cprofile mode: phase => cProfile.Profile
+        self.samples = defaultdict(Counter)
+        self.profiles = {}
+        self.sample_count = 0
+        self.event_stop = threading.Event()
+        self.thread = None
+        if mode == MODE_SAMPLE:
+            self.thread = threading.Thread(target=self._sample_target, name='Profiler', daemon=True)
+            self.thread.start()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """tag the code of the with block as phase name, phases of one thread can be nested"""
+        thread_id = threading.get_ident()
+        previous_phase = self.active_phases.get(thread_id)
+        profile = None
+        if self.mode == MODE_CPROFILE:
+            if previous_phase is not None:
+                self.profiles[previous_phase].disable()
+            profile = self.profiles.setdefault(name, cProfile.Profile())
+            profile.enable()
+        self.active_phases[thread_id] = name
+        time_begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - time_begin
+            if previous_phase is None:
+                del self.active_phases[thread_id]
+            else:
+                self.active_phases[thread_id] = previous_phase
+            if profile is not None:
+                profile.disable()
+                if previous_phase is not None:
+                    self.profiles[previous_phase].enable()
+            with self.lock:
+                stats = self.stats[name]
+                stats.calls += 1
+                stats.total += duration
+                stats.max = max(stats.max, duration)
+
+    def _sample_target(self):
+        own_thread_id = threading.get_ident()
+        while not self.event_stop.wait(self.sample_interval):
+            frames = sys._current_frames()
+            with self.lock:
+                self.sample_count += 1
+                for thread_id, name in list(self.active_phases.items()):
+                    frame = frames.get(thread_id)
+                    if frame is None or thread_id == own_thread_id:
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < _MAX_STACK_DEPTH:
+                        code = frame.f_code
+                        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                        frame = frame.f_back
+                    self.samples[name][tuple(stack)] += 1
+
+    def stop(self):
+        self.event_stop.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def report(self) -> str:
+        """compact text report with the timing of all phases and the hotspots of each phase"""
+        out = io.StringIO()
+        with self.lock:
+            if self.mode == MODE_SAMPLE:
+                out.write('profiling report, {} mode, {:.1f} ms sample interval, {} samples\n'.format(
+                    self.mode, self.sample_interval * 1000, self.sample_count))
+            else:
+                out.write('profiling report, {} mode\n'.format(self.mode))
+            out.write('{:<14} {:>8} {:>10} {:>10} {:>10}\n'.format('phase', 'calls', 'total s', 'mean ms', 'max ms'))
+            for name, stats in sorted(self.stats.items(), key=lambda item: -item[1].total):
+                out.write('{:<14} {:>8} {:>10.2f} {:>10.2f} {:>10.2f}\n'.format(
+                    name, stats.calls, stats.total, stats.total / stats.calls * 1000, stats.max * 1000))
+            for name in sorted(self.stats, key=lambda phase_name: -self.stats[phase_name].total):
+                out.write('\n== {} ==\n'.format(name))
+                if self.mode == MODE_SAMPLE:
+                    self._write_sample_hotspots(out, self.samples.get(name, Counter()))
+                elif name in self.profiles:
+                    stats_stream = io.StringIO()
+                    pstats.Stats(self.profiles[name], stream=stats_stream).sort_stats('cumulative') \
+                        .print_stats(self.report_top)
+                    # skip the header lines of pstats
+                    out.write(stats_stream.getvalue().split('\n\n', 2)[-1].strip('\n') + '\n')
+        return out.getvalue()
+
+    def _write_sample_hotspots(self, out, stacks: Counter):
+        total = sum(stacks.values())
+        if total == 0:
+            out.write('no samples\n')
+            return
+        self_samples = Counter()
+        inclusive_samples = Counter()
+        for stack, count in stacks.items():
+            self_samples[stack[0]] += count
+            for function in set(stack):
+                inclusive_samples[function] += count
+        out.write('{:>6} {:>6}  {}\n'.format('self%', 'incl%', 'function'))
+        for function, count in inclusive_samples.most_common(self.report_top):
+            file_name, line_number, function_name = function
+            out.write('{:>6.1f} {:>6.1f}  {}:{} {}\n'.format(
+                self_samples[function] / total * 100, count / total * 100,
+                os.path.basename(file_name), line_number, function_name))
+
+
+def setup_profiler(swconfig=None, mode=None):
+    """start the profiler if it is enabled by PROFILE_MODE, the mode argument or the SoftwareConfig"""
+    global _profiler
+    mode = mode or os.getenv('PROFILE_MODE') or (swconfig.profiling_mode if swconfig is not None else None)
+    if not mode:
+        return None
+    if swconfig is not None:
+        _profiler = PhaseProfiler(mode, swconfig.profiling_sample_interval, swconfig.profiling_report_top)
+    else:
+        _profiler = PhaseProfiler(mode)
+    return _profiler
+
+
+def is_enabled() -> bool:
+    return _profiler is not None
+
+
+def phase(name):
+    """context manager which tags a phase, a no-op if profiling is disabled or name is None"""
+    if _profiler is None or name is None:
+        return _NULL_PHASE
+    return _profiler.phase(name)
+
+
+def write_report(file_path):
+    """stop the profiler and write its report, returns the report or None if profiling is disabled"""
+    global _profiler
+    if _profiler is None:
+        return None
+    _profiler.stop()
+    report = _profiler.report()
+    _profiler = None
+    with open(file_path, 'w', encoding='utf-8') as fd:
+        fd.write(report)
+    return report
@@ -1,27 +1,117 @@
 import time
 import logging
+from typing import TYPE_CHECKING, NamedTuple, Optional
 from config import SoftwareConfig
-from dishwasher import Dishwasher
+from program_definition import ProgramDefinition
+from resync import SignatureIndex
+
+if TYPE_CHECKING:
+    # only used for type hints, keeps the module importable without RPi.GPIO (e.g. for replay.py)
+    from dishwasher import Dishwasher
+
+
+def _lookup(table, index, default=0):
+    """index a compiled step table, out of range steps return the default"""
+    if 0 <= index < len(table):
+        return table[index]
+    return default
+
+
+class ProgramSnapshot(NamedTuple):
+    """
+    Immutable state of the WashingProgram, published after every change.
+
+    The step dependent values are computed once when the snapshot is published, the time
+    dependent values are derived from them with a few arithmetic operations.
+    """
+    selected_program: int
+    program_name: str
+    step_operational: int
+    step_sequence: int
+    sequence_name: str
+    time_step_operational_start: float
+    time_start: Optional[int]
+    time_end: Optional[int]
+    estimated_runtime: float
+    is_thermo_stop: bool
+    target_temp: int
+    target_temp_sensor: Optional[float]
+    thermostop_starttemp: float
+    temp_growth_speed: float
+    step_runtime: float
+    runtime_after_step_sequence: float
+    runtime_after_step_program: float
+
+    @property
+    def is_running(self):
+        return self.time_start is not None and self.time_end is None
+
+    def get_current_runtime(self, time_now) -> int:
+        """return the runtime of the program in seconds"""
+        if self.time_start is None:
+            return 0
+        if self.time_end is None:
+            return int(round(time_now - self.time_start))
+        return int(round(self.time_end - self.time_start))
+
+    def get_time_left_operationalstep(self, time_now, temperature=0.0) -> int:
+        """time left of the operational step in seconds, the temperature is only used in thermo-stops"""
+        if self.selected_program in (1, 2) or self.time_start is None:
+            return 0
+        if self.is_thermo_stop:
+            time_total = (self.target_temp_sensor - self.thermostop_starttemp) / self.temp_growth_speed
+            time_curr = (temperature - self.thermostop_starttemp) / self.temp_growth_speed
+            return int(round(time_total - time_curr))
+        return int(round(self.step_runtime - (time_now - self.time_step_operational_start)))
+
+    def get_time_left_sequence_step(self, time_now, temperature=0.0):
+        """time left of the sequence in seconds"""
+        if self.selected_program in (1, 2) or self.time_start is None:
+            return 0
+        return self.get_time_left_operationalstep(time_now, temperature) + self.runtime_after_step_sequence
+
+    def get_time_left_program(self, time_now, temperature=0.0):
+        """time left of the complete program in seconds"""
+        if self.selected_program in (1, 2):
+            return 0
+        return self.get_time_left_operationalstep(time_now, temperature) + self.runtime_after_step_program
+
+    def get_progress_percent(self, time_now, temperature=0.0) -> int:
+        if self.time_end is not None:
+            return 100
+        runtime = self.get_current_runtime(time_now)
+        time_left = self.get_time_left_program(time_now, temperature)
+        if time_left + runtime == 0:
+            return 0
+        return int((runtime / (time_left + runtime)) * 100)
 
 
 class WashingProgram:
     """
     SOFTWARE ABSTRACTION LAYER for the dishwasher process control.
 
-    This class contains hardcoded individual program sequences for the Miele G 470.
-    Other machines require adaptation!
+    The program sequences are defined in a program definition file (default is the Miele G 470,
+    see programs/miele_g470.yaml) which is compiled into lookup tables by ProgramDefinition.
+    Other machines require an own definition file!
     """
 
-    def __init__(self, machine: Dishwasher):
+    def __init__(self, machine: 'Dishwasher', swconfig: SoftwareConfig = None, clock=time.time,
+                 definition: ProgramDefinition = None):
         self.machine = machine
         self.module_logger = logging.getLogger('DishwasherOS.SAL')
+        # time source of the program, replaced by a virtual clock in replay.py
+        self.clock = clock
 
         # process associated variables
         self.selected_program = 1
         self.step_operational = 1
         self.step_sequence = 1
-        self.time_step_operational_start = time.time()
+        self.time_step_operational_start = self.clock()
         self.thermostop_starttemp = 0
+        self.step_transition_count = 0
+
+        # program selection detection
+        self.time_selection_probe_end = 0.0
 
         # run statistics
         self.time_start = None
@@ -29,371 +119,224 @@ class WashingProgram:
         self.estimated_runtime = 0
 
         # configuration
-        self.swconfig = SoftwareConfig()
+        self.swconfig = swconfig if swconfig is not None else SoftwareConfig()
+        if definition is None:
+            definition = ProgramDefinition.load(self.swconfig.program_definition, self.swconfig)
+        self.definition = definition
+        # actuator signatures of the steps, the evidence for a resynchronization accumulates over the ticks
+        self.resync_index = SignatureIndex.load(definition, self.swconfig.resync_signatures, self.swconfig.resync_window)
+        self.resync_candidate = None
+        self.resync_doubt = 1.0
+
+        # consistent view of the program state for other threads, replaced atomically on every change
+        self.snapshot = None
+        # called with every new snapshot, e.g. by the checkpoint journal (see checkpoint.py)
+        self.on_snapshot = None
+        self.publish_snapshot()
+
+    def publish_snapshot(self):
+        """build a new immutable ProgramSnapshot and swap it in with a single reference assignment"""
+        definition = self.definition
+        program = self.selected_program
+        step = self.step_operational
+        is_thermo_stop = self.is_thermo_stop()
+        target_temp_sensor = None
+        if is_thermo_stop and program in definition.target_temp_sensor:
+            target_temp_sensor = _lookup(definition.target_temp_sensor[program], step, None)
+        runtime_after_step_sequence = 0
+        if program in definition.runtime_to_sequence_end:
+            runtime_after_step_sequence = _lookup(definition.runtime_to_sequence_end[program], step)
+        runtime_after_step_program = 0
+        if step <= definition.final_step and program in definition.runtime_to_end:
+            next_step = self.get_next_step_operational(True, step)
+            if next_step <= definition.final_step:
+                runtime_after_step_program = definition.runtime_to_end[program][next_step]
+        self.snapshot = ProgramSnapshot(
+            selected_program=program,
+            program_name=self.get_program_name(),
+            step_operational=step,
+            step_sequence=self.step_sequence,
+            sequence_name=self.get_sequence_name(),
+            time_step_operational_start=self.time_step_operational_start,
+            time_start=self.time_start,
+            time_end=self.time_end,
+            estimated_runtime=self.estimated_runtime,
+            is_thermo_stop=is_thermo_stop,
+            target_temp=self.get_target_temp(),
+            target_temp_sensor=target_temp_sensor,
+            thermostop_starttemp=self.thermostop_starttemp,
+            temp_growth_speed=self.swconfig.temp_growth_speed,
+            step_runtime=self.get_operational_time() * 60,
+            runtime_after_step_sequence=runtime_after_step_sequence,
+            runtime_after_step_program=runtime_after_step_program
+        )
+        if self.on_snapshot is not None:
+            self.on_snapshot(self.snapshot)
 
     def get_program_name(self):
         """get program name by program number"""
-        program_map = {
-            1: "VDE - 0",
-            2: "Stop - Start",
-            3: "Intensiv 65°C",
-            4: "Universal Plus 65°C",
-            5: "Universal Plus 55°C",
-            6: "Universal 65°C",
-            7: "Universal 55°C",
-            8: "Spar 65°C",
-            9: "Spar 55°C",
-            10: "Kurz 45°C",
-            11: "Fein 45°C",
-            12: "Kalt"
-        }
-        return program_map.get(self.selected_program, "Invalid")
+        return self.definition.program_names.get(self.selected_program, "Invalid")
 
     def __scan_selected_program(self):
         """private function to get selected program by reading sensor states"""
         sensor_values = self.machine.read_program_sensor_values()
-        if sensor_values.get('pinP4'):
-            if sensor_values.get('pinP9'):
-                return 10
-            if sensor_values.get('pinP12'):
-                return 9
-            else:
-                return 11
-        if sensor_values.get('pinP11'):
-            if sensor_values.get('pinP12'):
-                return 2
-            else:
-                return 12
-        if sensor_values.get('pinP6'):
-            if sensor_values.get('pinP7'):
-                return 5
-            else:
-                return 7
-        if sensor_values.get('pinP7'):
-            return 4
-        if sensor_values.get('pinP10'):
-            if sensor_values.get('pinP12'):
-                return 8
-            else:
-                return 6
-        return 3
+        mask = 0
+        for bit, name in enumerate(sensor_values.__slots__):
+            if getattr(sensor_values, name):
+                mask |= 1 << bit
+        return self.definition.selection_table[mask]
 
     def get_sequence_steplength(self):
-        sequence_map = {
-            0: 0,
-            1: 8,
-            2: 6,
-            3: 10,
-            4: 10,
-            5: 11,
-            6: 11,
-            7: 4
-        }
-        return sequence_map.get(self.step_sequence, 0)
+        return self.definition.sequence_steplength.get(self.step_sequence, 0)
 
     def get_last_sequence_step(self):
-        sequence_map = {
-            1: 8,
-            2: 14,
-            3: 24,
-            4: 34,
-            5: 45,
-            6: 56,
-            7: 60
-        }
-        return sequence_map.get(self.step_sequence, 0)
+        return self.definition.last_sequence_step.get(self.step_sequence, 0)
 
     def get_sequence_name(self):
         """get sequence name by program number"""
-        sequence_map = {
-            0: "Stop - Start",
-            1: "1. Vorspülen",
-            2: "2. Vorspülen",
-            3: "Reinigen",
-            4: "Zwichenspülen",
-            5: "Klarspülen",
-            6: "Trocknen",
-            7: "Auslaufen"
-        }
-        return sequence_map.get(self.step_sequence, "Invalid")
+        return self.definition.sequence_names.get(self.step_sequence, "Invalid")
 
     def get_target_temp(self, step_id=0):
         """return the target temperature in degrees celsius of a given step"""
-        if step_id == 0:
-            var = self.step_operational
-        else:
-            var = step_id
-        if 1 <= var <= 8:
-            if self.selected_program == 3:
-                return 66
-        if 15 <= var <= 24:
-            if self.selected_program in [3, 4, 6, 8]:
-                return 66
-            elif self.selected_program in [5, 7, 9]:
-                return 56
-            elif self.selected_program in [10, 11]:
-                return 45
-        if 35 <= var < 39:
-            if 3 <= self.selected_program <= 11:
-                return 45
-        if 39 <= var <= 45:
-            if self.selected_program in [3, 4, 5, 6, 7, 8]:
-                return 66
-            elif self.selected_program in [9, 10, 11]:
-                return 56
-        return 0
+        step = self.step_operational if step_id == 0 else step_id
+        table = self.definition.target_temp.get(self.selected_program)
+        if table is None:
+            return 0
+        return _lookup(table, step)
 
     def is_thermo_stop(self, step_id=0):
-        if step_id == 0:
-            var = self.step_operational
-        else:
-            var = step_id
-        if var in [7, 19, 38, 40]:
-            return True
-        else:
-            return False
+        step = self.step_operational if step_id == 0 else step_id
+        return _lookup(self.definition.thermo_stop, step, False)
 
     def get_operational_time(self, step_id=0):
         """get execution time of one given step in minutes"""
-        operational_map = {
-            1: 0.5,
-            2: 0.5,
-            3: 0.5,
-            4: 1,
-            5: 0.5,
-            6: 4,
-            7: 0.5,
-            8: 0.5,
-            9: 0.5,
-            10: 1,
-            11: 1,
-            12: 4,
-            13: 4,
-            14: 0.5,
-            15: 0.5,
-            16: 1,
-            17: 1,
-            18: 0.5,
-            19: 0.5,
-            20: 4,
-            21: 4,
-            22: 1,
-            23: 1,
-            24: 0.5,
-            25: 0.5,
-            26: 0.5,
-            27: 0.5,
-            28: 1,
-            29: 0.5,
-            30: 0.5,
-            31: 0.5,
-            32: 0.5,
-            33: 1,
-            34: 0.5,
-            35: 0.5,
-            36: 1,
-            37: 1,
-            38: 0.5,
-            39: 0.5,
-            40: 0.5,
-            41: 0.5,
-            42: 0.5,
-            43: 0.5,
-            44: 0.5,
-            45: 0.5,
-            46: 0.5,
-            47: 0.5,
-            48: 0.5,
-            49: 0.5,
-            50: 1,
-            51: 4,
-            52: 0.5,
-            53: 4,
-            54: 0.5,
-            55: 0.5,
-            56: 1,
-            57: 1,
-            58: 4,
-            59: 4,
-        }
-        if step_id == 0:
-            return operational_map.get(self.step_operational, 0)
-        else:
-            return operational_map.get(step_id, 0)
+        step = self.step_operational if step_id == 0 else step_id
+        return _lookup(self.definition.operational_time, step)
 
     def check_program_sync(self):
-        new_step_operational = 0
-        valve_outlet = self.machine.read_input('sensorPinAblauf')
-        if valve_outlet:
-            if 4 <= self.step_operational <= 6:
-                new_step_operational = 3
-            if 10 <= self.step_operational <= 13:
-                new_step_operational = 9
-            if 16 <= self.step_operational <= 19:
-                new_step_operational = 15
-            if 20 <= self.step_operational <= 23:
-                new_step_operational = 24
-            if 26 <= self.step_operational <= 29:
-                new_step_operational = 25
-            if 30 <= self.step_operational <= 33:
-                new_step_operational = 34
-            if 36 <= self.step_operational <= 40:
-                new_step_operational = 35
-            if 41 <= self.step_operational <= 43:
-                new_step_operational = 44
-            if 46 <= self.step_operational <= 51:
-                new_step_operational = 45
-            if 52 <= self.step_operational <= 55:
-                new_step_operational = 56
-        if new_step_operational != 0:
+        """match the actuator inputs against the signature of the step, see resync.py"""
+        row = self.resync_index.get_row(self.selected_program, self.step_operational)
+        if row is None:
+            # no signature and no resynchronization rule for this step, the inputs do not need to be read
+            return
+        mask = self.machine.read_actuator_mask(row.care_mask)
+        entry = row.entries[mask]
+        if entry is None:
+            # the inputs fit the step
+            self.resync_candidate = None
+            return
+        new_step_operational, confidence = entry
+        if not self.resync_index.is_in_temperature_band(self.selected_program, new_step_operational,
+                                                        self.machine.read_temperature()):
+            confidence /= 2
+        candidate = (self.step_operational, new_step_operational)
+        if candidate != self.resync_candidate:
+            self.resync_candidate = candidate
+            self.resync_doubt = 1.0
+        self.resync_doubt *= 1.0 - confidence
+        confidence = 1.0 - self.resync_doubt
+        if confidence >= self.swconfig.resync_threshold:
             self.module_logger.warning('incorrectly synchronized program step detected!')
-            self.module_logger.warning('step correction initiated. old step {}, new step {} ({})'.format(
-                self.step_operational, new_step_operational, valve_outlet
-            ))
+            self.module_logger.warning('step correction initiated. old step %s, new step %s (mask %s, confidence %.2f)',
+                                       self.step_operational, new_step_operational, mask, confidence)
+            self.resync_candidate = None
             self.set_new_operational_step(new_step_operational)
 
     def get_next_step_operational(self, get_next_step=False, step_id=0):
         """returns the next step depending on the selected program"""
-        if step_id == 0:
-            step = self.step_operational
-        else:
-            step = step_id
-        new_step_operational = 0
-        if self.selected_program in [4, 5]:
-            if step == 6:
-                new_step_operational = 8
-        if self.selected_program in [6, 7, 11, 12]:
-            if 2 <= step <= 8:
-                if not get_next_step:
-                    self.step_sequence = 2
-                new_step_operational = 9
-        if self.selected_program in [8, 9, 10]:
-            if 2 <= step <= 14:
-                if not get_next_step:
-                    self.step_sequence = 3
-                new_step_operational = 15
-        if self.selected_program == 10:
-            if step == 19:
-                new_step_operational = 24
-            if step == 28:
-                new_step_operational = 34
-            if step == 40:
-                new_step_operational = 44
-            if step == 47:
-                new_step_operational = 56
-        if self.selected_program == 12:
-            if 14 <= step <= 55:
-                new_step_operational = 56
-                if not get_next_step:
-                    self.step_sequence = 6
-            if 56 <= step <= 59:
-                new_step_operational = 60
-                if not get_next_step:
-                    self.step_sequence = 7
+        step = self.step_operational if step_id == 0 else step_id
+        table = self.definition.next_step.get(self.selected_program)
+        new_step_operational = step + 1 if table is None else _lookup(table, step, step + 1)
         if get_next_step:
-            if new_step_operational == 0:
-                return step + 1
-            else:
-                return new_step_operational
-        if new_step_operational == 0:
-            self.set_new_operational_step(step + 1)
+            return new_step_operational
+        self.set_new_operational_step(new_step_operational)
+
+    def process_step_transition(self, step_transition_triggered):
+        """advance the operational step on a motor step transition or by runtime in the final steps"""
+        old_step_operational = self.step_operational
+        time_left_step = self.get_time_left_operationalstep()
+        if step_transition_triggered:
+            if self.step_transition_count == 0:
+                if self.is_thermo_stop(old_step_operational):
+                    # TODO log heating step here
+                    pass
+                self.module_logger.debug('step %s with overshoot of %ss', old_step_operational, time_left_step)
+                if abs(time_left_step) > 10:
+                    self.module_logger.warning('unusually large runtime deviation detected!')
+                self.get_next_step_operational()
+            self.step_transition_count += 1
+        elif self.step_operational >= self.definition.final_step and time_left_step < 0:
+            self.step_transition_count = 0
+            self.get_next_step_operational()
         else:
-            self.set_new_operational_step(new_step_operational)
+            self.step_transition_count = 0
 
     def get_time_left_operationalstep(self):
         """get time left of the current operational step in seconds"""
-        if self.selected_program in (1, 2) or self.time_start is None:
-            return 0
-        time_now = time.time()
-        time_run = time_now - self.time_step_operational_start
-        if self.is_thermo_stop():
-            temp_now = self.machine.read_temperature()
-            temp_target_sensor = self.swconfig.get_program_target_temps(self.get_target_temp())
-
-            gradient = self.swconfig.temp_growth_speed
-            time_total = (temp_target_sensor - self.thermostop_starttemp) / gradient
-            time_curr = (temp_now - self.thermostop_starttemp) / gradient
-            time_left = round(time_total - time_curr)
-        else:
-            time_left = round((self.get_operational_time() * 60) - time_run)
-        return int(time_left)
+        snapshot = self.snapshot
+        temperature = self.machine.read_temperature() if snapshot.is_thermo_stop else 0.0
+        return snapshot.get_time_left_operationalstep(self.clock(), temperature)
 
     def get_time_left_sequence_step(self):
         """get time left of the current sequence in seconds"""
-        if self.selected_program in (1, 2) or self.time_start is None:
-            return 0
-        step_last = self.get_last_sequence_step()
-        time_left = self.get_time_left_operationalstep()
-        if self.step_operational != step_last:
-            i = self.get_next_step_operational(True, self.step_operational)
-            time_left += self.get_runtime_for_steps(i, step_last + 1)
-        return time_left
+        snapshot = self.snapshot
+        temperature = self.machine.read_temperature() if snapshot.is_thermo_stop else 0.0
+        return snapshot.get_time_left_sequence_step(self.clock(), temperature)
 
     def get_time_left_program(self):
         """get time left of the complete program in seconds"""
-        if self.selected_program in (1, 2):
-            return 0
-        time_left = self.get_time_left_operationalstep()
-        if self.step_operational < 57:
-            i = self.get_next_step_operational(True, self.step_operational)
-            time_left += self.get_runtime_for_steps(i, 57)
-        return time_left
+        snapshot = self.snapshot
+        temperature = self.machine.read_temperature() if snapshot.is_thermo_stop else 0.0
+        return snapshot.get_time_left_program(self.clock(), temperature)
 
     def get_runtime_for_steps(self, step_start, step_end):
         """get the runtime in a given step range in seconds"""
+        step_runtime = self.definition.step_runtime[self.selected_program]
         i = step_start
         time_left = 0
         while i < step_end:
-            if self.is_thermo_stop(i):
-                if i == 38:
-                    temp_start = 25
-                elif i == 40:
-                    temp_start = 35
-                else:
-                    temp_start = 17
-                temp_target_sensor = self.swconfig.get_program_target_temps(self.get_target_temp(i))
-                test = self.get_target_temp(i)
-
-                gradient = self.swconfig.temp_growth_speed
-                time_head = (temp_target_sensor - temp_start) / gradient
-                time_left += round(time_head)
-            else:
-                time_left += self.get_operational_time(i) * 60
+            time_left += _lookup(step_runtime, i)
             i = self.get_next_step_operational(True, i)
         return time_left
 
     def get_current_runtime(self):
         """return the runtime of the current program in seconds"""
-        if self.time_start is None:
-            runtime = 0
-        elif self.time_end is None:
-            runtime = round(time.time() - self.time_start)
-        else:
-            runtime = round(self.time_end - self.time_start)
-        return int(runtime)
+        return self.snapshot.get_current_runtime(self.clock())
 
     def set_new_operational_step(self, step_new):
         self.step_operational = step_new
-        self.time_step_operational_start = time.time()
-        # check if sequence is finished
-        if self.step_operational > self.get_last_sequence_step():
-            # start next sequence
-            self.step_sequence += 1
+        self.time_step_operational_start = self.clock()
+        # the sequence follows from the step, skips and resynchronizations may cross sequences
+        self.step_sequence = _lookup(self.definition.sequence_of_step, self.step_operational, self.step_sequence)
         if self.is_thermo_stop():
             self.thermostop_starttemp = self.machine.read_temperature()
+        self.publish_snapshot()
         # check if main program has ended
-        if self.step_operational > 56:
+        if self.step_operational > self.definition.final_step:
             self.finish_program()
 
     def find_selected_program(self):
         """find the selected program by toggle relays and read sensor response"""
+        self.time_selection_probe_end = float('inf')
         self.machine.set_all_relays(True)
-        time.sleep(0.5)
-        self.selected_program = self.__scan_selected_program()
+        time.sleep(self.swconfig.selection_probe_settle_time)
+        selected_program = self.__scan_selected_program()
         self.machine.set_all_relays(False)
-        # save estimated program runtime
+        self.time_selection_probe_end = time.monotonic()
+        self.select_program(selected_program)
+
+    def is_user_selection_edge(self) -> bool:
+        """return True if an edge on the program selector inputs was not caused by a running probe"""
+        # the relays of a running probe toggle the selector inputs themselves
+        return time.monotonic() - self.time_selection_probe_end > self.swconfig.selection_debounce_time
+
+    def select_program(self, program_id):
+        """set the selected program and save its estimated runtime"""
+        self.selected_program = program_id
+        self.publish_snapshot()
         if self.selected_program != 1 and self.selected_program != 2:
             self.estimated_runtime = self.get_time_left_program()
+            self.publish_snapshot()
 
     def start_program(self):
         """start the selected program and toggle main relay"""
@@ -402,10 +345,28 @@ class WashingProgram:
         self.machine.set_main_relay(True)
         self.machine.in_wash_program = True
         # start timer
-        self.time_start = int(time.time())
+        self.time_start = int(self.clock())
+        self.publish_snapshot()
+
+    def resume_program(self, checkpoint):
+        """continue an interrupted run from its last checkpoint without restarting the dishwasher"""
+        self.selected_program = checkpoint.selected_program
+        self.step_operational = checkpoint.step_operational
+        self.step_sequence = checkpoint.step_sequence
+        self.time_step_operational_start = checkpoint.time_step_operational_start
+        self.thermostop_starttemp = checkpoint.thermostop_starttemp
+        self.step_transition_count = 0
+        self.time_start = checkpoint.time_start
+        self.time_end = None
+        self.estimated_runtime = checkpoint.estimated_runtime
+        self.machine.set_lamp(True)
+        self.machine.set_main_relay(True)
+        self.machine.in_wash_program = True
+        self.publish_snapshot()
 
     def finish_program(self):
-        """end the selected program because step 56 was crossed"""
+        """end the selected program because the final step was crossed"""
         self.machine.in_wash_program = False
         self.machine.set_lamp(False)
-        self.time_end = int(time.time())
+        self.time_end = int(self.clock())
+        self.publish_snapshot()
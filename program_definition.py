@@ -0,0 +1,175 @@
+"""
+Declarative program definitions of a dishwasher model.
+
+A program definition file (see programs/miele_g470.yaml) describes the steps, sequences, skips,
+target temperatures, thermo-stops and resynchronization rules of all programs. The compiler turns
+it into flat lookup tables when loaded, so every per-tick query of the WashingProgram is an index.
+Supporting another model means adding a definition file.
+"""
+
+import os
+
+import yaml
+
+from process_sample import SelectorValues
+
+_BASE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PROGRAM_DEFINITION = os.path.join(_BASE_DIRECTORY, 'programs', 'miele_g470.yaml')
+
+
+class ProgramDefinitionError(Exception):
+    pass
+
+
+def _step_range(rule):
+    first, last = rule['steps']
+    return range(int(first), int(last) + 1)
+
+
+class ProgramDefinition:
+    """
+    Compiled program definition.
+
+    Tables indexed by step number are lists of length `step_count`, tables which additionally
+    depend on the program are dicts of program number => list. The runtime tables (estimated
+    runtimes in seconds) are only compiled if the target temperatures are known.
+    """
+
+    def __init__(self, definition: dict, target_temp_sensor=None, temp_growth_speed=None):
+        """
+        :param definition: parsed program definition file
+        :param target_temp_sensor: function nominal target temperature => sensor temperature
+        :param temp_growth_speed: heating speed in degrees celsius per second
+        """
+        try:
+            self._compile(definition, target_temp_sensor, temp_growth_speed)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ProgramDefinitionError('invalid program definition: {!r}'.format(e)) from e
+
+    @classmethod
+    def load(cls, file_path=None, swconfig=None):
+        """
+        load and compile a program definition file, runtime tables require the SoftwareConfig
+        :param file_path: relative paths are resolved against the DishwasherOS directory
+        """
+        file_path = os.path.join(_BASE_DIRECTORY, file_path or DEFAULT_PROGRAM_DEFINITION)
+        with open(file_path, 'r', encoding='utf-8') as stream:
+            definition = yaml.safe_load(stream)
+        if swconfig is None:
+            return cls(definition)
+        return cls(definition, swconfig.get_program_target_temps, swconfig.temp_growth_speed)
+
+    def _compile(self, definition, target_temp_sensor, temp_growth_speed):
+        self.manufacturer = definition.get('manufacturer')
+        self.model = definition.get('model')
+        self.program_names = {int(k): str(v) for k, v in definition['programs'].items()}
+        self.final_step = int(definition['final_step'])
+
+        operational_times = {int(k): float(v) for k, v in definition['steps'].items()}
+        sequences = sorted(definition['sequences'], key=lambda sequence: int(sequence['last_step']))
+        self.step_count = max(max(operational_times), max(int(s['last_step']) for s in sequences)) + 2
+
+        # sequence tables
+        self.sequence_names = {}
+        self.last_sequence_step = {}
+        self.sequence_steplength = {}
+        previous_last_step = 0
+        for sequence in sequences:
+            sequence_id = int(sequence['id'])
+            self.sequence_names[sequence_id] = str(sequence['name'])
+            self.last_sequence_step[sequence_id] = int(sequence['last_step'])
+            self.sequence_steplength[sequence_id] = int(sequence['last_step']) - previous_last_step
+            previous_last_step = int(sequence['last_step'])
+        self.sequence_of_step = [0] * self.step_count
+        last_sequence_id = int(sequences[-1]['id'])
+        for step in range(self.step_count):
+            self.sequence_of_step[step] = next(
+                (int(s['id']) for s in sequences if step <= int(s['last_step'])), last_sequence_id + 1)
+
+        # step tables
+        self.operational_time = [operational_times.get(step, 0) for step in range(self.step_count)]
+        thermo_stops = {int(k): float(v) for k, v in (definition.get('thermo_stops') or {}).items()}
+        self.thermo_stop = [step in thermo_stops for step in range(self.step_count)]
+        self.thermo_stop_start_temp = [thermo_stops.get(step, 0) for step in range(self.step_count)]
+
+        # resynchronization table, step => step to jump to while the sync input is active
+        sync = definition.get('sync') or {}
+        self.sync_input = sync.get('input')
+        self.sync_target = [0] * self.step_count
+        for rule in sync.get('rules') or []:
+            for step in _step_range(rule):
+                self.sync_target[step] = int(rule['to'])
+
+        # program selection table, bit mask of the selector inputs => program number
+        pin_bits = {name: 1 << bit for bit, name in enumerate(SelectorValues.__slots__)}
+        self.selection_table = [0] * (1 << len(pin_bits))
+        for mask in range(len(self.selection_table)):
+            for rule in definition['selection']:
+                rule_mask = 0
+                for pin in rule['pins']:
+                    rule_mask |= pin_bits[pin]
+                if mask & rule_mask == rule_mask:
+                    self.selection_table[mask] = int(rule['program'])
+                    break
+
+        # program dependent tables
+        self.next_step = {}
+        self.target_temp = {}
+        self.target_temp_sensor = {}
+        self.step_runtime = {}
+        self.runtime_to_end = {}
+        self.runtime_to_sequence_end = {}
+        for program in self.program_names:
+            next_step = list(range(1, self.step_count + 1))
+            for rule in definition.get('skips') or []:
+                if program in rule['programs']:
+                    for step in _step_range(rule):
+                        next_step[step] = int(rule['to'])
+            self.next_step[program] = next_step
+
+            target_temp = [0] * self.step_count
+            for rule in definition.get('target_temps') or []:
+                if program in rule['programs']:
+                    for step in _step_range(rule):
+                        target_temp[step] = int(rule['temp'])
+            self.target_temp[program] = target_temp
+
+            if target_temp_sensor is not None:
+                self.target_temp_sensor[program] = [
+                    target_temp_sensor(temp) if temp != 0 else None for temp in target_temp]
+                self._compile_runtimes(program, temp_growth_speed)
+
+    def _step_runtime(self, program, step, temp_growth_speed):
+        """estimated runtime of one step in seconds"""
+        if self.thermo_stop[step]:
+            temp_target_sensor = self.target_temp_sensor[program][step]
+            if temp_target_sensor is None:
+                return 0
+            return round((temp_target_sensor - self.thermo_stop_start_temp[step]) / temp_growth_speed)
+        return self.operational_time[step] * 60
+
+    def _compile_runtimes(self, program, temp_growth_speed):
+        next_step = self.next_step[program]
+        step_runtime = [self._step_runtime(program, step, temp_growth_speed) for step in range(self.step_count)]
+        self.step_runtime[program] = step_runtime
+
+        # estimated runtime from a step (inclusive) to the end of the main program, following the skips
+        runtime_to_end = [0] * (self.step_count + 1)
+        for step in range(self.final_step, 0, -1):
+            following = next_step[step]
+            runtime_to_end[step] = step_runtime[step] + (runtime_to_end[following] if following <= self.final_step else 0)
+        self.runtime_to_end[program] = runtime_to_end
+
+        # estimated runtime after a step to the end of its sequence
+        runtime_to_sequence_end = [0] * self.step_count
+        for step in range(1, self.step_count - 1):
+            sequence_end = self.last_sequence_step.get(self.sequence_of_step[step])
+            if sequence_end is None or step == sequence_end:
+                continue
+            runtime = 0
+            i = next_step[step]
+            while i <= sequence_end:
+                runtime += step_runtime[i]
+                i = next_step[i]
+            runtime_to_sequence_end[step] = runtime
+        self.runtime_to_sequence_end[program] = runtime_to_sequence_end
@@ -0,0 +1,348 @@
+"""
+Offline replay engine for recorded program runs.
+
+Reconstructs the input events of recorded runs (`<time_start>_DataRecord.csv` together with
+`RunningLog.csv`) and drives a WashingProgram with a virtual clock, as fast as the CPU allows.
+The replayed step timeline and ETAs are compared against the recording, so changes to the step
+logic can be checked against an archive of real washes.
+
+Data records written since the replay engine exist contain the program number, the predicted
+time left, the actuator inputs and the motor step transitions of every loop. Older records
+(time;runtime;termostop;step;temp) are replayed with step transitions reconstructed from the
+recorded step changes.
+
+    python replay.py [--profile {sample,cprofile}] [logging_directory]
+
+With --profile the replay is tagged with the phases of profiler.py and additionally runs a
+telemetry tick (sample fill and encoding, without any I/O) every timer interval, the report
+is printed after the replay.
+"""
+
+import argparse
+import glob
+import logging
+import os
+import time
+
+import profiler
+from config import SoftwareConfig
+from program import WashingProgram
+from program_definition import ProgramDefinition
+from process_sample import ACTUATOR_INPUTS, ProcessSample, SensorValues, encode_backend_json, encode_serial_frame
+from resync import ALL_ACTUATORS, actuator_mask
+
+
+class RecordedRow:
+    """one loop iteration of a recorded run"""
+    __slots__ = ('runtime', 'step', 'temperature', 'program', 'time_left_program', 'sensor_values', 'transition')
+
+    def __init__(self, runtime, step, temperature):
+        self.runtime = runtime
+        self.step = step
+        self.temperature = temperature
+        self.program = None
+        self.time_left_program = None
+        self.sensor_values = None
+        self.transition = None
+
+
+class RecordedRun:
+    def __init__(self, time_start, rows, selected_program, estimated_runtime=None, real_runtime=None):
+        self.time_start = time_start
+        self.rows = rows
+        self.selected_program = selected_program
+        self.estimated_runtime = estimated_runtime
+        self.real_runtime = real_runtime if real_runtime is not None else rows[-1].runtime
+
+    @property
+    def is_extended_record(self):
+        return self.rows[0].transition is not None
+
+
+class ReplayMachine:
+    """
+    Stand-in for the Dishwasher HAL which serves the inputs of a recorded row.
+    All outputs are ignored.
+    """
+
+    def __init__(self):
+        self.device_identifier = 'replay'
+        self.in_wash_program = False
+        self.step_transition_triggered = False
+        self.row = None
+
+    def read_temperature(self) -> float:
+        return self.row.temperature
+
+    def read_temperatures(self) -> dict:
+        return {'main': self.row.temperature}
+
+    def read_input(self, sensor_name: str) -> bool:
+        if self.row.sensor_values is None:
+            return False
+        return getattr(self.row.sensor_values, ACTUATOR_INPUTS[sensor_name])
+
+    def read_actuator_sensor_values(self, sensor_values: SensorValues = None) -> SensorValues:
+        """fill and return the recorded actuator inputs, all off for legacy records"""
+        if sensor_values is None:
+            sensor_values = SensorValues()
+        recorded = self.row.sensor_values
+        for name in SensorValues.__slots__:
+            setattr(sensor_values, name, getattr(recorded, name) if recorded is not None else 0)
+        return sensor_values
+
+    def read_actuator_mask(self, care_mask=ALL_ACTUATORS) -> int:
+        if self.row.sensor_values is None:
+            return 0
+        return actuator_mask(self.row.sensor_values) & care_mask
+
+    def set_all_relays(self, set_state: bool):
+        pass
+
+    def set_buzzer(self, passes: int):
+        pass
+
+    def set_lamp(self, enable: bool):
+        pass
+
+    def set_main_relay(self, enable: bool):
+        pass
+
+    def reset_projector(self):
+        pass
+
+
+class VirtualClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class ReplayResult:
+    def __init__(self, run: RecordedRun):
+        self.run = run
+        self.timeline_recorded = []
+        self.timeline_replayed = []
+        self.estimated_runtime = 0
+        self.replayed_runtime = 0
+        self.step_mismatch_ticks = 0
+        self.first_divergence = None
+        self.eta_error_sum = 0
+        self.eta_error_max = 0
+        self.eta_samples = 0
+        self.recorded_eta_error_sum = 0
+        self.recorded_eta_samples = 0
+
+    @property
+    def eta_error_mean(self):
+        return self.eta_error_sum / self.eta_samples if self.eta_samples else 0
+
+    @property
+    def recorded_eta_error_mean(self):
+        return self.recorded_eta_error_sum / self.recorded_eta_samples if self.recorded_eta_samples else None
+
+    @property
+    def timeline_matches(self):
+        return self.step_mismatch_ticks == 0
+
+
+def _parse_int(value):
+    return int(float(value))
+
+
+def read_running_log(logging_directory) -> dict:
+    """return dict of time_start -> (program, estimated runtime, real runtime, energy Wh or None) from RunningLog.csv"""
+    completions = {}
+    record_file_path = os.path.join(logging_directory, 'RunningLog.csv')
+    if not os.path.exists(record_file_path):
+        return completions
+    with open(record_file_path, 'r') as fd:
+        for line in fd:
+            columns = line.strip().split(';')
+            if len(columns) < 4:
+                continue
+            try:
+                completions[_parse_int(columns[0])] = (
+                    _parse_int(columns[1]), _parse_int(columns[2]), _parse_int(columns[3]),
+                    float(columns[4]) if len(columns) > 4 and columns[4] else None)
+            except ValueError:
+                continue
+    return completions
+
+
+def read_data_record(file_path, completions: dict = None):
+    """parse a `<time_start>_DataRecord.csv` file, return RecordedRun or None if it is not replayable"""
+    time_start = int(os.path.basename(file_path).split('_')[0])
+    rows = []
+    with open(file_path, 'r') as fd:
+        for line in fd:
+            columns = line.strip().split(';')
+            if len(columns) < 5:
+                continue
+            try:
+                row = RecordedRow(_parse_int(columns[1]), _parse_int(columns[3]), float(columns[4]))
+                if len(columns) >= 13:
+                    row.program = _parse_int(columns[5])
+                    row.time_left_program = _parse_int(columns[6])
+                    sensor_values = SensorValues()
+                    sensor_values.pump_drain = _parse_int(columns[7])
+                    sensor_values.pump_circulation = _parse_int(columns[8])
+                    sensor_values.valve_inlet = _parse_int(columns[9])
+                    sensor_values.valve_outlet = _parse_int(columns[10])
+                    sensor_values.heating = _parse_int(columns[11])
+                    row.sensor_values = sensor_values
+                    row.transition = bool(_parse_int(columns[12]))
+            except ValueError:
+                continue
+            rows.append(row)
+    if not rows:
+        return None
+
+    completion = (completions or {}).get(time_start)
+    selected_program = rows[0].program
+    if selected_program is None and completion is not None:
+        selected_program = completion[0]
+    if selected_program is None:
+        return None
+    if completion is not None:
+        return RecordedRun(time_start, rows, selected_program, completion[1], completion[2])
+    return RecordedRun(time_start, rows, selected_program)
+
+
+def reconstruct_transitions(run: RecordedRun, definition: ProgramDefinition = None):
+    """
+    derive the motor step transitions of a record without transition column from its step changes
+    :param definition: definition of the recorded program, the default definition if None
+    """
+    if definition is None:
+        definition = ProgramDefinition.load()
+    previous_step = 1
+    for row in run.rows:
+        row.transition = row.step != previous_step and previous_step < definition.final_step
+        previous_step = row.step
+
+
+def _telemetry_tick(program: WashingProgram, sample: ProcessSample, time_now):
+    """the CPU part of ProcessDataProvider.collect_process_data, without any I/O"""
+    with profiler.phase(profiler.PHASE_TELEMETRY):
+        sample.fill_program_values(program.snapshot, time_now, program.machine.read_temperature())
+        sample.machine_temperatures = program.machine.read_temperatures()
+        program.machine.read_actuator_sensor_values(sample.machine_sensor_values)
+        encode_backend_json(sample)
+        encode_serial_frame(sample)
+
+
+def replay_run(run: RecordedRun, swconfig: SoftwareConfig, definition: ProgramDefinition = None,
+               telemetry_interval=None) -> ReplayResult:
+    """
+    drive a WashingProgram with the recorded inputs and compare it with the recording
+    :param telemetry_interval: seconds between two replayed telemetry ticks, None to skip the telemetry
+    """
+    if definition is None:
+        definition = ProgramDefinition.load(swconfig.program_definition, swconfig)
+    if not run.is_extended_record:
+        reconstruct_transitions(run, definition)
+    result = ReplayResult(run)
+    machine = ReplayMachine()
+    machine.row = run.rows[0]
+    clock = VirtualClock(run.time_start)
+    with profiler.phase(profiler.PHASE_SELECTION):
+        program = WashingProgram(machine, swconfig, clock, definition)
+        program.select_program(run.selected_program)
+        program.start_program()
+    result.estimated_runtime = program.estimated_runtime
+    sample = ProcessSample(run.time_start, machine.device_identifier)
+    time_next_telemetry = run.time_start
+
+    recorded_step = None
+    replayed_step = None
+    for row in run.rows:
+        if not machine.in_wash_program:
+            break
+        machine.row = row
+        clock.now = run.time_start + row.runtime
+
+        with profiler.phase(profiler.PHASE_HEATING if program.snapshot.is_thermo_stop else profiler.PHASE_NORMAL_STEP):
+            program.process_step_transition(row.transition)
+            program.check_program_sync()
+        if telemetry_interval is not None and clock.now >= time_next_telemetry:
+            time_next_telemetry = clock.now + telemetry_interval
+            _telemetry_tick(program, sample, clock.now)
+
+        if row.step != recorded_step:
+            recorded_step = row.step
+            result.timeline_recorded.append((row.runtime, row.step))
+        if program.step_operational != replayed_step:
+            replayed_step = program.step_operational
+            result.timeline_replayed.append((row.runtime, replayed_step))
+        if replayed_step != recorded_step:
+            result.step_mismatch_ticks += 1
+            if result.first_divergence is None:
+                result.first_divergence = (row.runtime, recorded_step, replayed_step)
+
+        if machine.in_wash_program:
+            time_left = program.get_time_left_program()
+            eta_error = abs(row.runtime + time_left - run.real_runtime)
+            result.eta_error_sum += eta_error
+            result.eta_error_max = max(result.eta_error_max, eta_error)
+            result.eta_samples += 1
+            if row.time_left_program is not None:
+                result.recorded_eta_error_sum += abs(row.runtime + row.time_left_program - run.real_runtime)
+                result.recorded_eta_samples += 1
+    result.replayed_runtime = program.get_current_runtime()
+    return result
+
+
+def replay_archive(logging_directory, swconfig: SoftwareConfig = None, telemetry_interval=None) -> list:
+    """replay all recorded runs of a logging directory"""
+    swconfig = swconfig if swconfig is not None else SoftwareConfig()
+    definition = ProgramDefinition.load(swconfig.program_definition, swconfig)
+    completions = read_running_log(logging_directory)
+    results = []
+    for file_path in sorted(glob.glob(os.path.join(logging_directory, '*_DataRecord.csv'))):
+        run = read_data_record(file_path, completions)
+        if run is None:
+            continue
+        results.append(replay_run(run, swconfig, definition, telemetry_interval))
+    return results
+
+
+def print_report(results: list, duration: float):
+    print('{:>11} {:>4} {:>6} {:>6} {:>6} {:>9} {:>8} {:>8}  {}'.format(
+        'time_start', 'prog', 'est', 'real', 'replay', 'mismatch', 'eta_err', 'rec_err', 'first divergence'))
+    for result in results:
+        run = result.run
+        recorded_eta_error = result.recorded_eta_error_mean
+        divergence = '-' if result.first_divergence is None else \
+            'at {}s recorded step {} replayed step {}'.format(*result.first_divergence)
+        print('{:>11} {:>4} {:>6} {:>6} {:>6} {:>9} {:>8.0f} {:>8}  {}'.format(
+            run.time_start, run.selected_program, int(result.estimated_runtime), run.real_runtime,
+            result.replayed_runtime, result.step_mismatch_ticks, result.eta_error_mean,
+            '-' if recorded_eta_error is None else '{:.0f}'.format(recorded_eta_error), divergence))
+    ticks = sum(len(result.run.rows) for result in results)
+    print('replayed {} runs ({} recorded seconds) in {:.2f}s, {:.0f}x real time'.format(
+        len(results), ticks, duration, ticks / duration if duration > 0 else 0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='replay recorded program runs')
+    parser.add_argument('--profile', choices=(profiler.MODE_SAMPLE, profiler.MODE_CPROFILE),
+                        help='profile the replayed phases and print the report')
+    parser.add_argument('logging_directory', nargs='?')
+    args = parser.parse_args()
+    # the replayed program logs every step transition and deviation, the report contains the differences
+    logging.getLogger('DishwasherOS').setLevel(logging.ERROR)
+    sw_config = SoftwareConfig()
+    directory = args.logging_directory or sw_config.logging_directory
+    replay_telemetry_interval = None
+    if args.profile:
+        profiler.setup_profiler(sw_config, args.profile)
+        replay_telemetry_interval = sw_config.data_repeated_timer_interval
+    time_begin = time.perf_counter()
+    replay_results = replay_archive(directory, sw_config, replay_telemetry_interval)
+    print_report(replay_results, time.perf_counter() - time_begin)
+    if args.profile:
+        print()
+        print(profiler.write_report('replay_profile.txt'))
@@ -0,0 +1,214 @@
+"""
+Resynchronization of the operational step with the actuator signatures of the steps.
+
+Each step of a program has an actuator signature: the bit masks of the actuator inputs (drain and
+circulation pump, inlet and outlet valve, heating) seen while the step runs, with their share of
+the step time, and the band of the water temperature. The SignatureIndex compiles the signatures
+into one row per (program, step) with an entry for each of the 32 masks: None if the mask fits the
+step, otherwise the step to resynchronize to and the confidence of a single observation. Matching
+the live mask is an index into the row, steps without a row cost one dict and list lookup.
+
+The signatures are learned from the recorded runs:
+
+    python resync.py learn [logging_directory] [signature_file]
+
+Without a signature file (setting `resync.signatures`) the sync rules of the program definition
+are compiled into the same rows (active sync input => rule target, confidence 1.0). Learned
+signatures replace the rules for the steps they cover.
+
+The target of a foreign mask is the nearest step on the program path (within `resync.window`
+steps) whose signature contains the mask. The confidence is its share of the mask among all
+candidates in the window, reduced for masks which are rare in the target step. Observations of
+the same target accumulate (1 - prod(1 - c)) until `resync.threshold` is reached, an observation
+outside the temperature band of the target counts half.
+"""
+
+import glob
+import os
+import sys
+
+import yaml
+
+from process_sample import ACTUATOR_INPUTS, SensorValues
+
+# actuator name => bit of the actuator mask
+ACTUATOR_BITS = {name: 1 << bit for bit, name in enumerate(SensorValues.__slots__)}
+MASK_COUNT = 1 << len(SensorValues.__slots__)
+ALL_ACTUATORS = MASK_COUNT - 1
+
+# masks with a smaller share of the step time are treated as transients
+_MIN_MASK_SHARE = 0.02
+# a mask with at least this share of the target step is full evidence for the target
+_DOMINANT_MASK_SHARE = 0.25
+# a single observation of a learned signature never suffices for a correction, transients are ignored
+_MAX_OBSERVATION_CONFIDENCE = 0.7
+# steps with fewer samples keep the rules of the program definition
+_MIN_STEP_SAMPLES = 5
+# the temperature band of a step is widened by this many degrees celsius
+_TEMPERATURE_MARGIN = 5.0
+
+
+def actuator_mask(sensor_values: SensorValues) -> int:
+    mask = 0
+    for name, bit in ACTUATOR_BITS.items():
+        if getattr(sensor_values, name):
+            mask |= bit
+    return mask
+
+
+class ResyncRow:
+    """
+    resynchronization entries of one step
+    :param care_mask: actuator bits the entries depend on, only these inputs need to be read
+    :param entries: mask => (target step, confidence) or None
+    """
+    __slots__ = ('care_mask', 'entries')
+
+    def __init__(self, care_mask, entries):
+        self.care_mask = care_mask
+        self.entries = entries
+
+
+class SignatureIndex:
+    def __init__(self, definition, signatures: dict = None, window=6):
+        """
+        :param definition: compiled ProgramDefinition
+        :param signatures: program => step => {'masks': {mask: share}, 'temp': [min, max], 'samples': n}
+        :param window: steps on the program path searched for a resynchronization target
+        """
+        self.window = window
+        # program => list of ResyncRow or None by step
+        self.rows = {}
+        # program => list of (min, max) temperature or None by step
+        self.temperature_bands = {}
+        rule_rows = self._compile_rules(definition)
+        for program in definition.program_names:
+            rows = list(rule_rows)
+            bands = [None] * definition.step_count
+            program_signatures = (signatures or {}).get(program)
+            if program_signatures:
+                self._compile_signatures(definition, program, program_signatures, rows, bands)
+            self.rows[program] = rows
+            self.temperature_bands[program] = bands
+
+    @classmethod
+    def load(cls, definition, file_path=None, window=6):
+        """index of a signature file, only the sync rules of the definition without file"""
+        if not file_path or not os.path.exists(file_path):
+            return cls(definition, window=window)
+        with open(file_path, 'r', encoding='utf-8') as stream:
+            content = yaml.safe_load(stream) or {}
+        signatures = {int(program): {int(step): signature for step, signature in steps.items()}
+                      for program, steps in (content.get('programs') or {}).items()}
+        return cls(definition, signatures, window)
+
+    @staticmethod
+    def _compile_rules(definition):
+        rows = [None] * definition.step_count
+        if definition.sync_input not in ACTUATOR_INPUTS:
+            return rows
+        sync_bit = ACTUATOR_BITS[ACTUATOR_INPUTS[definition.sync_input]]
+        for step, target in enumerate(definition.sync_target):
+            if target != 0:
+                rows[step] = ResyncRow(sync_bit, tuple((target, 1.0) if mask & sync_bit else None
+                                                       for mask in range(MASK_COUNT)))
+        return rows
+
+    def _compile_signatures(self, definition, program, signatures, rows, bands):
+        # steps in the order the program runs through them
+        path = []
+        step = 1
+        while 0 < step < definition.step_count and step not in path:
+            path.append(step)
+            step = definition.next_step[program][step]
+        shares = {}
+        for step in path:
+            signature = signatures.get(step)
+            if signature is None or signature.get('samples', 0) < _MIN_STEP_SAMPLES:
+                continue
+            shares[step] = {int(mask): float(share) for mask, share in signature['masks'].items()
+                            if float(share) >= _MIN_MASK_SHARE}
+            if signature.get('temp'):
+                temp_min, temp_max = signature['temp']
+                bands[step] = (temp_min - _TEMPERATURE_MARGIN, temp_max + _TEMPERATURE_MARGIN)
+
+        for position, step in enumerate(path):
+            if step not in shares:
+                continue
+            window = [(abs(i - position), i < position, path[i]) for i in
+                      range(max(0, position - self.window), min(len(path), position + self.window + 1))
+                      if i != position and path[i] in shares]
+            # nearest first, forward before backward
+            window.sort()
+            entries = []
+            for mask in range(MASK_COUNT):
+                if mask in shares[step]:
+                    entries.append(None)
+                    continue
+                candidates = [candidate for distance, is_backward, candidate in window if mask in shares[candidate]]
+                if not candidates:
+                    entries.append(None)
+                    continue
+                target_share = shares[candidates[0]][mask]
+                specificity = target_share / sum(shares[candidate][mask] for candidate in candidates)
+                strength = min(1.0, target_share / _DOMINANT_MASK_SHARE)
+                entries.append((candidates[0], _MAX_OBSERVATION_CONFIDENCE * specificity * strength))
+            rows[step] = ResyncRow(ALL_ACTUATORS, tuple(entries))
+
+    def get_row(self, program, step):
+        """ResyncRow of a step, None if the step is never resynchronized"""
+        rows = self.rows.get(program)
+        if rows is None or not 0 <= step < len(rows):
+            return None
+        return rows[step]
+
+    def is_in_temperature_band(self, program, step, temperature) -> bool:
+        band = self.temperature_bands[program][step]
+        return band is None or band[0] <= temperature <= band[1]
+
+
+def learn_signatures(logging_directory) -> dict:
+    """actuator signatures of all programs from the extended data records of a logging directory"""
+    from replay import read_data_record, read_running_log
+
+    completions = read_running_log(logging_directory)
+    counts = {}
+    temperatures = {}
+    for file_path in sorted(glob.glob(os.path.join(logging_directory, '*_DataRecord.csv'))):
+        run = read_data_record(file_path, completions)
+        if run is None or not run.is_extended_record:
+            continue
+        for row in run.rows:
+            key = (run.selected_program, row.step)
+            mask_counts = counts.setdefault(key, [0] * MASK_COUNT)
+            mask_counts[actuator_mask(row.sensor_values)] += 1
+            band = temperatures.get(key)
+            temperatures[key] = (row.temperature, row.temperature) if band is None else \
+                (min(band[0], row.temperature), max(band[1], row.temperature))
+    signatures = {}
+    for (program, step), mask_counts in sorted(counts.items()):
+        samples = sum(mask_counts)
+        signatures.setdefault(program, {})[step] = {
+            'masks': {mask: round(count / samples, 3) for mask, count in enumerate(mask_counts) if count},
+            'temp': [round(temperature, 1) for temperature in temperatures[(program, step)]],
+            'samples': samples
+        }
+    return signatures
+
+
+if __name__ == "__main__":
+    from config import SoftwareConfig
+
+    sw_config = SoftwareConfig()
+    if len(sys.argv) < 2 or sys.argv[1] != 'learn':
+        print('usage: python resync.py learn [logging_directory] [signature_file]')
+        sys.exit(1)
+    directory = sys.argv[2] if len(sys.argv) > 2 else sw_config.logging_directory
+    output_path = sys.argv[3] if len(sys.argv) > 3 else (sw_config.resync_signatures or
+                                                         os.path.join(directory, 'signatures.yaml'))
+    learned = learn_signatures(directory)
+    with open(output_path, 'w', encoding='utf-8') as output:
+        output.write('# actuator signatures learned by resync.py from {}\n'.format(directory))
+        yaml.safe_dump({'programs': learned}, output, default_flow_style=None, sort_keys=True)
+    print('learned the signatures of {} steps in {} programs'.format(
+        sum(len(steps) for steps in learned.values()), len(learned)))
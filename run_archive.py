@@ -0,0 +1,215 @@
+"""
+Columnar binary archive of the finished program runs with a SQLite catalog.
+
+Every run is stored as a directory `<archive>/<time_start>/` with one numpy `.npy` file per typed
+column, so a single column can be memory-mapped without reading the rest of the run. The catalog
+`<archive>/catalog.sqlite` indexes the run metadata (program, start, estimated and real duration,
+energy), queries by program, date or duration never touch the run files.
+
+    python run_archive.py import [logging_directory]    archive all recorded runs
+    python run_archive.py list [--program N]            list the archived runs
+
+numpy is only needed to write and load runs, the catalog queries work without it.
+"""
+
+import argparse
+import datetime
+import glob
+import logging
+import os
+import shutil
+import sqlite3
+import time
+
+from program_definition import ProgramDefinition
+from replay import read_data_record, read_running_log, reconstruct_transitions
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_CATALOG_FILE_NAME = 'catalog.sqlite'
+
+# column name => numpy dtype, filled from the rows of a data record (see replay.RecordedRow)
+COLUMNS = (
+    ('runtime', 'int32'),
+    ('step', 'int16'),
+    ('temperature', 'float32'),
+    ('time_left_program', 'int32'),
+    ('pump_drain', 'uint8'),
+    ('pump_circulation', 'uint8'),
+    ('valve_inlet', 'uint8'),
+    ('valve_outlet', 'uint8'),
+    ('heating', 'uint8'),
+    ('transition', 'uint8')
+)
+
+_CATALOG_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    time_start INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    program INTEGER NOT NULL,
+    estimated_runtime INTEGER,
+    real_runtime INTEGER,
+    aenergy_wh REAL,
+    integrated_wh REAL,
+    rows INTEGER NOT NULL,
+    extended INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_program ON runs (program, time_start);
+CREATE INDEX IF NOT EXISTS runs_real_runtime ON runs (real_runtime);
+'''
+
+
+def _row_values(row):
+    sensor_values = row.sensor_values
+    if sensor_values is None:
+        return (row.runtime, row.step, row.temperature, -1, 0, 0, 0, 0, 0, int(bool(row.transition)))
+    return (row.runtime, row.step, row.temperature,
+            row.time_left_program if row.time_left_program is not None else -1,
+            sensor_values.pump_drain, sensor_values.pump_circulation, sensor_values.valve_inlet,
+            sensor_values.valve_outlet, sensor_values.heating, int(bool(row.transition)))
+
+
+def _read_integrated_energy(logging_directory, time_start):
+    """sum of the per-step energy record of a run (see energy.py), None if there is none"""
+    file_path = os.path.join(logging_directory, '{}_EnergyRecord.csv'.format(time_start))
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r') as fd:
+        return sum(float(line.split(';')[6]) for line in fd if line.count(';') >= 7)
+
+
+class RunArchive:
+    def __init__(self, archive_directory, definition: ProgramDefinition = None):
+        """
+        :param definition: definition of the recorded programs, the default definition if None
+        """
+        self.module_logger = logging.getLogger('DishwasherOS.RunArchive')
+        self.archive_directory = archive_directory
+        self.definition = definition
+        os.makedirs(archive_directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(archive_directory, _CATALOG_FILE_NAME),
+                                          check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(_CATALOG_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def get_run_directory(self, time_start):
+        return os.path.join(self.archive_directory, str(int(time_start)))
+
+    def archive_data_record(self, file_path, completions: dict = None, logging_directory=None) -> bool:
+        """archive a `<time_start>_DataRecord.csv` file, returns False if it is not archivable"""
+        if np is None:
+            raise RuntimeError('numpy is required to archive runs')
+        run = read_data_record(file_path, completions)
+        if run is None:
+            return False
+        if not run.is_extended_record:
+            if self.definition is None:
+                self.definition = ProgramDefinition.load()
+            reconstruct_transitions(run, self.definition)
+        table = np.array([_row_values(row) for row in run.rows], dtype=np.float64)
+
+        # write the columns next to the final directory and publish them with one rename
+        run_directory = self.get_run_directory(run.time_start)
+        tmp_directory = run_directory + '.tmp'
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        for i, (name, dtype) in enumerate(COLUMNS):
+            np.save(os.path.join(tmp_directory, name + '.npy'), table[:, i].astype(dtype))
+        shutil.rmtree(run_directory, ignore_errors=True)
+        os.replace(tmp_directory, run_directory)
+
+        completion = (completions or {}).get(run.time_start)
+        logging_directory = logging_directory or os.path.dirname(file_path)
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                    run.time_start,
+                    datetime.datetime.fromtimestamp(run.time_start).isoformat(sep=' '),
+                    run.selected_program,
+                    run.estimated_runtime,
+                    run.real_runtime,
+                    completion[3] if completion is not None else None,
+                    _read_integrated_energy(logging_directory, run.time_start),
+                    len(run.rows),
+                    int(run.is_extended_record)))
+        return True
+
+    def archive_run(self, logging_directory, time_start) -> bool:
+        """archive a completed run of the logging directory"""
+        file_path = os.path.join(logging_directory, '{}_DataRecord.csv'.format(int(time_start)))
+        return self.archive_data_record(file_path, read_running_log(logging_directory), logging_directory)
+
+    def import_directory(self, logging_directory) -> int:
+        """archive all recorded runs of a logging directory, returns the number of archived runs"""
+        completions = read_running_log(logging_directory)
+        count = 0
+        for file_path in sorted(glob.glob(os.path.join(logging_directory, '*_DataRecord.csv'))):
+            if self.archive_data_record(file_path, completions, logging_directory):
+                count += 1
+        return count
+
+    def query(self, program=None, since=None, until=None, min_runtime=None, max_runtime=None) -> list:
+        """
+        list the catalog entries of the archived runs, ordered by start
+        :param since: time_start (unix time) of the first run
+        :param until: time_start (unix time) after the last run
+        """
+        conditions = []
+        parameters = []
+        for condition, value in (('program = ?', program), ('time_start >= ?', since), ('time_start < ?', until),
+                                 ('real_runtime >= ?', min_runtime), ('real_runtime <= ?', max_runtime)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        sql = 'SELECT * FROM runs'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        return self.connection.execute(sql + ' ORDER BY time_start', parameters).fetchall()
+
+    def load_run(self, time_start, columns=None, mmap=True) -> dict:
+        """
+        load the columns of an archived run
+        :param mmap: memory-map the column files instead of reading them
+        """
+        if np is None:
+            raise RuntimeError('numpy is required to load runs')
+        run_directory = self.get_run_directory(time_start)
+        names = columns if columns is not None else [name for name, dtype in COLUMNS]
+        return {name: np.load(os.path.join(run_directory, name + '.npy'), mmap_mode='r' if mmap else None)
+                for name in names}
+
+
+if __name__ == "__main__":
+    from config import SoftwareConfig
+
+    sw_config = SoftwareConfig()
+    parser = argparse.ArgumentParser(description='columnar archive of the recorded program runs')
+    parser.add_argument('--directory', default=sw_config.run_archive_directory,
+                        help='archive directory, default: runArchiveDirectory of settings.yaml')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    parser_import = subparsers.add_parser('import', help='archive all recorded runs of a logging directory')
+    parser_import.add_argument('logging_directory', nargs='?', default=sw_config.logging_directory)
+    parser_list = subparsers.add_parser('list', help='list the archived runs')
+    parser_list.add_argument('--program', type=int)
+    args = parser.parse_args()
+    if args.directory is None:
+        parser.error('no archive directory, set software.runArchiveDirectory in settings.yaml or pass --directory')
+
+    archive = RunArchive(args.directory, ProgramDefinition.load(sw_config.program_definition))
+    if args.command == 'import':
+        time_begin = time.perf_counter()
+        run_count = archive.import_directory(args.logging_directory)
+        print('archived {} runs in {:.2f}s'.format(run_count, time.perf_counter() - time_begin))
+    else:
+        print('{:>11} {:<19} {:>4} {:>6} {:>6} {:>8}'.format('time_start', 'date', 'prog', 'est', 'real', 'energy'))
+        for entry in archive.query(program=args.program):
+            print('{:>11} {:<19} {:>4} {:>6} {:>6} {:>8}'.format(
+                entry['time_start'], entry['date'], entry['program'], entry['estimated_runtime'] or '-',
+                entry['real_runtime'], '-' if entry['aenergy_wh'] is None else entry['aenergy_wh']))
+    archive.close()
@@ -0,0 +1,160 @@
+"""
+Single writer ring buffer of fixed size records in a `multiprocessing.shared_memory` segment.
+
+Used by the optional two-process architecture (see telemetry_process.py): the control process
+writes the samples, the telemetry process reads them. The writer never waits for the reader, a
+reader which falls behind by more than the ring size skips the overwritten records.
+
+    header  magic, slot_count, payload_size, write_count, control heartbeat, telemetry heartbeat,
+            aenergy init and aenergy of the run (written by the telemetry process)
+    slot    sequence, crc32 of the payload, payload
+
+Every slot carries the number of the record it holds and the CRC of its payload. A reader checks
+both before and after it unpacked the payload in place from the shared buffer (no copy), a record
+which is overwritten or half written while it is read is detected and read again. No lock is
+shared between the processes, so a crash of either side can never block the other one.
+"""
+
+import struct
+import time
+import zlib
+from multiprocessing import resource_tracker, shared_memory
+
+_MAGIC = 0xD15A
+_HEADER = struct.Struct('<IIIIQQQdd')
+_HEADER_SIZE = 64
+_SLOT_HEADER = struct.Struct('<QI')
+_OFFSET_WRITE_COUNT = 16
+_OFFSET_CONTROL_HEARTBEAT = 24
+_OFFSET_TELEMETRY_HEARTBEAT = 32
+_OFFSET_AENERGY_INIT = 40
+_OFFSET_AENERGY = 48
+_UINT64 = struct.Struct('<Q')
+_DOUBLE = struct.Struct('<d')
+
+
+class SampleRing:
+    def __init__(self, shm: shared_memory.SharedMemory, payload_size, slot_count):
+        self.shm = shm
+        self.name = shm.name
+        self.buffer = shm.buf
+        self.payload_size = payload_size
+        self.slot_count = slot_count
+        self.slot_size = (_SLOT_HEADER.size + payload_size + 7) // 8 * 8
+        # reader: number of the next record to read, records skipped because the reader was too slow
+        self.read_count = 0
+        self.dropped = 0
+
+    @classmethod
+    def create(cls, name, payload_size, slot_count=256):
+        """create the segment, a stale segment of a crashed process with the same name is replaced"""
+        slot_size = (_SLOT_HEADER.size + payload_size + 7) // 8 * 8
+        size = _HEADER_SIZE + slot_count * slot_size
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, slot_count, payload_size, 0, 0, 0, 0, 0.0, 0.0)
+        return cls(shm, payload_size, slot_count)
+
+    @classmethod
+    def attach(cls, name):
+        """attach to the segment of the writer, the reader starts with the next written record"""
+        shm = shared_memory.SharedMemory(name)
+        # the segment belongs to the writer, the resource tracker of this process must not unlink it
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        magic, slot_count, payload_size = _HEADER.unpack_from(shm.buf, 0)[:3]
+        if magic != _MAGIC:
+            shm.close()
+            raise ValueError('{} is not a sample ring'.format(name))
+        ring = cls(shm, payload_size, slot_count)
+        ring.read_count = ring.write_count
+        return ring
+
+    @property
+    def write_count(self) -> int:
+        return _UINT64.unpack_from(self.buffer, _OFFSET_WRITE_COUNT)[0]
+
+    def _slot_offset(self, count):
+        return _HEADER_SIZE + (count % self.slot_count) * self.slot_size
+
+    def write(self, payload: bytes):
+        """append a record of payload_size bytes, overwrites the oldest record if the ring is full"""
+        count = self.write_count
+        offset = self._slot_offset(count)
+        # an odd sequence marks the slot as being written
+        _SLOT_HEADER.pack_into(self.buffer, offset, 2 * count + 1, 0)
+        payload_offset = offset + _SLOT_HEADER.size
+        self.buffer[payload_offset:payload_offset + self.payload_size] = payload
+        _SLOT_HEADER.pack_into(self.buffer, offset, 2 * count + 2, zlib.crc32(payload))
+        _UINT64.pack_into(self.buffer, _OFFSET_WRITE_COUNT, count + 1)
+        _UINT64.pack_into(self.buffer, _OFFSET_CONTROL_HEARTBEAT, time.monotonic_ns())
+
+    def read(self, unpack: struct.Struct):
+        """unpack the next record in place, None if there is no new record"""
+        write_count = self.write_count
+        if self.read_count >= write_count:
+            return None
+        if write_count - self.read_count > self.slot_count - 1:
+            # overwritten records, continue with the oldest one which is still stable
+            skipped = write_count - self.slot_count + 1 - self.read_count
+            self.dropped += skipped
+            self.read_count += skipped
+        count = self.read_count
+        offset = self._slot_offset(count)
+        payload_offset = offset + _SLOT_HEADER.size
+        sequence, crc = _SLOT_HEADER.unpack_from(self.buffer, offset)
+        if sequence != 2 * count + 2:
+            # still being written, read it with the next call
+            return None
+        values = unpack.unpack_from(self.buffer, payload_offset)
+        payload = self.buffer[payload_offset:payload_offset + self.payload_size]
+        is_valid = zlib.crc32(payload) == crc
+        payload.release()
+        if not is_valid or _SLOT_HEADER.unpack_from(self.buffer, offset)[0] != sequence:
+            if self.write_count - count >= self.slot_count:
+                # overwritten while it was read
+                self.read_count += 1
+                self.dropped += 1
+            return None
+        self.read_count += 1
+        return values
+
+    @property
+    def control_heartbeat(self) -> float:
+        """seconds since the last record was written"""
+        return (time.monotonic_ns() - _UINT64.unpack_from(self.buffer, _OFFSET_CONTROL_HEARTBEAT)[0]) / 1e9
+
+    def beat_telemetry(self):
+        _UINT64.pack_into(self.buffer, _OFFSET_TELEMETRY_HEARTBEAT, time.monotonic_ns())
+
+    @property
+    def telemetry_heartbeat(self):
+        """seconds since the telemetry process has read the ring, None if it has never read it"""
+        heartbeat = _UINT64.unpack_from(self.buffer, _OFFSET_TELEMETRY_HEARTBEAT)[0]
+        if heartbeat == 0:
+            return None
+        return (time.monotonic_ns() - heartbeat) / 1e9
+
+    def get_aenergy_init(self) -> float:
+        return _DOUBLE.unpack_from(self.buffer, _OFFSET_AENERGY_INIT)[0]
+
+    def set_aenergy_init(self, aenergy):
+        _DOUBLE.pack_into(self.buffer, _OFFSET_AENERGY_INIT, aenergy)
+
+    def get_aenergy(self) -> float:
+        return _DOUBLE.unpack_from(self.buffer, _OFFSET_AENERGY)[0]
+
+    def set_aenergy(self, aenergy):
+        _DOUBLE.pack_into(self.buffer, _OFFSET_AENERGY, aenergy)
+
+    def close(self):
+        self.buffer.release()
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
@@ -0,0 +1,91 @@
+"""
+Adaptive reporting rate of the telemetry.
+
+The process data timer ticks with the fixed `sendProcessDataRepeatedTimerInterval`, every tick
+updates the serial projector and the status cache. The policy decides which ticks are reported to
+the backend, the MQTT broker and the is_alive endpoint as well: the running program is reported
+with `intervalMin` in thermo-stops and for `transitionHold` seconds after a step transition or a
+change of the actuator inputs, in steady steps the interval doubles with every report up to
+`intervalMax`. A report is always placed at the predicted end of the current step, and step
+transitions, actuator changes and report mode changes are reported at the next tick, so all
+changes are reported with the full resolution while long steady steps cost a few posts only.
+"""
+
+import time
+
+from process_sample import SensorValues
+
+
+class AdaptiveSamplingPolicy:
+    def __init__(self, interval_min=1.0, interval_max=15.0, interval_idle=30.0, interval_afterrunning=10.0,
+                 transition_hold=10.0, tick=1.0, clock=time.monotonic):
+        """
+        :param tick: interval of the timer ticks, a report is due half a tick early
+        """
+        self.interval_min = interval_min
+        self.interval_max = interval_max
+        self.interval_idle = interval_idle
+        self.interval_afterrunning = interval_afterrunning
+        self.transition_hold = transition_hold
+        self.tick = tick
+        self.clock = clock
+        self.interval = interval_min
+        self.last_step = None
+        self.last_sensor_state = None
+        self.time_change = None
+        # time of the next report, None reports at the next tick
+        self.time_report = None
+
+    @classmethod
+    def from_config(cls, swconfig):
+        return cls(swconfig.telemetry_interval_min, swconfig.telemetry_interval_max,
+                   swconfig.telemetry_interval_idle, swconfig.telemetry_interval_afterrunning,
+                   swconfig.telemetry_transition_hold, swconfig.data_repeated_timer_interval or 1)
+
+    def request_report(self):
+        """report at the next tick, e.g. after a change of the report mode"""
+        self.time_report = None
+
+    def _is_due(self, time_now) -> bool:
+        return self.time_report is None or time_now + self.tick / 2 >= self.time_report
+
+    def is_idle_report_due(self) -> bool:
+        """is_alive reporting"""
+        self.interval = self.interval_min
+        time_now = self.clock()
+        if not self._is_due(time_now):
+            return False
+        self.time_report = time_now + self.interval_idle
+        return True
+
+    def is_afterrunning_report_due(self) -> bool:
+        time_now = self.clock()
+        if not self._is_due(time_now):
+            return False
+        self.time_report = time_now + self.interval_afterrunning
+        return True
+
+    def is_running_report_due(self, snapshot, sensor_values: SensorValues, time_left_step=None) -> bool:
+        """report of the running program"""
+        time_now = self.clock()
+        if snapshot.step_operational != self.last_step:
+            self.last_step = snapshot.step_operational
+            self.time_change = time_now
+            self.time_report = None
+        sensor_state = tuple(getattr(sensor_values, name) for name in SensorValues.__slots__)
+        if sensor_state != self.last_sensor_state:
+            self.last_sensor_state = sensor_state
+            self.time_change = time_now
+            self.time_report = None
+        if not self._is_due(time_now):
+            return False
+        if snapshot.is_thermo_stop or time_now - self.time_change < self.transition_hold:
+            self.interval = self.interval_min
+        else:
+            self.interval = min(self.interval_max, self.interval * 2)
+        interval = self.interval
+        if time_left_step is not None and time_left_step > 0:
+            # report at the predicted end of the step
+            interval = max(self.interval_min, min(interval, time_left_step))
+        self.time_report = time_now + interval
+        return True
@@ -1,35 +0,0 @@
-from my_states import LockedStatelogging
-
-
-class SimpleDevice(object):
-    """
-    A simple state machine that mimics the functionality of a device from a
-    high level.
-    """
-
-    def __init__(self):
-        """ Initialize the components. """
-
-        # Start with a default state.
-        self.state = LockedState()
-
-    def on_event(self, event):
-        """
-        This is the bread and butter of the state machine. Incoming events are
-        delegated to the given states which then handle the event. The result is
-        then assigned as the new state.
-        """
-
-        # The next state will be the result of the on_event function.
-        self.state = self.state.on_event(event)
-
-
-"""
-Anwendung der Klasse SimpleDevice:
-
-from simple_device import SimpleDevice
-device = SimpleDevice()
-device.on_event('device_locked')
-device.on_event('pin_entered')
-device.state
-"""
\ No newline at end of file
@@ -4,16 +4,57 @@ class State(object):
     individual states within the state machine.
     """
 
-    def __init__(self, dishwasher):
-        self.machine = dishwasher
-        print('Processing current state:', str(self))
+    # seconds between two polls of the active state, None to only react on events
+    poll_interval = None
+    # report mode of the ProcessDataProvider while the state is active, None to keep the current one
+    report_mode = None
+    # profiler phase of the work done in the state (see profiler.py), None to leave it untagged
+    profile_phase = None
 
-    def on_event(self, event):
+    def __init__(self, lifecycle):
+        self.lifecycle = lifecycle
+        self.machine = lifecycle.machine
+        self.program = lifecycle.program
+        self.swconfig = lifecycle.program.swconfig
+        # event => next State, filled from the transition table by the Lifecycle
+        self.transitions = {}
+
+    def on_enter(self):
+        """
+        Called when the State becomes active.
+        """
+        pass
+
+    def on_exit(self):
+        """
+        Called when the State is left.
+        """
+        pass
+
+    def on_poll(self):
         """
-        Handle events that are delegated to this State.
+        Called when no event arrived within the poll timeout.
         """
         pass
 
+    def poll_timeout(self):
+        """
+        Seconds to wait for the next event before the State is polled.
+        """
+        return self.poll_interval
+
+    def get_profile_phase(self):
+        """
+        Returns the profiler phase of the current work of the State.
+        """
+        return self.profile_phase
+
+    def on_event(self, event):
+        """
+        Handle events that are delegated to this State, returns the next State.
+        """
+        return self.transitions.get(event, self)
+
     def __repr__(self):
         """
         Leverages the __str__ method to describe the State.
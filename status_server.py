@@ -0,0 +1,163 @@
+"""
+Embedded on-device status service for local consumers.
+
+The service only serves what the ProcessDataProvider has already collected. No request ever touches
+the GPIOs, the w1 sensor or the electricity meter, so any number of clients can watch the machine
+without an effect on the control loop.
+
+    GET /status     latest process_data snapshot (JSON object)
+    GET /history    recent process_data snapshots (JSON array, oldest first)
+    GET /health     state and metrics of the remote endpoint circuit breakers (JSON object)
+    GET /ws         WebSocket, pushes every new snapshot as text frame
+"""
+
+import base64
+import hashlib
+import logging
+import struct
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Thread
+
+_WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_WEBSOCKET_PING_INTERVAL = 30
+
+
+class StatusCache:
+    """
+    Thread safe cache of the latest process_data snapshots.
+
+    Snapshots are published already JSON encoded, readers only receive the encoded bytes.
+    """
+
+    def __init__(self, history_length=300):
+        self._condition = Condition()
+        self._sequence = 0
+        self._latest = b'{}'
+        self._history = deque(maxlen=history_length)
+        self._health = b'{}'
+
+    def publish(self, payload: bytes):
+        """store a new encoded snapshot and wake up all waiting subscribers"""
+        with self._condition:
+            self._sequence += 1
+            self._latest = payload
+            self._history.append(payload)
+            self._condition.notify_all()
+
+    def publish_health(self, payload: bytes):
+        """store the encoded endpoint health"""
+        self._health = payload
+
+    def health(self) -> bytes:
+        return self._health
+
+    def latest(self):
+        """return tuple of (sequence, encoded snapshot)"""
+        with self._condition:
+            return self._sequence, self._latest
+
+    def history(self) -> bytes:
+        """return all cached snapshots as encoded JSON array"""
+        with self._condition:
+            snapshots = list(self._history)
+        return b'[' + b','.join(snapshots) + b']'
+
+    def wait_for_update(self, sequence, timeout=None):
+        """block until a snapshot newer than sequence is published, return (sequence, snapshot)"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequence != sequence, timeout)
+            return self._sequence, self._latest
+
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'DishwasherOS'
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0].rstrip('/')
+        if path == '/status':
+            self._send_json(self.server.cache.latest()[1])
+        elif path == '/history':
+            self._send_json(self.server.cache.history())
+        elif path == '/health':
+            self._send_json(self.server.cache.health())
+        elif path == '/ws':
+            self._serve_websocket()
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        # route the access log into the DishwasherOS logger instead of stderr
+        self.server.module_logger.debug('status request %s - ' + format, self.address_string(), *args)
+
+    def _send_json(self, payload: bytes):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _serve_websocket(self):
+        key = self.headers.get('Sec-WebSocket-Key')
+        if self.headers.get('Upgrade', '').lower() != 'websocket' or key is None:
+            self.send_error(400, 'websocket upgrade expected')
+            return
+        accept = base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode('ascii')).digest())
+        self.send_response(101)
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept.decode('ascii'))
+        self.end_headers()
+        self.close_connection = True
+
+        sequence, snapshot = self.server.cache.latest()
+        try:
+            self.wfile.write(_encode_websocket_frame(snapshot, 0x1))
+            while not self.server.is_stopping:
+                new_sequence, snapshot = self.server.cache.wait_for_update(sequence, _WEBSOCKET_PING_INTERVAL)
+                if new_sequence == sequence:
+                    # no new data, check if the subscriber is still there
+                    self.wfile.write(_encode_websocket_frame(b'', 0x9))
+                    continue
+                sequence = new_sequence
+                self.wfile.write(_encode_websocket_frame(snapshot, 0x1))
+        except OSError:
+            # subscriber has gone away
+            pass
+
+
+def _encode_websocket_frame(payload: bytes, opcode: int) -> bytes:
+    """encode a single unmasked server to client websocket frame"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+class StatusServer(ThreadingHTTPServer):
+    """
+    HTTP/WebSocket server running in its own daemon thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, cache: StatusCache, port, host='0.0.0.0'):
+        super().__init__((host, port), StatusRequestHandler)
+        self.cache = cache
+        self.is_stopping = False
+        self.module_logger = logging.getLogger('DishwasherOS.StatusServer')
+        self.thread = Thread(target=self.serve_forever, daemon=True)
+
+    def start(self):
+        self.module_logger.info('start status server on port %s', self.server_address[1])
+        self.thread.start()
+
+    def stop(self):
+        self.is_stopping = True
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,183 @@
+"""
+Flash friendly write path for all persistent output.
+
+Small appends are staged in RAM and committed to the SD card by a background thread in large
+chunks: every `storageSyncInterval` seconds, as soon as `storageSyncBytes` are staged, when a file
+is completed (program end) and on shutdown (SIGTERM/SIGINT or interpreter exit).
+
+Crash-safety guarantee: after a power loss or kernel crash at most the data of the last
+`storageSyncInterval` seconds is lost. Committed data is fsync'ed, running files are written as
+`<name>.part` and only renamed atomically to `<name>` once complete, so a completed file is never
+torn. Files which get rewritten as a whole (e.g. RunningLog.csv) are replaced atomically.
+"""
+
+import atexit
+import logging
+import os
+import signal
+import time
+from threading import Event, Lock, Thread
+
+_BLOCK_SIZE = 4096
+
+
+def _fsync_directory(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data: bytes):
+    """replace the content of path atomically with data"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as fd:
+        fd.write(data)
+        fd.flush()
+        os.fsync(fd.fileno())
+    os.replace(tmp_path, path)
+    _fsync_directory(path)
+
+
+def atomic_append(path, data: bytes):
+    """append data to a small file by atomically replacing it, the file is never torn"""
+    try:
+        with open(path, 'rb') as fd:
+            content = fd.read()
+    except FileNotFoundError:
+        content = b''
+    atomic_write(path, content + data)
+
+
+class StagedFile:
+    """
+    Append only file which is staged in RAM and committed to `<path>.part` in chunks.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.part_path = path + '.part'
+        self.lock = Lock()
+        # serializes the commits, appends only wait for self.lock and never for the SD card
+        self.write_lock = Lock()
+        self.buffer = bytearray()
+        self.completed = False
+
+    def append(self, data: bytes) -> int:
+        """stage data, returns the number of staged bytes"""
+        with self.lock:
+            self.buffer += data
+            return len(self.buffer)
+
+    def sync(self, force=True):
+        """commit staged data, without force only whole blocks are written"""
+        with self.write_lock:
+            with self.lock:
+                size = len(self.buffer) if force else len(self.buffer) - len(self.buffer) % _BLOCK_SIZE
+                if size == 0:
+                    return
+                data = bytes(self.buffer[:size])
+                del self.buffer[:size]
+            with open(self.part_path, 'ab') as fd:
+                fd.write(data)
+                fd.flush()
+                os.fsync(fd.fileno())
+
+    def complete(self):
+        """commit all staged data and atomically publish the file under its final name"""
+        self.sync()
+        with self.write_lock:
+            self.completed = True
+            if os.path.exists(self.part_path):
+                os.replace(self.part_path, self.path)
+                _fsync_directory(self.path)
+
+
+class StorageManager:
+    """
+    Owns all staged files and commits them to flash according to the sync policy.
+    """
+
+    def __init__(self, sync_interval=30, sync_bytes=64 * 1024):
+        self.module_logger = logging.getLogger('DishwasherOS.Storage')
+        self.sync_interval = sync_interval
+        self.sync_bytes = sync_bytes
+        self.files = {}
+        self.flush_callbacks = []
+        self.files_lock = Lock()
+        self.event_sync = Event()
+        self.event_stop = Event()
+        self.thread = Thread(target=self._target, name='StorageSync', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def append(self, path, data):
+        """stage data for the file path, data can be str or bytes"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self.files_lock:
+            staged_file = self.files.get(path)
+            if staged_file is None:
+                staged_file = self.files[path] = StagedFile(path)
+        if staged_file.append(data) >= self.sync_bytes:
+            # let the sync thread write the full blocks, never write on the calling thread
+            self.event_sync.set()
+
+    def complete(self, path):
+        """commit and publish a finished file (e.g. a data record at program end)"""
+        with self.files_lock:
+            staged_file = self.files.pop(path, None)
+        if staged_file is not None:
+            staged_file.complete()
+
+    def register_flush(self, callback):
+        """register a function which is called on every sync, e.g. to flush buffered log records"""
+        self.flush_callbacks.append(callback)
+
+    def sync_all(self, force=True):
+        with self.files_lock:
+            staged_files = list(self.files.values())
+        for staged_file in staged_files:
+            try:
+                staged_file.sync(force)
+            except OSError:
+                self.module_logger.exception('unable to sync %s', staged_file.part_path)
+        if force:
+            for callback in self.flush_callbacks:
+                callback()
+
+    def _target(self):
+        time_last_sync = time.monotonic()
+        while not self.event_stop.is_set():
+            self.event_sync.wait(max(0.0, time_last_sync + self.sync_interval - time.monotonic()))
+            self.event_sync.clear()
+            if time.monotonic() - time_last_sync >= self.sync_interval:
+                self.sync_all()
+                time_last_sync = time.monotonic()
+            else:
+                # a sync triggered by size only writes whole blocks
+                self.sync_all(force=False)
+
+    def install_signal_handlers(self):
+        """commit everything before the process is terminated, must be called from the main thread"""
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signal_number, self._handle_signal)
+
+    def _handle_signal(self, signal_number, frame):
+        self.module_logger.warning('received signal %s, sync storage', signal_number)
+        self.stop()
+        signal.signal(signal_number, signal.SIG_DFL)
+        os.kill(os.getpid(), signal_number)
+
+    def stop(self):
+        """commit all staged data and stop the sync thread"""
+        if self.event_stop.is_set():
+            return
+        self.event_stop.set()
+        self.event_sync.set()
+        self.sync_all()
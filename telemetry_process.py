@@ -0,0 +1,348 @@
+"""
+Optional two-process architecture (setting `telemetryProcess.enabled`).
+
+The control process owns the GPIOs, the sensors, the WashingProgram and the lifecycle. Instead of
+a ProcessDataProvider it runs a RingSampleWriter, which only reads the inputs and writes binary
+records into a shared memory ring (see sample_ring.py): samples on the telemetry schedule, the
+rows of the data record and the program completion. No JSON encoding, HTTP, serial or storage
+work is left in the control process.
+
+The telemetry process (this module run as a script, started by TelemetrySupervisor) reads the
+ring and drives an unmodified ProcessDataProvider with the records: electricity meter, energy and
+anomaly accounting, serial projector, backend, status server and the data record files.
+
+Crash isolation:
+    telemetry crash     the writer never waits for the reader, the supervisor in the control
+                        process restarts the telemetry process (also when it stops reading)
+    control crash       the telemetry process notices the lost parent, commits its staged
+                        data, removes the shared memory segment and exits
+"""
+
+import argparse
+import logging
+import math
+import os
+import struct
+import subprocess
+import sys
+import time
+from threading import Event, Lock, Thread
+
+from process_data import (REPORT_AFTERRUNNING, REPORT_IS_ALIVE, REPORT_PROCESS_DATA, ProcessDataProvider,
+                          SendProcessDataRepeatedTimer)
+from process_sample import SensorValues
+from program import ProgramSnapshot
+from resync import actuator_mask
+from sample_ring import SampleRing
+
+KIND_SAMPLE = 1
+KIND_DATA_ROW = 2
+KIND_COMPLETION = 3
+KIND_STOP = 4
+
+_REPORT_MODES = (REPORT_IS_ALIVE, REPORT_PROCESS_DATA, REPORT_AFTERRUNNING)
+# temperatures of the 1-Wire sensors carried by a record, sorted by name
+_MAX_TEMPERATURES = 4
+# snapshot fields carried by a record, the names are not needed by the telemetry
+_SNAPSHOT_FIELDS = tuple(field for field in ProgramSnapshot._fields if field not in ('program_name', 'sequence_name'))
+_INT_FIELDS = ('selected_program', 'step_operational', 'step_sequence', 'time_start', 'time_end')
+# kind, report mode, transition, actuator mask, time, temperature, temperatures, snapshot
+RECORD = struct.Struct('<BBBBxxxxdd{}d{}d'.format(_MAX_TEMPERATURES, len(_SNAPSHOT_FIELDS)))
+_STOP_RECORD = RECORD.pack(KIND_STOP, 0, 0, 0, *((0.0,) * (2 + _MAX_TEMPERATURES + len(_SNAPSHOT_FIELDS))))
+
+
+def _float(value) -> float:
+    return math.nan if value is None else float(value)
+
+
+def encode_record(kind, report_mode, snapshot, time_now, temperature, temperatures: tuple,
+                  sensor_values: SensorValues, transition=False) -> bytes:
+    temperatures = tuple(_float(value) for value in temperatures[:_MAX_TEMPERATURES])
+    temperatures += (math.nan,) * (_MAX_TEMPERATURES - len(temperatures))
+    return RECORD.pack(kind, _REPORT_MODES.index(report_mode), int(transition), actuator_mask(sensor_values),
+                       time_now, temperature, *temperatures,
+                       *(_float(getattr(snapshot, field)) for field in _SNAPSHOT_FIELDS))
+
+
+class RingSampleWriter:
+    """
+    Stand-in for the ProcessDataProvider in the control process, see the module docstring.
+    """
+
+    def __init__(self, program, ring: SampleRing, session_id=None):
+        self.session_id = session_id if session_id is not None else int(time.time())
+        self.program = program
+        self.ring = ring
+        self.swconfig = program.swconfig
+        self.module_logger = logging.getLogger('DishwasherOS.RingWriter')
+        self.module_logger.info('initialize RingSampleWriter with [session_id:%s]', self.session_id)
+        self.report_mode = REPORT_IS_ALIVE
+        # the status cache lives in the telemetry process
+        self.status_cache = None
+        self.lock = Lock()
+        self.sensor_values = SensorValues()
+        self.temperature_names = sorted(program.machine.read_temperatures())[:_MAX_TEMPERATURES]
+        # samples follow the fixed interval, the telemetry process decides which ones it reports
+        self.timer = SendProcessDataRepeatedTimer(self.swconfig.data_repeated_timer_interval, self.write_sample)
+
+    def set_report_mode(self, report_mode, expected=None):
+        """see ProcessDataProvider.set_report_mode"""
+        with self.lock:
+            if report_mode == self.report_mode or (expected is not None and self.report_mode != expected):
+                return
+            self.module_logger.info('report mode %s -> %s', self.report_mode, report_mode)
+            self.report_mode = report_mode
+        self.request_process_data()
+
+    def request_process_data(self):
+        self.timer.trigger()
+
+    @property
+    def electricity_aenergy_init(self) -> float:
+        """initial meter reading of the run, read by the telemetry process"""
+        return self.ring.get_aenergy_init()
+
+    @electricity_aenergy_init.setter
+    def electricity_aenergy_init(self, aenergy):
+        self.ring.set_aenergy_init(aenergy)
+
+    def stop(self):
+        self.timer.stop()
+
+    def _write(self, kind, transition=False):
+        machine = self.program.machine
+        snapshot = self.program.snapshot
+        temperatures = machine.read_temperatures()
+        with self.lock:
+            machine.read_actuator_sensor_values(self.sensor_values)
+            self.ring.write(encode_record(kind, self.report_mode, snapshot, self.program.clock(),
+                                          machine.read_temperature(),
+                                          tuple(temperatures.get(name) for name in self.temperature_names),
+                                          self.sensor_values, transition))
+        return snapshot
+
+    def write_sample(self):
+        """timer function"""
+        report_mode = self.report_mode
+        snapshot = self._write(KIND_SAMPLE)
+        if report_mode == REPORT_AFTERRUNNING and snapshot.time_end is not None:
+            if self.program.clock() - snapshot.time_end > self.swconfig.program_afterrunning_cycle:
+                self.set_report_mode(REPORT_IS_ALIVE, expected=REPORT_AFTERRUNNING)
+
+    def write_csv_data_record(self, step_transition_triggered=False):
+        self._write(KIND_DATA_ROW, step_transition_triggered)
+
+    def write_csv_program_completion_record(self):
+        self._write(KIND_COMPLETION)
+
+    def get_program_aenergy(self) -> int:
+        """energy of the run in Wh, as last measured by the telemetry process"""
+        return int(self.ring.get_aenergy())
+
+
+class TelemetrySupervisor:
+    """
+    Starts the telemetry process and restarts it when it has crashed or stopped reading the ring.
+    """
+
+    def __init__(self, writer: RingSampleWriter, restart_delay=5.0, hang_timeout=60.0):
+        self.module_logger = logging.getLogger('DishwasherOS.TelemetrySupervisor')
+        self.ring = writer.ring
+        self.arguments = [sys.executable, os.path.abspath(__file__), self.ring.name, str(writer.session_id),
+                          writer.program.machine.device_identifier, *writer.temperature_names]
+        self.restart_delay = restart_delay
+        self.hang_timeout = hang_timeout
+        self.process = None
+        self.restarts = 0
+        self.event_stop = Event()
+        self.thread = Thread(target=self._target, name='TelemetrySupervisor', daemon=True)
+
+    def start(self):
+        self._spawn()
+        self.thread.start()
+
+    def _spawn(self):
+        self.process = subprocess.Popen(self.arguments, cwd=os.getcwd())
+        self.time_spawn = time.monotonic()
+        self.module_logger.info('telemetry process started with pid %s', self.process.pid)
+
+    def _target(self):
+        while not self.event_stop.wait(1.0):
+            exit_code = self.process.poll()
+            if exit_code is None:
+                heartbeat = self.ring.telemetry_heartbeat
+                if heartbeat is None:
+                    heartbeat = time.monotonic() - self.time_spawn
+                if heartbeat < self.hang_timeout:
+                    continue
+                self.module_logger.error('telemetry process has not read the ring for %.0fs, kill it', heartbeat)
+                self.process.kill()
+                self.process.wait()
+            else:
+                self.module_logger.error('telemetry process exited with %s', exit_code)
+            if self.event_stop.wait(self.restart_delay):
+                return
+            self.restarts += 1
+            self._spawn()
+
+    def stop(self, timeout=10.0):
+        """let the telemetry process commit its data and exit"""
+        self.event_stop.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.ring.write(_STOP_RECORD)
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.module_logger.error('telemetry process did not exit, kill it')
+            self.process.kill()
+
+
+class RingMachineView:
+    """the inputs of the last record, stands in for the Dishwasher in the telemetry process"""
+
+    def __init__(self, device_identifier):
+        self.device_identifier = device_identifier
+        self.temperature = 0.0
+        self.temperatures = {}
+        self.sensor_values = SensorValues()
+
+    def read_temperature(self) -> float:
+        return self.temperature
+
+    def read_temperatures(self) -> dict:
+        return self.temperatures
+
+    def read_actuator_sensor_values(self, sensor_values: SensorValues = None) -> SensorValues:
+        if sensor_values is None:
+            sensor_values = SensorValues()
+        for name in SensorValues.__slots__:
+            setattr(sensor_values, name, getattr(self.sensor_values, name))
+        return sensor_values
+
+
+class RingProgramView:
+    """the program state of the last record, stands in for the WashingProgram in the telemetry process"""
+
+    def __init__(self, swconfig, machine: RingMachineView):
+        self.swconfig = swconfig
+        self.machine = machine
+        # the run archive falls back to the default program definition
+        self.definition = None
+        self.snapshot = None
+        self.time_now = 0.0
+        self.time_start = None
+        self.selected_program = 0
+        self.estimated_runtime = 0
+
+    def clock(self):
+        return self.time_now
+
+    def get_current_runtime(self):
+        return self.snapshot.get_current_runtime(self.time_now)
+
+    def apply(self, values, temperature_names):
+        """take over the values of a record, returns (kind, report mode, transition)"""
+        kind, report_mode, transition, mask, time_now, temperature = values[:6]
+        temperatures = values[6:6 + _MAX_TEMPERATURES]
+        fields = dict(zip(_SNAPSHOT_FIELDS, values[6 + _MAX_TEMPERATURES:]))
+        for name, value in fields.items():
+            if math.isnan(value):
+                fields[name] = None
+            elif name in _INT_FIELDS:
+                fields[name] = int(value)
+        fields['is_thermo_stop'] = bool(fields['is_thermo_stop'])
+        self.snapshot = ProgramSnapshot(program_name='', sequence_name='', **fields)
+        self.time_now = time_now
+        self.time_start = self.snapshot.time_start
+        self.selected_program = self.snapshot.selected_program
+        self.estimated_runtime = self.snapshot.estimated_runtime
+        machine = self.machine
+        machine.temperature = temperature
+        machine.temperatures = {name: None if math.isnan(value) else value
+                                for name, value in zip(temperature_names, temperatures)}
+        for bit, name in enumerate(SensorValues.__slots__):
+            setattr(machine.sensor_values, name, (mask >> bit) & 1)
+        return kind, _REPORT_MODES[report_mode], bool(transition)
+
+
+def run_telemetry_process(ring_name, session_id, device_identifier, temperature_names):
+    import logger
+    from config import SoftwareConfig
+    from status_server import StatusServer
+    from storage import StorageManager
+
+    swconfig = SoftwareConfig()
+    logger.setup_logger(swconfig, 'runlog_telemetry.log')
+    module_logger = logging.getLogger('DishwasherOS.TelemetryProcess')
+    parent_pid = os.getppid()
+    ring = SampleRing.attach(ring_name)
+    storage = StorageManager(swconfig.storage_sync_interval, swconfig.storage_sync_bytes)
+    storage.register_flush(logger.flush_file_log)
+    storage.install_signal_handlers()
+
+    program = RingProgramView(swconfig, RingMachineView(device_identifier))
+    provider = None
+    status_server = None
+    report_mode = None
+    module_logger.info('telemetry process attached to %s', ring_name)
+    try:
+        while True:
+            ring.beat_telemetry()
+            values = ring.read(RECORD)
+            if values is None:
+                if os.getppid() != parent_pid:
+                    module_logger.error('control process is gone, stop the telemetry process')
+                    try:
+                        ring.unlink()
+                    except FileNotFoundError:
+                        # already removed by the resource tracker of the control process
+                        pass
+                    break
+                time.sleep(swconfig.telemetry_process_poll_interval)
+                continue
+            if values[0] == KIND_STOP:
+                break
+            kind, record_report_mode, transition = program.apply(values, temperature_names)
+            if provider is None:
+                provider = ProcessDataProvider(program, storage, session_id, start_timer=False)
+                # continue the energy measurement of the run after a restart of the telemetry process
+                if ring.get_aenergy_init():
+                    provider.electricity_aenergy_init = ring.get_aenergy_init()
+                else:
+                    ring.set_aenergy_init(provider.electricity_aenergy_init)
+                if swconfig.status_server_port:
+                    status_server = StatusServer(provider.status_cache, swconfig.status_server_port)
+                    status_server.start()
+            if record_report_mode != report_mode:
+                report_mode = record_report_mode
+                provider.set_report_mode(report_mode)
+            if ring.dropped:
+                module_logger.warning('%s records dropped, the telemetry process is too slow', ring.dropped)
+                ring.dropped = 0
+            if kind == KIND_SAMPLE:
+                provider.collect_process_data()
+                if provider.sample.machine_aenergy is not None:
+                    ring.set_aenergy(provider.sample.machine_aenergy)
+            elif kind == KIND_DATA_ROW:
+                provider.write_csv_data_record(transition)
+            elif kind == KIND_COMPLETION:
+                provider.write_csv_program_completion_record()
+    finally:
+        if provider is not None:
+            provider.stop()
+        if status_server is not None:
+            status_server.stop()
+        storage.stop()
+        ring.close()
+        logger.stop_logger()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='telemetry process of the two-process architecture')
+    parser.add_argument('ring_name')
+    parser.add_argument('session_id', type=int)
+    parser.add_argument('device_identifier')
+    parser.add_argument('temperature_names', nargs='*')
+    args = parser.parse_args()
+    run_telemetry_process(args.ring_name, args.session_id, args.device_identifier, args.temperature_names)
@@ -0,0 +1,90 @@
+"""
+ActuatorWorker: timed output sequences with the queue, replace and coalesce policies.
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from actuator import ActuatorWorker  # noqa: E402
+
+BUZZER = 12
+RESET = 20
+LONG_HOLD = 60.0
+
+
+def wait_until(predicate, timeout=2.0):
+    """wait for the worker thread"""
+    time_end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > time_end:
+            raise AssertionError('timed out')
+        time.sleep(0.005)
+
+
+class ActuatorWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.outputs = []
+        self.worker = ActuatorWorker(self.write_output)
+
+    def tearDown(self):
+        self.worker.stop()
+
+    def write_output(self, pin, level):
+        if pin is None:
+            raise RuntimeError('no pin')
+        self.outputs.append((pin, level))
+
+    def test_queue(self):
+        self.worker.submit('buzzer', [(BUZZER, 1, 0.01), (BUZZER, 0, 0.01)])
+        self.worker.submit('buzzer', [(BUZZER, 1, 0.01), (BUZZER, 0, 0)])
+        self.assertTrue(self.worker.wait_idle(2.0))
+        self.assertEqual(self.outputs, [(BUZZER, 1), (BUZZER, 0), (BUZZER, 1), (BUZZER, 0)])
+        self.assertFalse(self.worker.is_busy('buzzer'))
+        self.assertFalse(self.worker.is_busy('unknown'))
+
+    def test_channels_run_in_parallel(self):
+        self.worker.submit('buzzer', [(BUZZER, 1, LONG_HOLD), (BUZZER, 0, 0)])
+        self.worker.submit('projector', [(RESET, 0, 0.01), (RESET, 1, 0)])
+        wait_until(lambda: not self.worker.is_busy('projector'))
+        self.assertEqual(self.outputs, [(BUZZER, 1), (RESET, 0), (RESET, 1)])
+        self.assertTrue(self.worker.is_busy('buzzer'))
+        self.assertTrue(self.worker.is_busy())
+
+    def test_replace_restores_idle(self):
+        self.worker.submit('buzzer', [(BUZZER, 1, LONG_HOLD), (BUZZER, 0, 0)], idle=[(BUZZER, 0)])
+        wait_until(lambda: self.outputs)
+        self.worker.submit('buzzer', [(BUZZER, 1, LONG_HOLD)], idle=[(BUZZER, 0)])
+        self.worker.submit('buzzer', [(BUZZER, 1, 0.01), (BUZZER, 0, 0)], ActuatorWorker.REPLACE, idle=[(BUZZER, 0)])
+        self.assertTrue(self.worker.wait_idle(2.0))
+        # the idle output of the cancelled sequence, the pending sequence is dropped
+        self.assertEqual(self.outputs, [(BUZZER, 1), (BUZZER, 0), (BUZZER, 1), (BUZZER, 0)])
+
+    def test_coalesce(self):
+        steps = [(BUZZER, 1, 0.05), (BUZZER, 0, 0)]
+        self.worker.submit('buzzer', steps)
+        self.worker.submit('buzzer', steps, ActuatorWorker.COALESCE)
+        self.worker.submit('buzzer', steps, ActuatorWorker.COALESCE)
+        self.assertTrue(self.worker.wait_idle(2.0))
+        self.assertEqual(self.outputs, [(BUZZER, 1), (BUZZER, 0)])
+
+    def test_cancel(self):
+        self.worker.submit('buzzer', [(BUZZER, 1, LONG_HOLD), (BUZZER, 0, 0)], idle=[(BUZZER, 0)])
+        wait_until(lambda: self.outputs)
+        self.worker.cancel('buzzer')
+        self.worker.cancel('unknown')
+        self.assertTrue(self.worker.wait_idle(2.0))
+        self.assertEqual(self.outputs, [(BUZZER, 1), (BUZZER, 0)])
+
+    def test_output_error_keeps_worker_running(self):
+        self.worker.submit('projector', [(None, 1, 0), (RESET, 1, 0)])
+        self.assertTrue(self.worker.wait_idle(2.0))
+        self.assertEqual(self.outputs, [(RESET, 1)])
+        self.assertTrue(self.worker.thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Checkpoint journal: the record round-trip, torn and corrupted tails, sessions and the resume
+validation.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import Checkpoint, CheckpointJournal, read_last_checkpoint, validate_checkpoint  # noqa: E402
+from process_sample import SensorValues  # noqa: E402
+
+TIME_START = 1600000000
+RECORD_SIZE = 64
+
+
+def checkpoint(step=1, session_id=TIME_START, time_end=None, aenergy_init=0.0):
+    return Checkpoint(session_id, 4, step, 1, TIME_START, time_end, TIME_START + 30.5 * step, 20.5, 5018.0,
+                      aenergy_init)
+
+
+def snapshot(step=1, time_end=None):
+    record = checkpoint(step, time_end=time_end)
+    return types.SimpleNamespace(selected_program=record.selected_program, step_operational=step,
+                                 step_sequence=record.step_sequence, time_start=record.time_start,
+                                 time_end=time_end, time_step_operational_start=record.time_step_operational_start,
+                                 thermostop_starttemp=record.thermostop_starttemp,
+                                 estimated_runtime=record.estimated_runtime)
+
+
+class CheckpointRecordTest(unittest.TestCase):
+    def test_round_trip(self):
+        for record in (checkpoint(), checkpoint(56, time_end=TIME_START + 4000, aenergy_init=1234.5)):
+            data = record.encode()
+            self.assertEqual(len(data), RECORD_SIZE)
+            self.assertEqual(Checkpoint.decode(data), record)
+        self.assertFalse(checkpoint().is_finished)
+        self.assertTrue(checkpoint(time_end=TIME_START).is_finished)
+
+    def test_corrupted(self):
+        data = bytearray(checkpoint().encode())
+        self.assertIsNone(Checkpoint.decode(bytes(data[:-1])))
+        data[10] ^= 0x01
+        self.assertIsNone(Checkpoint.decode(bytes(data)))
+        self.assertIsNone(Checkpoint.decode(bytes(RECORD_SIZE)))
+
+
+class CheckpointJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'checkpoint.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_journal(self, *records):
+        with open(self.path, 'wb') as fd:
+            for record in records:
+                fd.write(record)
+
+    def test_read_last_checkpoint(self):
+        self.assertIsNone(read_last_checkpoint(self.path))
+        self.write_journal(checkpoint(1).encode(), checkpoint(2).encode())
+        self.assertEqual(read_last_checkpoint(self.path), checkpoint(2))
+
+    def test_torn_tail(self):
+        self.write_journal(checkpoint(1).encode(), checkpoint(2).encode(), checkpoint(3).encode()[:40])
+        self.assertEqual(read_last_checkpoint(self.path), checkpoint(2))
+
+    def test_corrupted_tail(self):
+        corrupted = bytearray(checkpoint(3).encode())
+        corrupted[20] ^= 0xFF
+        self.write_journal(checkpoint(1).encode(), checkpoint(2).encode(), bytes(corrupted))
+        self.assertEqual(read_last_checkpoint(self.path), checkpoint(2))
+        self.write_journal(bytes(corrupted))
+        self.assertIsNone(read_last_checkpoint(self.path))
+
+    def test_record(self):
+        journal = CheckpointJournal(self.path, TIME_START)
+        journal.get_aenergy_init = lambda: 1234.5
+        # no running program
+        journal.record(types.SimpleNamespace(time_start=None))
+        self.assertFalse(os.path.exists(self.path))
+        journal.record(snapshot(1))
+        journal.record(snapshot(1))
+        journal.record(snapshot(2))
+        journal.stop()
+        self.assertEqual(os.path.getsize(self.path), 2 * RECORD_SIZE)
+        self.assertEqual(read_last_checkpoint(self.path), checkpoint(2, aenergy_init=1234.5))
+
+    def test_new_session_truncates(self):
+        self.write_journal(checkpoint(1, session_id=TIME_START - 10000).encode())
+        journal = CheckpointJournal(self.path, TIME_START)
+        journal.record(snapshot(1))
+        journal.stop()
+        self.assertEqual(os.path.getsize(self.path), RECORD_SIZE)
+        self.assertEqual(read_last_checkpoint(self.path).session_id, TIME_START)
+
+    def test_resume_drops_torn_tail(self):
+        self.write_journal(checkpoint(1).encode(), checkpoint(2).encode()[:40])
+        last_checkpoint = read_last_checkpoint(self.path)
+        journal = CheckpointJournal(self.path)
+        journal.resume(last_checkpoint)
+        journal.record(snapshot(2))
+        journal.stop()
+        # the records after the resume stay aligned
+        self.assertEqual(os.path.getsize(self.path), 2 * RECORD_SIZE)
+        self.assertEqual(read_last_checkpoint(self.path), checkpoint(2))
+
+
+class ValidateCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.sensor_values = SensorValues()
+        self.machine = types.SimpleNamespace(read_actuator_sensor_values=lambda: self.sensor_values)
+        self.swconfig = types.SimpleNamespace(checkpoint_resume_window=900)
+
+    def validate(self, record, time_now):
+        return validate_checkpoint(record, self.machine, self.swconfig, clock=lambda: time_now)
+
+    def test_resumable(self):
+        record = checkpoint(10)
+        self.assertIsNone(self.validate(record, record.time_step_operational_start + 900))
+        self.sensor_values.pump_circulation = 1
+        self.assertIsNone(self.validate(record, record.time_step_operational_start + 3000))
+
+    def test_not_resumable(self):
+        record = checkpoint(10)
+        self.assertEqual(self.validate(checkpoint(time_end=TIME_START + 4000), TIME_START + 4100),
+                         'the run is finished')
+        self.assertEqual(self.validate(record, TIME_START - 1), 'the clock is behind the start of the run')
+        self.sensor_values.heating = 1
+        self.assertEqual(self.validate(record, TIME_START + 2 * 5018 + 1),
+                         'the run is more than twice as old as its estimated runtime')
+        self.sensor_values.heating = 0
+        self.assertEqual(self.validate(record, record.time_step_operational_start + 901),
+                         'no actuator is active and the last step started 901s ago')
+
+
+if __name__ == '__main__':
+    unittest.main()
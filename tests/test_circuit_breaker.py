@@ -0,0 +1,97 @@
+"""
+CircuitBreaker state transitions with an injected clock.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit_breaker import CircuitBreaker  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.states = []
+        self.breaker = CircuitBreaker('backend', failure_threshold=3, backoff_initial=2.0, backoff_max=10.0,
+                                      jitter=0.0, on_state_change=lambda breaker: self.states.append(breaker.state),
+                                      clock=self.clock)
+
+    def open_breaker(self):
+        for i in range(3):
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        # a success resets the consecutive failures
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.time_retry, 102.0)
+        self.assertEqual(self.states, [CircuitBreaker.OPEN])
+
+    def test_open_rejects_until_backoff_expired(self):
+        self.open_breaker()
+        self.clock.now = 101.9
+        self.assertFalse(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.total_rejected, 2)
+        self.clock.now = 102.0
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        # a single probe only
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_half_open_success_closes(self):
+        self.open_breaker()
+        self.clock.now = 102.0
+        self.breaker.allow_request()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.open_count, 0)
+        self.assertEqual(self.states, [CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN, CircuitBreaker.CLOSED])
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_half_open_failure_reopens_with_growing_backoff(self):
+        self.open_breaker()
+        retry_times = []
+        for i in range(5):
+            self.clock.now = self.breaker.time_retry
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record_failure()
+            self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+            retry_times.append(self.breaker.time_retry - self.clock.now)
+        # 2s doubled per reopening, capped at backoff_max
+        self.assertEqual(retry_times, [4.0, 8.0, 10.0, 10.0, 10.0])
+
+    def test_jitter(self):
+        breaker = CircuitBreaker('backend', failure_threshold=1, backoff_initial=10.0, jitter=0.2, clock=self.clock)
+        breaker.record_failure()
+        self.assertTrue(108.0 <= breaker.time_retry <= 112.0)
+
+    def test_snapshot(self):
+        self.open_breaker()
+        self.clock.now = 101.0
+        self.breaker.allow_request()
+        self.assertEqual(self.breaker.snapshot(), {'state': CircuitBreaker.OPEN, 'failures': 3, 'open_count': 1,
+                                                   'retry_in': 1, 'total_failures': 3, 'total_rejected': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+"""
+Edge trace: EdgeTrace on a synthetic journal (levels, duty cycles, the step timeline and a resumed
+run) and the journal written by the EdgeTraceRecorder.
+"""
+
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edge_trace import CLOCK_PIN, RECORD, STEP_PIN, EdgeTrace, EdgeTraceRecorder  # noqa: E402
+
+TIME_START = 1600000000
+PUMP = 17
+HEATING = 27
+PINS = {'pump_circulation': PUMP, 'heating': HEATING}
+# monotonic clock at the start of the run
+MONOTONIC_START = 5000 * 1000000000
+
+
+def header(time_start=TIME_START, magic=b'DWET'):
+    data = struct.pack('<4sHHq', magic, 1, len(PINS), time_start)
+    return data + b''.join(struct.pack('<B23s', pin, name.encode('utf-8')) for name, pin in PINS.items())
+
+
+def records(monotonic_start, *entries) -> bytes:
+    """records of (seconds since monotonic_start, pin, level)"""
+    return b''.join(RECORD.pack(monotonic_start + int(seconds * 1e9), pin, level) for seconds, pin, level in entries)
+
+
+def clock(monotonic_start, seconds_since_start) -> bytes:
+    return (RECORD.pack(monotonic_start, CLOCK_PIN, 0)
+            + RECORD.pack((TIME_START + seconds_since_start) * 1000000000, CLOCK_PIN, 1))
+
+
+RUN = (clock(MONOTONIC_START, 0) + records(
+    MONOTONIC_START,
+    (0, PUMP, 0), (0, HEATING, 0), (0, STEP_PIN, 1),
+    (10, PUMP, 1),
+    (20, STEP_PIN, 2),
+    (30, PUMP, 0), (30, HEATING, 1),
+    # no level change
+    (35, HEATING, 1),
+    (40, HEATING, 0),
+    (50, STEP_PIN, 3),
+    (60, PUMP, 1),
+    (80, PUMP, 0)))
+
+
+class EdgeTraceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, '{}_EdgeTrace.bin'.format(TIME_START))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, *parts) -> EdgeTrace:
+        with open(self.path, 'wb') as fd:
+            for part in parts:
+                fd.write(part)
+        return EdgeTrace.read(self.path)
+
+    def test_levels(self):
+        trace = self.read(header(), RUN)
+        self.assertEqual(trace.pins, {PUMP: 'pump_circulation', HEATING: 'heating'})
+        self.assertEqual(trace.levels['pump_circulation'], [(0.0, 0), (10.0, 1), (30.0, 0), (60.0, 1), (80.0, 0)])
+        self.assertEqual(trace.levels['heating'], [(0.0, 0), (30.0, 1), (40.0, 0)])
+        self.assertEqual(trace.steps, [(0.0, 1), (20.0, 2), (50.0, 3)])
+        self.assertEqual(trace.time_end, 80.0)
+
+    def test_duty_cycles(self):
+        trace = self.read(header(), RUN)
+        self.assertEqual(trace.intervals('pump_circulation'), [(10.0, 30.0), (60.0, 80.0)])
+        self.assertEqual(trace.intervals('pump_circulation', 20.0, 70.0), [(20.0, 30.0), (60.0, 70.0)])
+        self.assertEqual(trace.duty_cycles(), {'pump_circulation': 0.5, 'heating': 0.125})
+        duty = trace.duty_cycles(20.0, 50.0)
+        self.assertAlmostEqual(duty['pump_circulation'], 1 / 3)
+        self.assertAlmostEqual(duty['heating'], 1 / 3)
+        self.assertEqual(trace.duty_cycles(50.0, 50.0), {'pump_circulation': 0.0, 'heating': 0.0})
+
+    def test_step_timeline(self):
+        spans = self.read(header(), RUN).step_timeline()
+        self.assertEqual([(span.step, span.start, span.end) for span in spans],
+                         [(1, 0.0, 20.0), (2, 20.0, 50.0), (3, 50.0, 80.0)])
+        self.assertEqual([span.edges for span in spans], [
+            {'pump_circulation': 1, 'heating': 0},
+            {'pump_circulation': 0, 'heating': 1},
+            {'pump_circulation': 1, 'heating': 0}])
+        self.assertEqual(spans[0].duty, {'pump_circulation': 0.5, 'heating': 0.0})
+        self.assertAlmostEqual(spans[2].duty['pump_circulation'], 2 / 3)
+
+    def test_resumed_run(self):
+        # after a reboot the monotonic clock starts again, the new clock records keep the time axis
+        monotonic_reboot = 100 * 1000000000
+        trace = self.read(header(), RUN, clock(monotonic_reboot, 100), records(
+            monotonic_reboot, (0, PUMP, 0), (0, STEP_PIN, 3), (10, PUMP, 1), (20, PUMP, 0)))
+        self.assertEqual(trace.levels['pump_circulation'][-2:], [(110.0, 1), (120.0, 0)])
+        self.assertEqual(trace.steps[-1], (100.0, 3))
+        self.assertEqual(trace.time_end, 120.0)
+
+    def test_torn_tail(self):
+        trace = self.read(header(), RUN, RECORD.pack(MONOTONIC_START + 90 * 1000000000, PUMP, 1)[:7])
+        self.assertEqual(trace.time_end, 80.0)
+        self.assertEqual(trace.intervals('pump_circulation'), [(10.0, 30.0), (60.0, 80.0)])
+
+    def test_no_clock_reference(self):
+        # the first record is the start of the run
+        trace = self.read(header(), records(MONOTONIC_START, (0, PUMP, 1), (5, PUMP, 0)))
+        self.assertEqual(trace.levels['pump_circulation'], [(0.0, 1), (5.0, 0)])
+
+    def test_no_journal(self):
+        with self.assertRaises(ValueError):
+            self.read(header(magic=b'XXXX'), RUN)
+
+
+class EdgeTraceRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.levels = {PUMP: 0, HEATING: 1}
+        self.recorder = EdgeTraceRecorder(PINS, self.levels.get, buffer_records=8, flush_interval=60.0)
+        self.time_start = int(time.time())
+        self.path = os.path.join(self.directory, '{}_EdgeTrace.bin'.format(self.time_start))
+
+    def tearDown(self):
+        self.recorder.stop()
+        shutil.rmtree(self.directory)
+
+    def edge(self, pin, level):
+        self.levels[pin] = level
+        self.recorder.on_edge(pin)
+
+    def test_journal(self):
+        # not recording before the start of the run
+        self.edge(PUMP, 1)
+        self.recorder.start_run(self.directory, self.time_start, step=1)
+        self.edge(PUMP, 0)
+        self.recorder.mark_step(2)
+        self.edge(HEATING, 0)
+        self.edge(PUMP, 1)
+        self.recorder.stop_run()
+        self.edge(PUMP, 0)
+        trace = EdgeTrace.read(self.path)
+        self.assertEqual(trace.time_start, self.time_start)
+        self.assertEqual([level for _, level in trace.levels['pump_circulation']], [1, 0, 1])
+        self.assertEqual([level for _, level in trace.levels['heating']], [1, 0])
+        self.assertEqual([step for _, step in trace.steps], [1, 2])
+        self.assertTrue(all(0.0 <= time_now < 5.0 for time_now, _ in trace.steps))
+
+    def test_resume_appends(self):
+        self.recorder.start_run(self.directory, self.time_start, step=1)
+        self.recorder.stop_run()
+        size = os.path.getsize(self.path)
+        self.recorder.start_run(self.directory, self.time_start, step=3)
+        self.edge(PUMP, 1)
+        self.recorder.stop_run()
+        # one header, the records of the second segment
+        self.assertEqual(os.path.getsize(self.path), size + 6 * RECORD.size)
+        trace = EdgeTrace.read(self.path)
+        self.assertEqual([step for _, step in trace.steps], [1, 3])
+        self.assertEqual([level for _, level in trace.levels['pump_circulation']], [0, 1])
+
+    def test_dropped_edges(self):
+        self.recorder.start_run(self.directory, self.time_start)
+        # the writer thread is blocked, the second buffer fills and further edges are dropped
+        with self.recorder.write_lock:
+            for level in (1, 0) * 10:
+                self.edge(PUMP, level)
+            self.assertIsNotNone(self.recorder.pending)
+            self.assertEqual(self.recorder.dropped, 8)
+        self.recorder.stop_run()
+        self.assertEqual(self.recorder.dropped, 0)
+        # the header and both buffers
+        self.assertEqual(os.path.getsize(self.path), 16 + 2 * 24 + 16 * RECORD.size)
+
+
+if __name__ == '__main__':
+    unittest.main()
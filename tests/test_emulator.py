@@ -0,0 +1,173 @@
+"""
+Emulators: the temperature curves, the fake w1 sysfs tree read by OneWireBus, the frames of the
+projector pseudo terminal and the Switch.GetStatus RPC of the meter emulator.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emulator import FakeW1Bus, MeterEmulator, PiecewiseCurve, ProjectorEmulator  # noqa: E402
+from emulator.curves import as_curve  # noqa: E402
+from onewire import OneWireBus  # noqa: E402
+from process_sample import ProcessSample, encode_serial_frame  # noqa: E402
+
+MAIN = '28-0000058f94d2'
+AIR = '28-0000058f9401'
+
+
+def wait_until(predicate, timeout=2.0):
+    """wait for the emulator thread"""
+    time_end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > time_end:
+            raise AssertionError('timed out')
+        time.sleep(0.005)
+
+
+class PiecewiseCurveTest(unittest.TestCase):
+    def test_interpolation(self):
+        curve = PiecewiseCurve([(0, 20), (100, 60), (200, 60)])
+        self.assertEqual(curve(-5.0), 20.0)
+        self.assertEqual(curve(25.0), 30.0)
+        self.assertEqual(curve(100.0), 60.0)
+        self.assertEqual(curve(500.0), 60.0)
+
+    def test_step(self):
+        curve = PiecewiseCurve([(0, 5), (60, 80), (120, 2100)], is_step=True)
+        self.assertEqual(curve(59.9), 5.0)
+        self.assertEqual(curve(60.0), 80.0)
+        self.assertEqual(curve(1000.0), 2100.0)
+
+    def test_as_curve(self):
+        self.assertEqual(as_curve(42)(1000.0), 42.0)
+        self.assertEqual(as_curve([(0, 0), (10, 10)])(5.0), 5.0)
+        function = lambda time_now: 2 * time_now  # noqa: E731
+        self.assertIs(as_curve(function), function)
+
+
+class FakeW1BusTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.w1_bus = None
+
+    def tearDown(self):
+        if self.w1_bus is not None:
+            self.w1_bus.stop()
+        shutil.rmtree(self.directory)
+
+    def create(self, **kwargs) -> OneWireBus:
+        sensors = {MAIN: PiecewiseCurve([(0, 20), (0.05, 55)], is_step=True), AIR: 21.5}
+        self.w1_bus = FakeW1Bus(self.directory, sensors, resolution=9, update_interval=0.02, **kwargs).start()
+        return OneWireBus({'main': MAIN}, devices_path=self.directory)
+
+    def test_bulk_conversion(self):
+        bus = self.create()
+        self.assertEqual([sensor.resolution for sensor in bus.sensors], [9, 9])
+        self.assertEqual(len(bus.bulk_read_paths), 1)
+        # the value written at the creation of the tree is replaced by the conversion
+        with open(os.path.join(self.directory, MAIN, 'temperature')) as fd:
+            self.assertEqual(fd.read(), '20000')
+        self.assertEqual(bus.read_all(), {AIR: 21.5, 'main': 55.0})
+        self.assertEqual(self.w1_bus.conversions, 1)
+        with open(bus.bulk_read_paths[0]) as fd:
+            self.assertEqual(fd.read(), '1')
+
+    def test_failing_sensor(self):
+        bus = self.create()
+        self.w1_bus.set_failing(AIR)
+        self.assertEqual(bus.read_all(), {AIR: None, 'main': 55.0})
+        self.assertTrue(bus.sensors[0].is_failing)
+        self.w1_bus.set_failing(AIR, False)
+        self.assertEqual(bus.read_all()[AIR], 21.5)
+        self.assertFalse(bus.sensors[0].is_failing)
+
+    def test_single_read(self):
+        bus = self.create(bulk_read=False)
+        self.assertEqual(bus.bulk_read_paths, [])
+        self.w1_bus.set_failing(MAIN)
+        # w1_slave is refreshed every update_interval
+        wait_until(lambda: bus.read_all()['main'] is None)
+        self.assertEqual(bus.read_all()[AIR], 21.5)
+        self.assertEqual(self.w1_bus.conversions, 0)
+
+
+class ProjectorEmulatorTest(unittest.TestCase):
+    def setUp(self):
+        self.projector = ProjectorEmulator(history_length=2).start()
+        self.fd = os.open(self.projector.port, os.O_WRONLY | os.O_NOCTTY)
+
+    def tearDown(self):
+        os.close(self.fd)
+        self.projector.stop()
+
+    def test_frames(self):
+        sample = ProcessSample()
+        sample.program_time_start = 1600000000
+        sample.program_time_left_program = 4321
+        sample.program_progress_percent = 37
+        sample.machine_temperature = 55
+        sample.machine_sensor_values.pump_circulation = 1
+        sample.machine_sensor_values.heating = 1
+        # a frame split over two writes
+        frame = encode_serial_frame(sample)
+        os.write(self.fd, encode_serial_frame(ProcessSample()) + frame[:10])
+        os.write(self.fd, frame[10:])
+        wait_until(lambda: self.projector.frame_count == 2)
+        self.assertEqual(self.projector.last_frame.as_dict(), {
+            'time_received': self.projector.last_frame.time_received, 'time_left': 4321, 'progress': 37,
+            'temperature': 55, 'pump_circulation': 1, 'valve_inlet': 0, 'valve_outlet': 0, 'heating': 1})
+        self.assertEqual(self.projector.invalid_count, 0)
+
+    def test_invalid_frames(self):
+        os.write(self.fd, b'ETE12PR111T00M0U0E0A0H0X' + b'ETE0000PR111T00M0U0E0A0H0X' * 3)
+        wait_until(lambda: self.projector.frame_count == 3)
+        self.assertEqual(self.projector.invalid_count, 1)
+        self.assertEqual(self.projector.invalid_frames, [b'ETE12PR111T00M0U0E0A0H0X'])
+        # the history keeps the newest frames
+        self.assertEqual(len(self.projector.frames), 2)
+        self.assertTrue(self.projector.report().startswith('3 valid frames, 1 invalid frames\ninvalid: '))
+
+
+class MeterEmulatorTest(unittest.TestCase):
+    def setUp(self):
+        # 3600 W count one Wh per second
+        self.meter = MeterEmulator(3600.0, aenergy_init=1000.0).start()
+
+    def tearDown(self):
+        self.meter.stop()
+
+    def get(self, path='/rpc/Switch.GetStatus?id=0'):
+        with urllib.request.urlopen('http://{}{}'.format(self.meter.address, path), timeout=2.0) as response:
+            return json.loads(response.read())
+
+    def test_get_status(self):
+        data = self.get()
+        self.assertEqual(data['apower'], 3600)
+        time.sleep(0.05)
+        aenergy = self.get()['aenergy']['total']
+        self.assertGreaterEqual(aenergy, 1000.05)
+        self.assertLessEqual(aenergy, 1000.0 + time.monotonic() - self.meter.time_start + 0.001)
+        self.assertEqual(self.meter.requests, 2)
+
+    def test_not_found(self):
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.get('/rpc/Shelly.GetStatus')
+        self.assertEqual(context.exception.code, 404)
+        self.meter.is_offline = True
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.get()
+        self.assertEqual(context.exception.code, 404)
+        self.assertEqual(self.meter.requests, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+EnergyAccountant: trapezoidal integration of the power samples and their attribution to the steps.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from energy import EnergyAccountant, load_energy_records  # noqa: E402
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class EnergyAccountantTest(unittest.TestCase):
+    def setUp(self):
+        self.energy = EnergyAccountant(max_sample_gap=30.0)
+
+    def test_trapezoid(self):
+        # 0 W to 3600 W over 10 s and 3600 W for 10 s
+        self.energy.add_sample(100.0, 0, 1, 1)
+        self.energy.add_sample(110.0, 3600, 1, 1)
+        self.energy.add_sample(120.0, 3600, 1, 1)
+        step_energy = self.energy.steps[1]
+        self.assertAlmostEqual(step_energy.energy_ws, 18000 + 36000)
+        self.assertAlmostEqual(step_energy.energy_wh, 15.0)
+        self.assertEqual(step_energy.duration, 20.0)
+        self.assertEqual(step_energy.samples, 3)
+        self.assertEqual(step_energy.peak_w, 3600)
+
+    def test_interval_belongs_to_last_step(self):
+        self.energy.add_sample(0.0, 100, 1, 1)
+        self.energy.add_sample(10.0, 100, 1, 1)
+        # the interval up to the first sample of step 2 was spent in step 1
+        self.energy.add_sample(20.0, 2000, 2, 1, True)
+        self.energy.add_sample(30.0, 2000, 2, 1, True)
+        self.assertAlmostEqual(self.energy.steps[1].energy_ws, 1000 + 10500)
+        self.assertEqual(self.energy.steps[1].duration, 20.0)
+        self.assertAlmostEqual(self.energy.steps[2].energy_ws, 20000)
+        self.assertEqual(self.energy.steps[2].duration, 10.0)
+        self.assertTrue(self.energy.steps[2].thermo_stop)
+
+    def test_gap_is_not_integrated(self):
+        self.energy.add_sample(0.0, 1000, 1, 1)
+        self.energy.add_sample(100.0, 1000, 1, 1)
+        self.energy.add_sample(100.0, 1000, 1, 1)
+        self.assertEqual(self.energy.steps[1].energy_ws, 0.0)
+        self.assertEqual(self.energy.unmeasured_duration, 100.0)
+
+    def test_summaries(self):
+        for time_now, step, sequence in ((0.0, 1, 1), (18.0, 2, 1), (36.0, 15, 3), (54.0, 15, 3)):
+            self.energy.add_sample(time_now, 200, step, sequence)
+        self.assertAlmostEqual(self.energy.total_wh(), 3.0)
+        sequence_wh = self.energy.sequence_wh()
+        self.assertAlmostEqual(sequence_wh[1], 2.0)
+        self.assertAlmostEqual(sequence_wh[3], 1.0)
+        self.assertEqual(self.energy.to_csv(4),
+                         '4;1;1;0;18;1;1.000;200\n4;2;1;0;18;1;1.000;200\n4;15;3;0;18;2;1.000;200\n')
+
+    @unittest.skipIf(numpy is None, 'needs numpy')
+    def test_load_energy_records(self):
+        self.energy.add_sample(0.0, 200, 1, 1)
+        self.energy.add_sample(18.0, 200, 1, 1)
+        directory = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(directory, '1600000000_EnergyRecord.csv'), 'w') as fd:
+                fd.write(self.energy.to_csv(4))
+            records = load_energy_records(directory)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(records.tolist(), [[1600000000, 4, 1, 1, 0, 18, 2, 1.0, 200]])
+
+
+if __name__ == '__main__':
+    unittest.main()
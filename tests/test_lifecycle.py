@@ -0,0 +1,135 @@
+"""
+Lifecycle: the compiled transition table, the event loop with its polls and the report modes of
+the states.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lifecycle import Lifecycle  # noqa: E402
+from operational_states import (EVENT_BACKEND_RELEASED, EVENT_MACHINE_STOPPED, EVENT_PROGRAM_FINISHED,  # noqa: E402
+                                EVENT_PROGRAM_SELECTED, EVENT_SELECTOR_CHANGED, EVENT_ZERO_POSITION_REACHED,
+                                TRANSITIONS, AfterrunningState, ProgramSelectionState, RunningState, ShutdownState,
+                                WaitForBackendState, ZeroPositionState)
+from process_data import REPORT_AFTERRUNNING, REPORT_IS_ALIVE, REPORT_PROCESS_DATA  # noqa: E402
+from replay import ReplayMachine  # noqa: E402
+from state import State  # noqa: E402
+from test_replay import template_config  # noqa: E402
+
+
+class FakeProgram:
+    def __init__(self):
+        self.swconfig = template_config()
+
+
+class DataProvider:
+    def __init__(self):
+        self.report_modes = []
+
+    def set_report_mode(self, report_mode, expected=None):
+        self.report_modes.append(report_mode)
+
+
+class IdleState(State):
+    report_mode = REPORT_IS_ALIVE
+
+    def on_enter(self):
+        self.lifecycle.calls.append('enter idle')
+        self.lifecycle.post('start')
+
+    def on_exit(self):
+        self.lifecycle.calls.append('exit idle')
+
+
+class PolledState(State):
+    poll_interval = 0.001
+    report_mode = REPORT_PROCESS_DATA
+
+    def __init__(self, lifecycle):
+        super().__init__(lifecycle)
+        self.polls = 0
+
+    def on_poll(self):
+        self.polls += 1
+        if self.polls == 3:
+            self.lifecycle.post('done')
+
+    def on_event(self, event):
+        self.lifecycle.calls.append('event {}'.format(event))
+        return super().on_event(event)
+
+
+class QuietState(State):
+    """keeps the report mode of the previous state"""
+
+    def on_enter(self):
+        self.lifecycle.post('unknown')
+        self.lifecycle.post('stop')
+
+
+class FinalState(State):
+    report_mode = REPORT_IS_ALIVE
+
+    def on_enter(self):
+        self.lifecycle.stop()
+
+
+class LifecycleTest(unittest.TestCase):
+    def create(self, transitions=None, initial_state=ProgramSelectionState) -> Lifecycle:
+        lifecycle = Lifecycle(ReplayMachine(), FakeProgram(), DataProvider(), transitions=transitions,
+                              initial_state=initial_state)
+        lifecycle.calls = []
+        return lifecycle
+
+    def test_compiled_transition_table(self):
+        lifecycle = self.create()
+        self.assertEqual(set(lifecycle.states), set(TRANSITIONS))
+        for state_class, state in lifecycle.states.items():
+            self.assertIsInstance(state, state_class)
+            self.assertEqual({event: type(next_state) for event, next_state in state.transitions.items()},
+                             TRANSITIONS[state_class])
+        self.assertIs(lifecycle.initial_state, lifecycle.states[ProgramSelectionState])
+
+    def test_program_path(self):
+        lifecycle = self.create()
+        state = lifecycle.initial_state
+        path = [type(state)]
+        for event in (EVENT_PROGRAM_SELECTED, EVENT_BACKEND_RELEASED, EVENT_PROGRAM_FINISHED,
+                      EVENT_ZERO_POSITION_REACHED, EVENT_MACHINE_STOPPED):
+            # unknown events keep the state
+            self.assertIs(state.on_event('unknown'), state)
+            state = state.on_event(event)
+            path.append(type(state))
+        self.assertEqual(path, [ProgramSelectionState, WaitForBackendState, RunningState, AfterrunningState,
+                                ZeroPositionState, ShutdownState])
+        self.assertEqual(state.transitions, {})
+        self.assertIs(lifecycle.states[ProgramSelectionState].on_event(EVENT_SELECTOR_CHANGED),
+                      lifecycle.states[ProgramSelectionState])
+
+    def test_report_modes(self):
+        self.assertEqual([state_class.report_mode for state_class in (
+            ProgramSelectionState, WaitForBackendState, RunningState, AfterrunningState, ZeroPositionState,
+            ShutdownState)], [REPORT_IS_ALIVE, REPORT_IS_ALIVE, REPORT_PROCESS_DATA, REPORT_AFTERRUNNING,
+                              REPORT_AFTERRUNNING, REPORT_IS_ALIVE])
+
+    def test_run(self):
+        lifecycle = self.create({
+            IdleState: {'start': PolledState},
+            PolledState: {'done': QuietState},
+            QuietState: {'stop': FinalState},
+            FinalState: {}
+        }, IdleState)
+        lifecycle.run()
+        self.assertIsInstance(lifecycle.state, FinalState)
+        self.assertEqual(lifecycle.calls, ['enter idle', 'exit idle', 'event done'])
+        self.assertEqual(lifecycle.states[PolledState].polls, 3)
+        # the report mode is only set if it changes, a state without report mode keeps the current one
+        self.assertEqual(lifecycle.data_provider.report_modes,
+                         [REPORT_IS_ALIVE, REPORT_PROCESS_DATA, REPORT_IS_ALIVE])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Logging through the queue listener: lazy formatting on the listener thread, the JSON line format,
+the buffered file handler and the size based rotation.
+"""
+
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger  # noqa: E402
+
+
+def logging_config(**settings):
+    values = dict(log_level='DEBUG', log_max_bytes=1048576, log_backup_count=2, log_buffer_records=1000,
+                  log_json_format=False, log_console=False)
+    values.update(settings)
+    return types.SimpleNamespace(**values)
+
+
+class FormatThread:
+    """log argument which records the thread it is formatted on"""
+
+    def __init__(self):
+        self.thread_names = []
+
+    def __str__(self):
+        self.thread_names.append(threading.current_thread().name)
+        return 'value'
+
+
+class QueueListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'runlog.log')
+        self.logger = logging.getLogger('DishwasherOS.Test')
+
+    def tearDown(self):
+        logger.stop_logger()
+        for handler in list(logging.getLogger('DishwasherOS').handlers):
+            logging.getLogger('DishwasherOS').removeHandler(handler)
+        logger._file_buffer = None
+        shutil.rmtree(self.directory)
+
+    def read_lines(self, file_name=None):
+        with open(file_name or self.file_name, 'r') as fd:
+            return fd.read().splitlines()
+
+    def test_formatted_on_listener_thread(self):
+        logger.setup_logger(logging_config(log_level='INFO'), self.file_name)
+        argument = FormatThread()
+        disabled_argument = FormatThread()
+        # warnings pass the file buffer at once, they are written by the listener thread
+        self.logger.warning('step %s', argument)
+        self.logger.debug('disabled %s', disabled_argument)
+        logger.stop_logger()
+        self.assertTrue(set(argument.thread_names) - {threading.current_thread().name})
+        self.assertEqual(disabled_argument.thread_names, [])
+        lines = self.read_lines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith('|WARNING|step value'), lines[0])
+
+    def test_json_format(self):
+        logger.setup_logger(logging_config(log_json_format=True), self.file_name)
+        self.logger.warning('temperature %.1f', 55.25)
+        logger.stop_logger()
+        entry = json.loads(self.read_lines()[0])
+        self.assertEqual(entry['level'], 'WARNING')
+        self.assertEqual(entry['logger'], 'DishwasherOS.Test')
+        self.assertEqual(entry['message'], 'temperature 55.2')
+
+    def test_buffered_until_flush(self):
+        logger.setup_logger(logging_config(), self.file_name)
+        self.logger.debug('buffered')
+        logger._listener.stop()
+        logger._listener = None
+        self.assertEqual(self.read_lines(), [])
+        logger.flush_file_log()
+        self.assertEqual(len(self.read_lines()), 1)
+
+    def test_rotation(self):
+        logger.setup_logger(logging_config(log_max_bytes=200, log_buffer_records=1), self.file_name)
+        for i in range(20):
+            self.logger.info('record %s', i)
+        logger.stop_logger()
+        self.assertTrue(os.path.exists(self.file_name + '.1'))
+        self.assertTrue(os.path.exists(self.file_name + '.2'))
+        self.assertFalse(os.path.exists(self.file_name + '.3'))
+        self.assertTrue(self.read_lines()[-1].endswith('record 19'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+MqttSink against the in-process broker stand-in: Last Will, retained latest payloads, in-flight
+window saturation and the reconnect.
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emulator.mqtt import FakeMqttClient  # noqa: E402
+from mqtt_sink import STATUS_OFFLINE, STATUS_ONLINE, MqttSink  # noqa: E402
+
+TOPIC = 'dishwasheros/aabbcc'
+
+
+def wait_until(predicate, timeout=2.0):
+    """wait for the sender thread of the sink"""
+    time_end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > time_end:
+            raise AssertionError('timed out')
+        time.sleep(0.005)
+
+
+class MqttSinkTest(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeMqttClient()
+        self.sink = MqttSink(self.client, 'dishwasheros', 'aa:bb:cc', qos=1, inflight_window=2)
+
+    def tearDown(self):
+        self.client.acknowledge()
+        self.sink.stop(timeout=0.5)
+
+    def start(self):
+        self.sink.start('localhost')
+        wait_until(lambda: self.client.retained.get(TOPIC + '/status') == STATUS_ONLINE)
+
+    def settle(self):
+        """let the sender thread publish what the window allows"""
+        self.sink.event_wakeup.set()
+        time.sleep(0.05)
+
+    def test_last_will(self):
+        self.assertEqual(self.client.will, (TOPIC + '/status', STATUS_OFFLINE, 1, True))
+        self.start()
+        self.client.drop_connection()
+        self.assertEqual(self.client.retained[TOPIC + '/status'], STATUS_OFFLINE)
+
+    def test_window_saturation(self):
+        self.start()
+        # the online status is the first message in flight
+        self.sink.publish_is_alive(b'{"alive":1}')
+        for i in range(100):
+            self.sink.publish_state('{{"i":{}}}'.format(i).encode('utf-8'))
+        self.settle()
+        self.assertEqual(len(self.sink.inflight), 2)
+        self.assertEqual(self.client.published_payloads(TOPIC + '/state'), [])
+        self.assertEqual(self.sink.pending, {TOPIC + '/state': b'{"i":99}'})
+
+        # every acknowledgement frees one slot, replaced payloads are never published
+        self.client.acknowledge(1)
+        wait_until(lambda: self.client.published_payloads(TOPIC + '/state'))
+        self.assertEqual(self.client.published_payloads(TOPIC + '/state'), [b'{"i":99}'])
+        self.assertEqual(self.client.retained[TOPIC + '/is_alive'], b'{"alive":1}')
+        self.assertEqual(len(self.sink.inflight), 2)
+        self.assertEqual(self.sink.published, 3)
+
+    def test_reconnect(self):
+        self.start()
+        self.sink.publish_is_alive(b'{"alive":1}')
+        self.settle()
+        self.assertEqual(len(self.sink.inflight), 2)
+
+        # the acknowledgements of the lost connection never arrive
+        self.client.drop_connection()
+        self.sink.publish_state(b'{"i":1}')
+        self.sink.publish_state(b'{"i":2}')
+        self.settle()
+        self.assertEqual(self.client.published_payloads(TOPIC + '/state'), [])
+
+        # the None marker of the reconnect clears the in-flight messages of the lost connection
+        self.client.reconnect()
+        wait_until(lambda: self.client.published_payloads(TOPIC + '/state'))
+        self.assertEqual(self.client.retained[TOPIC + '/status'], STATUS_ONLINE)
+        self.assertEqual(self.client.published_payloads(TOPIC + '/state'), [b'{"i":2}'])
+        self.assertNotIn(None, self.sink.acknowledged)
+
+    def test_stop(self):
+        self.start()
+        self.client.acknowledge()
+        self.sink.stop(timeout=0.5)
+        self.assertEqual(self.client.retained[TOPIC + '/status'], STATUS_OFFLINE)
+        self.assertFalse(self.client.is_connected)
+
+
+if __name__ == '__main__':
+    unittest.main()
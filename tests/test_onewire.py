@@ -0,0 +1,89 @@
+"""
+OneWireBus on a w1 sysfs tree in a temporary directory: discovery, the bulk read and the w1_slave
+parser of the single reads.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from onewire import OneWireBus  # noqa: E402
+
+MAIN = '28-0000075a3b2c'
+AIR = '28-0000075a9f01'
+
+
+def write(path, content):
+    with open(path, 'w') as fd:
+        fd.write(content)
+
+
+def w1_slave(millidegrees, crc='YES'):
+    return ('72 01 4b 46 7f ff 0e 10 57 : crc=57 {}\n'
+            '72 01 4b 46 7f ff 0e 10 57 t={}\n').format(crc, millidegrees)
+
+
+class OneWireBusTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for address, millidegrees in ((MAIN, 55312), (AIR, 21687)):
+            os.makedirs(os.path.join(self.directory, address))
+            write(os.path.join(self.directory, address, 'resolution'), '12')
+            write(os.path.join(self.directory, address, 'temperature'), str(millidegrees))
+            write(os.path.join(self.directory, address, 'w1_slave'), w1_slave(millidegrees - 1000))
+        # neither a thermometer nor a sensor
+        os.makedirs(os.path.join(self.directory, '01-000000000001'))
+        os.makedirs(os.path.join(self.directory, 'w1_bus_master1'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create(self, bulk_read=True) -> OneWireBus:
+        if bulk_read:
+            write(os.path.join(self.directory, 'w1_bus_master1', 'therm_bulk_read'), '0')
+        return OneWireBus({'main': MAIN}, {'main': 9, AIR: 9}, devices_path=self.directory)
+
+    def test_discover(self):
+        bus = self.create()
+        self.assertEqual([(sensor.name, sensor.address) for sensor in bus.sensors], [('main', MAIN), (AIR, AIR)])
+        self.assertEqual([sensor.resolution for sensor in bus.sensors], [9, 9])
+        with open(os.path.join(self.directory, MAIN, 'resolution')) as fd:
+            self.assertEqual(fd.read(), '9')
+        self.assertEqual(bus.conversion_time, 0.094)
+
+    def test_bulk_read(self):
+        bus = self.create()
+        self.assertEqual(bus.read_all(), {'main': 55.3, AIR: 21.7})
+        with open(bus.bulk_read_paths[0]) as fd:
+            self.assertEqual(fd.read(), 'trigger')
+        self.assertEqual(bus.get_temperature('main'), 55.3)
+        self.assertEqual(bus.get_temperature('unknown'), 0.0)
+
+    def test_single_read(self):
+        bus = self.create(bulk_read=False)
+        self.assertEqual(bus.bulk_read_paths, [])
+        self.assertEqual(bus.read_all(), {'main': 54.3, AIR: 20.7})
+
+    def test_crc_error_and_recovery(self):
+        bus = self.create(bulk_read=False)
+        write(os.path.join(self.directory, MAIN, 'w1_slave'), w1_slave(85000, crc='NO'))
+        write(os.path.join(self.directory, AIR, 'w1_slave'), '72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n')
+        self.assertEqual(bus.read_all(), {'main': None, AIR: None})
+        self.assertTrue(all(sensor.is_failing for sensor in bus.sensors))
+        self.assertEqual(bus.get_temperature('main'), 0.0)
+        write(os.path.join(self.directory, MAIN, 'w1_slave'), w1_slave(-1250))
+        self.assertEqual(bus.read_all()['main'], -1.2)
+        self.assertFalse(bus.sensors[0].is_failing)
+
+    def test_missing_sensor(self):
+        bus = self.create()
+        shutil.rmtree(os.path.join(self.directory, AIR))
+        self.assertEqual(bus.read_all(), {'main': 55.3, AIR: None})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+ProcessDataProvider: electricity meter requests behind their circuit breaker and the end of the
+afterrunning cycle on the timer thread.
+"""
+
+import logging
+import os
+import sys
+import types
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit_breaker import CircuitBreaker  # noqa: E402
+from process_data import REPORT_AFTERRUNNING, REPORT_IS_ALIVE, REPORT_PROCESS_DATA, ProcessDataProvider  # noqa: E402
+from process_sample import ProcessSample  # noqa: E402
+from program import ProgramSnapshot  # noqa: E402
+from replay import RecordedRow, ReplayMachine  # noqa: E402
+
+TIME_END = 1600003000
+AFTERRUNNING_CYCLE = 600
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def meter_provider(breaker):
+    """the attributes get_electricity_meter_metrics() uses, without the timer and the serial port"""
+    swconfig = types.SimpleNamespace(electricity_meter_ip='http://192.168.0.10/', electricity_meter_path='/rpc',
+                                     request_timeout=1)
+    return types.SimpleNamespace(breakers={'electricity_meter': breaker}, swconfig=swconfig,
+                                 module_logger=logging.getLogger('DishwasherOS.Test'),
+                                 electricity_meter_connected=True)
+
+
+def response(content, ok=True):
+    return types.SimpleNamespace(ok=ok, content=content)
+
+
+class ElectricityMeterBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker('electricity_meter', failure_threshold=1, backoff_initial=10.0, jitter=0.0,
+                                      clock=self.clock)
+        self.provider = meter_provider(self.breaker)
+
+    def get_metrics(self, content, ok=True) -> dict:
+        with mock.patch('process_data.requests.get', return_value=response(content, ok)):
+            return ProcessDataProvider.get_electricity_meter_metrics(self.provider)
+
+    def open_to_half_open(self):
+        self.assertEqual(self.get_metrics(b'', ok=False), {'aenergy': None, 'apower': None})
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock.now = 10.0
+
+    def test_malformed_ok_response_during_half_open_probe(self):
+        self.open_to_half_open()
+        for content in (b'not json', b'[]', b'{"apower": 12}', b'{"aenergy": {"total": 1.5}, "apower": "x"}',
+                        b'{"aenergy": {"total": 1.5}, "apower": [1]}'):
+            metrics = self.get_metrics(content)
+            self.assertEqual(metrics, {'aenergy': None, 'apower': None}, content)
+            # the probe reopened the breaker, it is not stuck in half_open
+            self.assertEqual(self.breaker.state, CircuitBreaker.OPEN, content)
+            self.clock.now = self.breaker.time_retry
+
+    def test_valid_response_during_half_open_probe(self):
+        self.open_to_half_open()
+        metrics = self.get_metrics(b'{"aenergy": {"total": 1.5}, "apower": 2000}')
+        self.assertEqual(metrics, {'aenergy': 1.5, 'apower': 2000})
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+
+def finished_snapshot(time_end=TIME_END) -> ProgramSnapshot:
+    return ProgramSnapshot(
+        selected_program=4, program_name='Universal', step_operational=56, step_sequence=7, sequence_name='',
+        time_step_operational_start=TIME_END, time_start=TIME_END - 3000, time_end=time_end,
+        estimated_runtime=3000, is_thermo_stop=False, target_temp=0, target_temp_sensor=None,
+        thermostop_starttemp=0.0, temp_growth_speed=0.043, step_runtime=0, runtime_after_step_sequence=0,
+        runtime_after_step_program=0)
+
+
+class AfterrunningReportModeTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.clock.now = TIME_END
+        machine = ReplayMachine()
+        machine.row = RecordedRow(1, 56, 50.0)
+        self.program = types.SimpleNamespace(snapshot=finished_snapshot(), clock=self.clock, machine=machine)
+        self.payloads = []
+        self.provider = types.SimpleNamespace(
+            program=self.program, swconfig=types.SimpleNamespace(program_afterrunning_cycle=AFTERRUNNING_CYCLE),
+            module_logger=logging.getLogger('DishwasherOS.Test'), report_mode=REPORT_AFTERRUNNING,
+            report_mode_lock=threading.Lock(), sampling_policy=None, mqtt_sink=None,
+            sample=ProcessSample(TIME_END, machine.device_identifier),
+            status_cache=types.SimpleNamespace(publish=lambda payload: None),
+            request_process_data=lambda: None,
+            get_electricity_meter_metrics=lambda: {'aenergy': None, 'apower': None},
+            get_program_aenergy=lambda aenergy: 0,
+            send_process_data_serial_projector=lambda sample: None,
+            send_process_data_backend=self.payloads.append,
+            send_is_alive_backend=lambda is_due: None)
+        self.provider.set_report_mode = lambda report_mode, expected=None: ProcessDataProvider.set_report_mode(
+            self.provider, report_mode, expected)
+
+    def collect(self):
+        ProcessDataProvider._collect_process_data(self.provider)
+
+    def test_report_until_cycle_expired(self):
+        self.clock.now = TIME_END + AFTERRUNNING_CYCLE
+        self.collect()
+        self.assertEqual(len(self.payloads), 1)
+        self.assertEqual(self.provider.sample.program_time_left_step, 0)
+        self.clock.now += 1
+        self.collect()
+        self.assertEqual(self.provider.report_mode, REPORT_IS_ALIVE)
+        self.assertEqual(len(self.payloads), 1)
+
+    def test_missing_time_end(self):
+        # e.g. a snapshot taken before the program end was recorded
+        self.program.snapshot = finished_snapshot(time_end=None)
+        self.clock.now = TIME_END + 10 * AFTERRUNNING_CYCLE
+        self.collect()
+        self.assertEqual(self.provider.report_mode, REPORT_AFTERRUNNING)
+        self.assertEqual(len(self.payloads), 1)
+
+    def test_expiry_keeps_newer_mode_of_lifecycle(self):
+        # the timer thread read afterrunning, the lifecycle switched the mode in the meantime
+        ProcessDataProvider.set_report_mode(self.provider, REPORT_PROCESS_DATA)
+        ProcessDataProvider.set_report_mode(self.provider, REPORT_IS_ALIVE, expected=REPORT_AFTERRUNNING)
+        self.assertEqual(self.provider.report_mode, REPORT_PROCESS_DATA)
+        ProcessDataProvider.set_report_mode(self.provider, REPORT_AFTERRUNNING)
+        ProcessDataProvider.set_report_mode(self.provider, REPORT_IS_ALIVE, expected=REPORT_AFTERRUNNING)
+        self.assertEqual(self.provider.report_mode, REPORT_IS_ALIVE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+The compiled tables of programs/miele_g470.yaml against the tables which were hardcoded in
+program.py before the program definitions (reference functions below, copied from that version).
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from program_definition import ProgramDefinition  # noqa: E402
+
+PROGRAMS = range(1, 13)
+STEPS = range(0, 61)
+TARGET_TEMPS_SENSOR = {66: 56, 56: 47, 45: 35}
+TEMP_GROWTH_SPEED = 0.043
+
+OPERATIONAL_TIME = {
+    1: 0.5, 2: 0.5, 3: 0.5, 4: 1, 5: 0.5, 6: 4, 7: 0.5, 8: 0.5, 9: 0.5, 10: 1, 11: 1, 12: 4, 13: 4,
+    14: 0.5, 15: 0.5, 16: 1, 17: 1, 18: 0.5, 19: 0.5, 20: 4, 21: 4, 22: 1, 23: 1, 24: 0.5, 25: 0.5,
+    26: 0.5, 27: 0.5, 28: 1, 29: 0.5, 30: 0.5, 31: 0.5, 32: 0.5, 33: 1, 34: 0.5, 35: 0.5, 36: 1, 37: 1,
+    38: 0.5, 39: 0.5, 40: 0.5, 41: 0.5, 42: 0.5, 43: 0.5, 44: 0.5, 45: 0.5, 46: 0.5, 47: 0.5, 48: 0.5,
+    49: 0.5, 50: 1, 51: 4, 52: 0.5, 53: 4, 54: 0.5, 55: 0.5, 56: 1, 57: 1, 58: 4, 59: 4}
+LAST_SEQUENCE_STEP = {1: 8, 2: 14, 3: 24, 4: 34, 5: 45, 6: 56, 7: 60}
+SEQUENCE_STEPLENGTH = {1: 8, 2: 6, 3: 10, 4: 10, 5: 11, 6: 11, 7: 4}
+
+
+def reference_target_temp(program, step):
+    if 1 <= step <= 8:
+        if program == 3:
+            return 66
+    if 15 <= step <= 24:
+        if program in [3, 4, 6, 8]:
+            return 66
+        elif program in [5, 7, 9]:
+            return 56
+        elif program in [10, 11]:
+            return 45
+    if 35 <= step < 39:
+        if 3 <= program <= 11:
+            return 45
+    if 39 <= step <= 45:
+        if program in [3, 4, 5, 6, 7, 8]:
+            return 66
+        elif program in [9, 10, 11]:
+            return 56
+    return 0
+
+
+def reference_is_thermo_stop(step):
+    return step in [7, 19, 38, 40]
+
+
+def reference_next_step(program, step):
+    new_step = 0
+    if program in [4, 5]:
+        if step == 6:
+            new_step = 8
+    if program in [6, 7, 11, 12]:
+        if 2 <= step <= 8:
+            new_step = 9
+    if program in [8, 9, 10]:
+        if 2 <= step <= 14:
+            new_step = 15
+    if program == 10:
+        if step == 19:
+            new_step = 24
+        if step == 28:
+            new_step = 34
+        if step == 40:
+            new_step = 44
+        if step == 47:
+            new_step = 56
+    if program == 12:
+        if 14 <= step <= 55:
+            new_step = 56
+        if 56 <= step <= 59:
+            new_step = 60
+    return step + 1 if new_step == 0 else new_step
+
+
+def reference_sync_target(step):
+    for first, last, target in ((4, 6, 3), (10, 13, 9), (16, 19, 15), (20, 23, 24), (26, 29, 25),
+                                (30, 33, 34), (36, 40, 35), (41, 43, 44), (46, 51, 45), (52, 55, 56)):
+        if first <= step <= last:
+            return target
+    return 0
+
+
+def reference_runtime_for_steps(program, step_start, step_end):
+    """raises TypeError for a thermo-stop without target temperature"""
+    i = step_start
+    time_left = 0
+    while i < step_end:
+        if reference_is_thermo_stop(i):
+            temp_start = 25 if i == 38 else 35 if i == 40 else 17
+            temp_target_sensor = TARGET_TEMPS_SENSOR.get(reference_target_temp(program, i))
+            time_left += round((temp_target_sensor - temp_start) / TEMP_GROWTH_SPEED)
+        else:
+            time_left += OPERATIONAL_TIME.get(i, 0) * 60
+        i = reference_next_step(program, i)
+    return time_left
+
+
+class _Config:
+    temp_growth_speed = TEMP_GROWTH_SPEED
+
+    @staticmethod
+    def get_program_target_temps(program_target):
+        return TARGET_TEMPS_SENSOR.get(program_target)
+
+
+class ProgramDefinitionEquivalenceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.definition = ProgramDefinition.load(swconfig=_Config())
+
+    def test_step_tables(self):
+        for step in STEPS:
+            self.assertEqual(self.definition.operational_time[step], OPERATIONAL_TIME.get(step, 0), step)
+            self.assertEqual(self.definition.thermo_stop[step], reference_is_thermo_stop(step), step)
+            self.assertEqual(self.definition.sync_target[step], reference_sync_target(step), step)
+
+    def test_sequence_tables(self):
+        for sequence in range(0, 9):
+            self.assertEqual(self.definition.last_sequence_step.get(sequence, 0),
+                             LAST_SEQUENCE_STEP.get(sequence, 0), sequence)
+            self.assertEqual(self.definition.sequence_steplength.get(sequence, 0),
+                             SEQUENCE_STEPLENGTH.get(sequence, 0), sequence)
+        self.assertEqual(self.definition.final_step, 56)
+
+    def test_program_tables(self):
+        for program in PROGRAMS:
+            for step in STEPS:
+                self.assertEqual(self.definition.target_temp[program][step],
+                                 reference_target_temp(program, step), (program, step))
+                self.assertEqual(self.definition.next_step[program][step],
+                                 reference_next_step(program, step), (program, step))
+
+    def test_runtime_to_end(self):
+        for program in PROGRAMS:
+            step_runtime = self.definition.step_runtime[program]
+            for step in range(1, self.definition.final_step + 1):
+                try:
+                    expected = reference_runtime_for_steps(program, step, self.definition.final_step + 1)
+                except TypeError:
+                    # the hardcoded code failed on a thermo-stop without target temperature,
+                    # the compiled tables estimate such a step with 0 seconds
+                    i = step
+                    while i <= self.definition.final_step:
+                        if reference_is_thermo_stop(i) and reference_target_temp(program, i) == 0:
+                            self.assertEqual(step_runtime[i], 0, (program, i))
+                        i = reference_next_step(program, i)
+                    continue
+                self.assertEqual(self.definition.runtime_to_end[program][step], expected, (program, step))
+
+
+if __name__ == '__main__':
+    unittest.main()
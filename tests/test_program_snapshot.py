@@ -0,0 +1,84 @@
+"""
+ProgramSnapshot: one immutable view of the program state per change, with the time left values
+derived from it.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from program import WashingProgram  # noqa: E402
+from replay import RecordedRow, ReplayMachine, VirtualClock  # noqa: E402
+from test_replay import template_config  # noqa: E402
+
+TIME_START = 1600000000
+PROGRAM = 4
+
+
+class ProgramSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.machine = ReplayMachine()
+        self.machine.row = RecordedRow(0, 1, 20.0)
+        self.clock = VirtualClock(TIME_START)
+        self.snapshots = []
+        self.program = WashingProgram(self.machine, template_config(), self.clock)
+        self.program.on_snapshot = self.snapshots.append
+        self.program.select_program(PROGRAM)
+        self.program.start_program()
+
+    def test_published_on_every_change(self):
+        snapshot = self.program.snapshot
+        self.assertEqual(self.snapshots[-1], snapshot)
+        self.assertEqual(snapshot.time_start, TIME_START)
+        self.assertTrue(snapshot.is_running)
+        self.clock.now += 30
+        self.program.process_step_transition(True)
+        self.assertIsNot(self.program.snapshot, snapshot)
+        self.assertIs(self.snapshots[-1], self.program.snapshot)
+        # the old snapshot keeps the state of its step
+        self.assertEqual(snapshot.step_operational, 1)
+        self.assertEqual(self.program.snapshot.step_operational, 2)
+        with self.assertRaises(AttributeError):
+            snapshot.step_operational = 3
+
+    def test_time_left(self):
+        snapshot = self.program.snapshot
+        # the estimate of the selection has no time left in the current step, the program was not started
+        self.assertEqual(self.program.estimated_runtime, self.program.definition.runtime_to_end[PROGRAM][2])
+        self.assertEqual(snapshot.runtime_after_step_program, self.program.estimated_runtime)
+        self.assertEqual(snapshot.step_runtime, 30)
+        self.assertEqual(snapshot.get_time_left_operationalstep(TIME_START + 10), 20)
+        self.assertEqual(snapshot.get_time_left_sequence_step(TIME_START + 10),
+                         20 + snapshot.runtime_after_step_sequence)
+        self.assertEqual(snapshot.get_time_left_program(TIME_START + 10), 20 + self.program.estimated_runtime)
+        self.assertEqual(snapshot.get_current_runtime(TIME_START + 10), 10)
+        self.assertEqual(snapshot.get_progress_percent(TIME_START), 0)
+
+    def test_thermo_stop(self):
+        while not self.program.is_thermo_stop():
+            self.clock.now += 10
+            self.program.process_step_transition(True)
+            self.program.process_step_transition(False)
+        snapshot = self.program.snapshot
+        self.assertTrue(snapshot.is_thermo_stop)
+        self.assertEqual(snapshot.thermostop_starttemp, 20.0)
+        time_total = snapshot.get_time_left_operationalstep(self.clock.now, 20.0)
+        self.assertEqual(time_total, round((snapshot.target_temp_sensor - 20.0) / snapshot.temp_growth_speed))
+        # the time left of a thermo-stop follows the temperature, not the time
+        self.assertEqual(snapshot.get_time_left_operationalstep(self.clock.now + 100, 20.0), time_total)
+        self.assertLess(snapshot.get_time_left_operationalstep(self.clock.now, 30.0), time_total)
+
+    def test_finished(self):
+        self.clock.now += 3000
+        self.program.finish_program()
+        snapshot = self.program.snapshot
+        self.assertEqual(snapshot.time_end, TIME_START + 3000)
+        self.assertFalse(snapshot.is_running)
+        self.assertEqual(snapshot.get_current_runtime(TIME_START + 4000), 3000)
+        self.assertEqual(snapshot.get_progress_percent(TIME_START + 4000), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Replay of recorded runs: the telemetry tick of the replay encodes the recorded actuator inputs.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import yaml
+
+BASE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIRECTORY)
+
+from config import SoftwareConfig  # noqa: E402
+from process_sample import ProcessSample, SensorValues, encode_backend_json  # noqa: E402
+from program import WashingProgram  # noqa: E402
+from program_definition import ProgramDefinition  # noqa: E402
+from replay import RecordedRow, ReplayMachine, VirtualClock, _telemetry_tick, read_data_record  # noqa: E402
+
+TIME_START = 1600000000
+
+
+def template_config() -> SoftwareConfig:
+    """SoftwareConfig of settings_template.yaml, independent of the working directory"""
+    with open(os.path.join(BASE_DIRECTORY, 'settings_template.yaml'), 'r') as stream:
+        config = yaml.safe_load(stream)['dishwasher']
+    swconfig = SoftwareConfig.__new__(SoftwareConfig)
+    swconfig._config = config
+    swconfig._swconfig = config['software']
+    return swconfig
+
+
+class ReplayTelemetryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # time;runtime;termostop;step;temp;program;time_left;drain;circulation;inlet;outlet;heating;transition
+        rows = ['00:00:00;1;False;1;20.0;4;3000;0;0;1;0;0;0',
+                '00:00:01;2;False;1;20.5;4;2999;1;1;0;1;1;0',
+                '00:00:02;3;False;1;21.0;4;2998;0;1;0;0;1;0']
+        with open(os.path.join(self.directory, '{}_DataRecord.csv'.format(TIME_START)), 'w') as fd:
+            fd.write('\n'.join(rows) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sample_has_recorded_actuator_inputs(self):
+        run = read_data_record(os.path.join(self.directory, '{}_DataRecord.csv'.format(TIME_START)))
+        swconfig = template_config()
+        machine = ReplayMachine()
+        machine.row = run.rows[0]
+        clock = VirtualClock(run.time_start)
+        program = WashingProgram(machine, swconfig, clock, ProgramDefinition.load(swconfig=swconfig))
+        program.select_program(run.selected_program)
+        program.start_program()
+        sample = ProcessSample(run.time_start, machine.device_identifier)
+        for row in run.rows:
+            machine.row = row
+            clock.now = run.time_start + row.runtime
+            _telemetry_tick(program, sample, clock.now)
+            data = json.loads(encode_backend_json(sample))
+            self.assertEqual(data['machine_sensor_values'], row.sensor_values.as_dict(), row.runtime)
+
+    def test_legacy_row_reads_all_inputs_off(self):
+        machine = ReplayMachine()
+        machine.row = RecordedRow(1, 1, 20.0)
+        sensor_values = SensorValues()
+        sensor_values.heating = 1
+        self.assertIs(machine.read_actuator_sensor_values(sensor_values), sensor_values)
+        self.assertEqual(sensor_values.as_dict(), SensorValues().as_dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+SignatureIndex: the rows compiled from the sync rules of the program definition and from learned
+actuator signatures.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_sample import SensorValues  # noqa: E402
+from program_definition import ProgramDefinition  # noqa: E402
+from resync import ALL_ACTUATORS, SignatureIndex, actuator_mask  # noqa: E402
+from test_replay import template_config  # noqa: E402
+
+DRAIN = 1
+CIRCULATION = 2
+INLET = 4
+OUTLET = 8
+HEATING = 16
+
+# program 4 runs 5, 6, 8, 9 (step 7 is skipped)
+SIGNATURES = {4: {
+    5: {'masks': {CIRCULATION: 0.9, 0: 0.1}, 'temp': [20.0, 30.0], 'samples': 10},
+    6: {'masks': {INLET: 1.0}, 'samples': 10},
+    8: {'masks': {CIRCULATION | HEATING: 0.8, CIRCULATION: 0.2}, 'temp': [40.0, 60.0], 'samples': 10},
+    # too few samples, the step keeps the rules of the definition
+    9: {'masks': {DRAIN: 1.0}, 'samples': 3}
+}}
+
+
+class SignatureIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.definition = ProgramDefinition.load(swconfig=template_config())
+
+    def test_actuator_mask(self):
+        sensor_values = SensorValues()
+        self.assertEqual(actuator_mask(sensor_values), 0)
+        sensor_values.valve_outlet = 1
+        sensor_values.heating = 1
+        self.assertEqual(actuator_mask(sensor_values), OUTLET | HEATING)
+
+    def test_rules(self):
+        index = SignatureIndex(self.definition)
+        # the active outlet valve resynchronizes steps 4-6 to step 3
+        row = index.get_row(4, 5)
+        self.assertEqual(row.care_mask, OUTLET)
+        self.assertEqual(row.entries[OUTLET], (3, 1.0))
+        self.assertEqual(row.entries[OUTLET | CIRCULATION], (3, 1.0))
+        self.assertIsNone(row.entries[CIRCULATION])
+        self.assertIsNone(index.get_row(4, 1))
+        self.assertIsNone(index.get_row(4, 100))
+        self.assertIsNone(index.get_row(99, 5))
+        self.assertTrue(index.is_in_temperature_band(4, 5, 90.0))
+
+    def test_signatures(self):
+        index = SignatureIndex(self.definition, SIGNATURES, window=6)
+        row = index.get_row(4, 6)
+        self.assertEqual(row.care_mask, ALL_ACTUATORS)
+        # the masks of the step itself
+        self.assertIsNone(row.entries[INLET])
+        self.assertIsNone(row.entries[ALL_ACTUATORS])
+        # only step 8 shows circulation with heating
+        self.assertEqual(row.entries[CIRCULATION | HEATING], (8, 0.7))
+        # only step 5 shows all off, with a share below the dominant share
+        self.assertEqual(row.entries[0][0], 5)
+        self.assertAlmostEqual(row.entries[0][1], 0.7 * 0.1 / 0.25)
+        # circulation is seen in step 5 and step 8, the forward step wins but is not specific
+        self.assertEqual(row.entries[CIRCULATION][0], 8)
+        self.assertAlmostEqual(row.entries[CIRCULATION][1], 0.7 * 0.2 / 1.1 * 0.8)
+        # the rules of the definition remain for steps without signature
+        self.assertEqual(index.get_row(4, 4).care_mask, OUTLET)
+        self.assertIsNone(index.get_row(4, 9))
+        # other programs only have the rules
+        self.assertEqual(index.get_row(5, 6).care_mask, OUTLET)
+
+    def test_window(self):
+        index = SignatureIndex(self.definition, SIGNATURES, window=1)
+        # step 8 is outside the window of step 5
+        self.assertIsNone(index.get_row(4, 5).entries[CIRCULATION | HEATING])
+        self.assertEqual(index.get_row(4, 5).entries[INLET][0], 6)
+
+    def test_temperature_band(self):
+        index = SignatureIndex(self.definition, SIGNATURES)
+        self.assertTrue(index.is_in_temperature_band(4, 8, 35.0))
+        self.assertTrue(index.is_in_temperature_band(4, 8, 65.0))
+        self.assertFalse(index.is_in_temperature_band(4, 8, 66.0))
+        self.assertTrue(index.is_in_temperature_band(4, 6, 90.0))
+
+    def test_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(directory, 'signatures.yaml')
+            with open(file_path, 'w') as stream:
+                yaml.safe_dump({'programs': SIGNATURES}, stream)
+            index = SignatureIndex.load(self.definition, file_path)
+            expected = SignatureIndex(self.definition, SIGNATURES)
+            for step in (5, 6, 8):
+                self.assertEqual(index.get_row(4, step).entries, expected.get_row(4, step).entries, step)
+            # without file only the rules
+            index = SignatureIndex.load(self.definition, os.path.join(directory, 'missing.yaml'))
+            self.assertEqual(index.get_row(4, 6).care_mask, OUTLET)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+SampleRing: records in order, the wraparound of a slow reader, half written and corrupted slots and
+the header fields shared by the processes.
+"""
+
+import os
+import struct
+import sys
+import unittest
+from multiprocessing import resource_tracker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sample_ring import SampleRing  # noqa: E402
+
+RECORD = struct.Struct('<Qd')
+SLOT_COUNT = 4
+SLOT_HEADER_SIZE = 12
+
+
+def record(i) -> bytes:
+    return RECORD.pack(i, i / 10)
+
+
+class SampleRingTest(unittest.TestCase):
+    def setUp(self):
+        self.name = 'dishwasheros_test_{}'.format(os.getpid())
+        self.ring = SampleRing.create(self.name, RECORD.size, SLOT_COUNT)
+
+    def tearDown(self):
+        self.ring.close()
+        self.ring.unlink()
+
+    def read_all(self) -> list:
+        values = []
+        while True:
+            value = self.ring.read(RECORD)
+            if value is None:
+                return values
+            values.append(value[0])
+
+    def test_in_order(self):
+        self.assertIsNone(self.ring.read(RECORD))
+        for i in range(3):
+            self.ring.write(record(i))
+        self.assertEqual(self.ring.read(RECORD), (0, 0.0))
+        self.assertEqual(self.read_all(), [1, 2])
+        self.assertEqual(self.ring.write_count, 3)
+
+    def test_wraparound(self):
+        # a reader which keeps up never loses a record
+        for i in range(5 * SLOT_COUNT):
+            self.ring.write(record(i))
+            self.ring.write(record(i))
+            self.assertEqual(self.read_all(), [i, i])
+        self.assertEqual(self.ring.dropped, 0)
+
+    def test_slow_reader_skips(self):
+        for i in range(10):
+            self.ring.write(record(i))
+        # the oldest record which can not be overwritten by the next write
+        self.assertEqual(self.read_all(), [7, 8, 9])
+        self.assertEqual(self.ring.dropped, 7)
+        self.ring.write(record(10))
+        self.assertEqual(self.read_all(), [10])
+
+    def test_half_written_slot(self):
+        self.ring.write(record(0))
+        offset = 64 + self.ring.slot_size
+        self.ring.write(record(1))
+        # mark slot 1 as being written again
+        struct.pack_into('<Q', self.ring.buffer, offset, 3)
+        self.assertEqual(self.read_all(), [0])
+        self.assertEqual(self.ring.read_count, 1)
+        struct.pack_into('<Q', self.ring.buffer, offset, 4)
+        self.assertEqual(self.read_all(), [1])
+
+    def test_corrupted_payload(self):
+        self.ring.write(record(0))
+        self.ring.buffer[64 + SLOT_HEADER_SIZE] ^= 0xFF
+        self.assertIsNone(self.ring.read(RECORD))
+        self.assertEqual(self.ring.dropped, 0)
+
+    def test_header_fields(self):
+        self.assertEqual(self.ring.get_aenergy_init(), 0.0)
+        self.ring.set_aenergy_init(1234.5)
+        self.ring.set_aenergy(1240.25)
+        self.assertEqual(self.ring.get_aenergy_init(), 1234.5)
+        self.assertEqual(self.ring.get_aenergy(), 1240.25)
+        self.assertIsNone(self.ring.telemetry_heartbeat)
+        self.ring.beat_telemetry()
+        self.assertLess(self.ring.telemetry_heartbeat, 1.0)
+        self.ring.write(record(0))
+        self.assertLess(self.ring.control_heartbeat, 1.0)
+
+    def test_attach(self):
+        self.ring.write(record(0))
+        self.ring.set_aenergy_init(1234.5)
+        reader = SampleRing.attach(self.name)
+        try:
+            self.assertEqual((reader.payload_size, reader.slot_count), (RECORD.size, SLOT_COUNT))
+            self.assertEqual(reader.get_aenergy_init(), 1234.5)
+            # the reader starts with the next written record
+            self.assertIsNone(reader.read(RECORD))
+            self.ring.write(record(1))
+            self.assertEqual(reader.read(RECORD), (1, 0.1))
+        finally:
+            reader.close()
+            # attach() in the process of the writer dropped the registration of the writer
+            resource_tracker.register(self.ring.shm._name, 'shared_memory')
+
+    def test_create_replaces_stale_segment(self):
+        self.ring.write(record(0))
+        self.ring.close()
+        self.ring = SampleRing.create(self.name, RECORD.size, SLOT_COUNT)
+        self.assertEqual(self.ring.write_count, 0)
+        self.assertIsNone(self.ring.read(RECORD))
+
+
+if __name__ == '__main__':
+    unittest.main()
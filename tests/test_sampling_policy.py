@@ -0,0 +1,91 @@
+"""
+AdaptiveSamplingPolicy: which timer ticks are reported in the idle, running and afterrunning modes.
+"""
+
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_sample import SensorValues  # noqa: E402
+from sampling_policy import AdaptiveSamplingPolicy  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def snapshot(step=5, is_thermo_stop=False):
+    return types.SimpleNamespace(step_operational=step, is_thermo_stop=is_thermo_stop)
+
+
+class AdaptiveSamplingPolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.policy = AdaptiveSamplingPolicy(interval_min=1.0, interval_max=15.0, interval_idle=30.0,
+                                             interval_afterrunning=10.0, transition_hold=10.0, tick=1.0,
+                                             clock=self.clock)
+        self.sensor_values = SensorValues()
+
+    def reported_ticks(self, seconds, is_due) -> list:
+        """times of the reported ticks within the next seconds"""
+        reported = []
+        for i in range(seconds):
+            if is_due():
+                reported.append(self.clock.now)
+            self.clock.now += 1.0
+        return reported
+
+    def running(self, step=5, is_thermo_stop=False, time_left_step=None):
+        return lambda: self.policy.is_running_report_due(snapshot(step, is_thermo_stop), self.sensor_values,
+                                                         time_left_step)
+
+    def test_idle(self):
+        self.assertEqual(self.reported_ticks(61, self.policy.is_idle_report_due), [0.0, 30.0, 60.0])
+
+    def test_afterrunning(self):
+        self.assertEqual(self.reported_ticks(21, self.policy.is_afterrunning_report_due), [0.0, 10.0, 20.0])
+
+    def test_steady_step_backs_off(self):
+        # full resolution for the transition hold, then the interval doubles up to interval_max
+        self.assertEqual(self.reported_ticks(80, self.running()),
+                         [float(second) for second in range(10)] + [10.0, 12.0, 16.0, 24.0, 39.0, 54.0, 69.0])
+
+    def test_thermo_stop(self):
+        self.assertEqual(len(self.reported_ticks(40, self.running(is_thermo_stop=True))), 40)
+
+    def test_step_transition(self):
+        self.reported_ticks(40, self.running())
+        self.assertEqual(self.policy.interval, 15.0)
+        self.assertEqual(self.reported_ticks(3, self.running(step=6)), [40.0, 41.0, 42.0])
+        self.assertEqual(self.policy.interval, 1.0)
+
+    def test_actuator_change(self):
+        self.reported_ticks(40, self.running())
+        self.sensor_values.heating = 1
+        self.assertEqual(self.reported_ticks(2, self.running()), [40.0, 41.0])
+
+    def test_report_at_end_of_step(self):
+        self.assertEqual(self.reported_ticks(55, self.running())[-1], 54.0)
+        # the next report is placed at the predicted end of the step instead of after interval_max
+        self.clock.now = 69.0
+        self.assertTrue(self.policy.is_running_report_due(snapshot(), self.sensor_values, 3))
+        self.assertEqual(self.policy.time_report, 72.0)
+
+    def test_request_report(self):
+        self.assertTrue(self.policy.is_idle_report_due())
+        self.assertFalse(self.policy.is_idle_report_due())
+        self.policy.request_report()
+        self.assertTrue(self.policy.is_idle_report_due())
+        # idle reporting resets the running interval
+        self.assertEqual(self.policy.interval, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+Program selection: the probe of the selector inputs, edges caused by the probe relays and the
+debounce of user edges in the ProgramSelectionState.
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lifecycle import Lifecycle  # noqa: E402
+from operational_states import EVENT_PROGRAM_SELECTED, EVENT_SELECTOR_CHANGED, ProgramSelectionState  # noqa: E402
+from process_sample import SelectorValues  # noqa: E402
+from program import WashingProgram  # noqa: E402
+from replay import ReplayMachine  # noqa: E402
+from test_replay import template_config  # noqa: E402
+
+DEBOUNCE_TIME = 0.2
+FALLBACK_INTERVAL = 30
+
+
+class SelectorMachine(ReplayMachine):
+    """the selector pins read high while the probe relays are on"""
+
+    def __init__(self):
+        super().__init__()
+        self.selected_pins = ()
+        self.relays = False
+        self.edge_callback = None
+        self.user_edges = []
+
+    def set_all_relays(self, set_state: bool):
+        self.relays = set_state
+        # the relays toggle the selector inputs themselves
+        if self.edge_callback is not None:
+            self.edge_callback(17)
+
+    def read_program_sensor_values(self, selector_values: SelectorValues = None) -> SelectorValues:
+        selector_values = selector_values if selector_values is not None else SelectorValues()
+        for name in SelectorValues.__slots__:
+            setattr(selector_values, name, int(self.relays and name in self.selected_pins))
+        return selector_values
+
+    def enable_selection_events(self, callback):
+        self.edge_callback = callback
+
+    def disable_selection_events(self):
+        self.edge_callback = None
+
+
+class DataProvider:
+    def set_report_mode(self, report_mode, expected=None):
+        pass
+
+
+def selection_program(machine) -> WashingProgram:
+    swconfig = template_config()
+    swconfig._swconfig.update(selectionProbeSettleTime=0, selectionDebounceTime=DEBOUNCE_TIME,
+                              selectionFallbackInterval=FALLBACK_INTERVAL)
+    return WashingProgram(machine, swconfig)
+
+
+class SelectionProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.machine = SelectorMachine()
+        self.program = selection_program(self.machine)
+
+    def test_selection_table(self):
+        for pins, program in ((('pinP6', 'pinP7'), 5), (('pinP6',), 7), (('pinP4', 'pinP9'), 10), (('pinP4',), 11),
+                              (('pinP11', 'pinP12'), 2), ((), 3)):
+            self.machine.selected_pins = pins
+            self.program.find_selected_program()
+            self.assertEqual(self.program.selected_program, program, pins)
+            self.assertFalse(self.machine.relays)
+
+    def test_probe_edges_are_ignored(self):
+        edges = []
+        self.machine.edge_callback = lambda channel: edges.append(self.program.is_user_selection_edge())
+        self.program.find_selected_program()
+        # the edges of both relay switches, the second one right after the probe within the debounce time
+        self.assertEqual(edges, [False, False])
+        self.program.time_selection_probe_end = time.monotonic() - DEBOUNCE_TIME - 0.01
+        self.assertTrue(self.program.is_user_selection_edge())
+
+
+class ProgramSelectionStateTest(unittest.TestCase):
+    def setUp(self):
+        self.machine = SelectorMachine()
+        self.program = selection_program(self.machine)
+        self.lifecycle = Lifecycle(self.machine, self.program, DataProvider())
+        self.state = self.lifecycle.states[ProgramSelectionState]
+
+    def events(self) -> list:
+        events = []
+        while not self.lifecycle.events.empty():
+            events.append(self.lifecycle.events.get_nowait())
+        return events
+
+    def test_enter_probes_and_waits(self):
+        self.machine.selected_pins = ('pinP11', 'pinP12')
+        self.state.on_enter()
+        self.assertEqual(self.program.selected_program, 2)
+        self.assertEqual(self.events(), [])
+        self.assertEqual(self.state.poll_timeout(), FALLBACK_INTERVAL)
+
+    def test_user_edge_is_debounced(self):
+        self.machine.selected_pins = ('pinP11', 'pinP12')
+        self.state.on_enter()
+        self.program.time_selection_probe_end = time.monotonic() - DEBOUNCE_TIME - 0.01
+        self.machine.edge_callback(17)
+        event = self.events()
+        self.assertEqual(event, [EVENT_SELECTOR_CHANGED])
+        # every edge restarts the debounce time
+        self.assertIs(self.state.on_event(event[0]), self.state)
+        self.assertTrue(0 < self.state.poll_timeout() <= DEBOUNCE_TIME)
+
+        self.machine.selected_pins = ('pinP7',)
+        self.state.on_poll()
+        self.assertEqual(self.program.selected_program, 4)
+        self.assertEqual(self.events(), [EVENT_PROGRAM_SELECTED])
+        self.assertEqual(self.state.poll_timeout(), FALLBACK_INTERVAL)
+
+    def test_probe_edges_post_no_event(self):
+        self.machine.selected_pins = ('pinP11', 'pinP12')
+        self.state.on_enter()
+        self.state.on_poll()
+        self.assertEqual(self.events(), [])
+        self.state.on_exit()
+        self.assertIsNone(self.machine.edge_callback)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+StorageManager: appends are staged in RAM, committed to `<name>.part` in whole blocks or on a forced
+sync, and a completed file is published atomically under its final name.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import StagedFile, StorageManager, atomic_append, atomic_write  # noqa: E402
+
+BLOCK_SIZE = 4096
+
+
+def wait_until(predicate, timeout=2.0):
+    """wait for the sync thread of the storage manager"""
+    time_end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > time_end:
+            raise AssertionError('timed out')
+        time.sleep(0.005)
+
+
+def read(path) -> bytes:
+    with open(path, 'rb') as fd:
+        return fd.read()
+
+
+class StagedFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, '1600000000_DataRecord.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_staged_in_ram(self):
+        staged_file = StagedFile(self.path)
+        self.assertEqual(staged_file.append(b'a;b\n'), 4)
+        self.assertEqual(staged_file.append(b'c;d\n'), 8)
+        self.assertFalse(os.path.exists(staged_file.part_path))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_sync_whole_blocks(self):
+        staged_file = StagedFile(self.path)
+        staged_file.append(b'x' * (BLOCK_SIZE + 100))
+        staged_file.sync(force=False)
+        self.assertEqual(read(staged_file.part_path), b'x' * BLOCK_SIZE)
+        self.assertEqual(len(staged_file.buffer), 100)
+        staged_file.sync(force=False)
+        self.assertEqual(os.path.getsize(staged_file.part_path), BLOCK_SIZE)
+        staged_file.sync()
+        self.assertEqual(read(staged_file.part_path), b'x' * (BLOCK_SIZE + 100))
+        self.assertEqual(len(staged_file.buffer), 0)
+
+    def test_complete_renames(self):
+        staged_file = StagedFile(self.path)
+        staged_file.append(b'a;b\n')
+        staged_file.sync()
+        staged_file.append(b'c;d\n')
+        staged_file.complete()
+        self.assertTrue(staged_file.completed)
+        self.assertFalse(os.path.exists(staged_file.part_path))
+        self.assertEqual(read(self.path), b'a;b\nc;d\n')
+
+
+class StorageManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, '1600000000_DataRecord.csv')
+        # the sync thread never syncs by time within a test
+        self.storage = StorageManager(sync_interval=3600, sync_bytes=BLOCK_SIZE)
+
+    def tearDown(self):
+        self.storage.stop()
+        shutil.rmtree(self.directory)
+
+    def test_append_and_complete(self):
+        self.storage.append(self.path, 'a;b\n')
+        self.storage.append(self.path, b'c;d\n')
+        self.assertFalse(os.path.exists(self.path + '.part'))
+        self.storage.complete(self.path)
+        self.assertEqual(read(self.path), b'a;b\nc;d\n')
+        self.assertNotIn(self.path, self.storage.files)
+        # completing an unknown file is a no-op
+        self.storage.complete(self.path + '.unknown')
+
+    def test_sync_by_size(self):
+        self.storage.append(self.path, b'x' * (BLOCK_SIZE + 1))
+        # the sync thread writes the full block, the remainder stays staged
+        wait_until(lambda: len(self.storage.files[self.path].buffer) < BLOCK_SIZE)
+        with self.storage.files[self.path].write_lock:
+            self.assertEqual(os.path.getsize(self.path + '.part'), BLOCK_SIZE)
+        self.assertEqual(len(self.storage.files[self.path].buffer), 1)
+
+    def test_stop_commits_and_flushes(self):
+        flushed = []
+        self.storage.register_flush(lambda: flushed.append(True))
+        self.storage.append(self.path, b'a;b\n')
+        self.storage.stop()
+        self.assertEqual(read(self.path + '.part'), b'a;b\n')
+        self.assertEqual(flushed, [True])
+        self.storage.thread.join(1.0)
+        self.assertFalse(self.storage.thread.is_alive())
+
+
+class AtomicWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'RunningLog.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_atomic_write(self):
+        atomic_write(self.path, b'old')
+        atomic_write(self.path, b'new')
+        self.assertEqual(read(self.path), b'new')
+        self.assertEqual(os.listdir(self.directory), ['RunningLog.csv'])
+
+    def test_atomic_append(self):
+        atomic_append(self.path, b'a\n')
+        atomic_append(self.path, b'b\n')
+        self.assertEqual(read(self.path), b'a\nb\n')
+        self.assertEqual(os.listdir(self.directory), ['RunningLog.csv'])
+
+
+if __name__ == '__main__':
+    unittest.main()
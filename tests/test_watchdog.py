@@ -0,0 +1,117 @@
+"""
+Watchdog: heartbeat histograms, the stall report of a blocked loop and the feeding of the hardware
+watchdog.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import watchdog  # noqa: E402
+from watchdog import Histogram, Watchdog  # noqa: E402
+
+
+def wait_until(predicate, timeout=2.0):
+    """wait for the supervisor thread"""
+    time_end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > time_end:
+            raise AssertionError('timed out')
+        time.sleep(0.005)
+
+
+class HistogramTest(unittest.TestCase):
+    def test_buckets(self):
+        histogram = Histogram()
+        for seconds in (0.0005, 0.001, 0.0015, 0.3, 45.0):
+            histogram.add(seconds)
+        self.assertEqual(histogram.counts[0], 2)
+        self.assertEqual(histogram.counts[1], 1)
+        self.assertEqual(histogram.counts[8], 1)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.total, 5)
+        self.assertEqual(histogram.max, 45000.0)
+        lines = histogram.format().splitlines()
+        self.assertEqual(lines[0].split(), ['0-1', 'ms', '2', '40.0%'])
+        self.assertEqual(lines[-2].split(), ['>30000', 'ms', '1', '20.0%'])
+        self.assertEqual(Histogram().format(), '  none\n')
+
+
+class WatchdogTest(unittest.TestCase):
+    def setUp(self):
+        self.watchdog = None
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        shutil.rmtree(self.directory)
+
+    def test_stall_report(self):
+        self.watchdog = Watchdog(check_interval=0.01, grace=0.05)
+        event_release = threading.Event()
+        event_done = threading.Event()
+
+        def blocking_loop():
+            self.watchdog.beat('control', 0.01)
+            event_release.wait(5.0)
+            self.watchdog.beat('control', None)
+            event_done.set()
+
+        thread = threading.Thread(target=blocking_loop, name='Control')
+        thread.start()
+        wait_until(lambda: self.watchdog.stall_reports)
+        stall = self.watchdog.stall_reports[0]
+        self.assertEqual(stall.loop, 'control')
+        self.assertIn('wait', stall.blocked_call)
+        self.assertIn('blocking_loop', stall.stacks)
+        self.assertIsNone(stall.duration)
+
+        event_release.set()
+        event_done.wait(2.0)
+        thread.join()
+        self.assertGreater(stall.duration, 0.05)
+        heartbeat = self.watchdog.heartbeats['control']
+        self.assertIsNone(heartbeat.stall)
+        self.assertEqual(heartbeat.overrun.total, 1)
+        self.assertEqual(heartbeat.beats, 2)
+        report = self.watchdog.report()
+        self.assertIn('== control ==\n2 heartbeats, 1 stalls', report)
+        self.assertIn('== stall of control for', report)
+
+    def test_no_deadline_no_stall(self):
+        self.watchdog = Watchdog(check_interval=0.01, grace=0.01)
+        self.watchdog.beat('lifecycle', None)
+        self.watchdog.beat('telemetry', 0.01)
+        self.watchdog.retire('telemetry')
+        time.sleep(0.1)
+        self.assertEqual(self.watchdog.stall_reports, [])
+
+    def test_hardware_watchdog(self):
+        # an ordinary file as device, the timeout ioctl fails and the default is kept
+        device = os.path.join(self.directory, 'watchdog')
+        open(device, 'w').close()
+        self.watchdog = Watchdog(check_interval=0.01, grace=5.0, hardware_device=device)
+        wait_until(lambda: os.path.getsize(device) >= 2)
+        self.watchdog.stop()
+        self.watchdog = None
+        with open(device, 'rb') as fd:
+            data = fd.read()
+        self.assertEqual(data.strip(b'\0'), b'V')
+        self.assertTrue(data.endswith(b'V'))
+
+    def test_disabled(self):
+        self.assertFalse(watchdog.is_enabled())
+        watchdog.beat('lifecycle', 1.0)
+        watchdog.retire('lifecycle')
+        self.assertIsNone(watchdog.write_report(os.path.join(self.directory, 'watchdog.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()
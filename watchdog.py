@@ -0,0 +1,266 @@
+"""
+Watchdog of the control loops.
+
+Every loop announces with each heartbeat when its next heartbeat is due:
+
+    watchdog.beat('lifecycle', timeout)
+
+A supervisor thread checks the heartbeats every `watchdog.checkInterval` seconds. A loop which
+misses its due time by more than `watchdog.grace` seconds is stalled: the stacks of all threads
+are captured and logged at once, the report names the call the loop is blocked in. When the loop
+beats again the stall is closed with its full duration.
+
+For every loop the lateness of the heartbeats (jitter) and the time beyond the grace of the stalls
+(overrun) are collected in histograms, the report is written by write_report() at program end.
+
+Optionally the Linux hardware watchdog (`watchdog.hardwareDevice`, e.g. /dev/watchdog) is fed by
+the supervisor as long as no loop is stalled, a stall which outlasts the hardware timeout resets
+the device. Without setup_watchdog() all functions are no-ops.
+"""
+
+import bisect
+import fcntl
+import io
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+import traceback
+
+# upper bounds of the histogram buckets in milliseconds, the last bucket is unbounded
+HISTOGRAM_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+# stall reports kept for the report at program end
+_MAX_STALL_REPORTS = 20
+# ioctl of linux/watchdog.h
+_WDIOC_SETTIMEOUT = 0xC0045706
+
+_watchdog = None
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        self.total = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        milliseconds = seconds * 1000
+        self.counts[bisect.bisect_left(HISTOGRAM_BOUNDS, milliseconds)] += 1
+        self.total += 1
+        self.max = max(self.max, milliseconds)
+
+    def format(self) -> str:
+        if self.total == 0:
+            return '  none\n'
+        lines = []
+        lower = 0
+        for i, count in enumerate(self.counts):
+            upper = HISTOGRAM_BOUNDS[i] if i < len(HISTOGRAM_BOUNDS) else None
+            if count:
+                label = '{}-{} ms'.format(lower, upper) if upper is not None else '>{} ms'.format(lower)
+                lines.append('  {:>14} {:>8} {:>6.1f}%'.format(label, count, count / self.total * 100))
+            lower = upper
+        lines.append('  {:>14} {:>8.0f}'.format('max ms', self.max))
+        return '\n'.join(lines) + '\n'
+
+
+class Heartbeat:
+    __slots__ = ('name', 'thread_id', 'time_due', 'beats', 'stall', 'jitter', 'overrun')
+
+    def __init__(self, name, thread_id):
+        self.name = name
+        self.thread_id = thread_id
+        # monotonic time of the next heartbeat, None while the loop waits without timeout
+        self.time_due = None
+        self.beats = 0
+        self.stall = None
+        self.jitter = Histogram()
+        self.overrun = Histogram()
+
+
+class StallReport:
+    __slots__ = ('loop', 'time_due', 'blocked_call', 'duration', 'stacks')
+
+    def __init__(self, loop, time_due, blocked_call, stacks):
+        self.loop = loop
+        self.time_due = time_due
+        self.blocked_call = blocked_call
+        # seconds since the due time, set when the loop beats again
+        self.duration = None
+        self.stacks = stacks
+
+
+def _capture_stacks(thread_id):
+    """the innermost call of the thread and the formatted stacks of all threads"""
+    frames = sys._current_frames()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    blocked_call = 'unknown'
+    frame = frames.get(thread_id)
+    if frame is not None:
+        code = frame.f_code
+        blocked_call = '{}:{} {}'.format(os.path.basename(code.co_filename), frame.f_lineno, code.co_name)
+    stacks = []
+    for frame_thread_id, frame in frames.items():
+        if frame_thread_id == threading.get_ident():
+            continue
+        stacks.append('Thread {} ({}):\n{}'.format(names.get(frame_thread_id, '?'), frame_thread_id,
+                                                   ''.join(traceback.format_stack(frame))))
+    return blocked_call, '\n'.join(stacks)
+
+
+class Watchdog:
+    def __init__(self, check_interval=1.0, grace=5.0, hardware_device=None, hardware_timeout=15):
+        self.module_logger = logging.getLogger('DishwasherOS.Watchdog')
+        self.check_interval = check_interval
+        self.grace = grace
+        self.lock = threading.Lock()
+        self.heartbeats = {}
+        self.stall_reports = []
+        self.hardware_fd = None
+        if hardware_device:
+            self._open_hardware_watchdog(hardware_device, hardware_timeout)
+        self.event_stop = threading.Event()
+        self.thread = threading.Thread(target=self._target, name='Watchdog', daemon=True)
+        self.thread.start()
+
+    def _open_hardware_watchdog(self, device, timeout):
+        try:
+            # opening the device arms the hardware watchdog
+            self.hardware_fd = os.open(device, os.O_WRONLY)
+        except OSError:
+            self.module_logger.exception('unable to open the hardware watchdog %s', device)
+            return
+        try:
+            fcntl.ioctl(self.hardware_fd, _WDIOC_SETTIMEOUT, struct.pack('I', int(timeout)))
+        except OSError:
+            self.module_logger.warning('unable to set the timeout of the hardware watchdog, keep the default')
+        self.module_logger.info('feed the hardware watchdog %s', device)
+
+    def beat(self, name, interval=None):
+        """heartbeat of the calling loop, the next one is due in interval seconds (None: no deadline)"""
+        time_now = time.monotonic()
+        with self.lock:
+            heartbeat = self.heartbeats.get(name)
+            if heartbeat is None:
+                heartbeat = self.heartbeats[name] = Heartbeat(name, threading.get_ident())
+            if heartbeat.time_due is not None:
+                # a loop woken up early by an event is not late
+                heartbeat.jitter.add(max(0.0, time_now - heartbeat.time_due))
+            heartbeat.beats += 1
+            stall = heartbeat.stall
+            if stall is not None:
+                heartbeat.stall = None
+                stall.duration = time_now - stall.time_due
+                heartbeat.overrun.add(stall.duration - self.grace)
+            heartbeat.time_due = time_now + interval if interval is not None else None
+        if stall is not None:
+            self.module_logger.warning('loop %s recovered after a stall of %.1fs in %s',
+                                       name, stall.duration, stall.blocked_call)
+
+    def retire(self, name):
+        """the loop has ended, its heartbeats are no longer supervised"""
+        with self.lock:
+            heartbeat = self.heartbeats.get(name)
+            if heartbeat is not None:
+                heartbeat.time_due = None
+
+    def _target(self):
+        while not self.event_stop.wait(self.check_interval):
+            time_now = time.monotonic()
+            is_stalled = False
+            with self.lock:
+                stalled = [heartbeat for heartbeat in self.heartbeats.values()
+                           if heartbeat.time_due is not None and time_now - heartbeat.time_due > self.grace]
+            for heartbeat in stalled:
+                is_stalled = True
+                if heartbeat.stall is None:
+                    self._report_stall(heartbeat, time_now)
+            if self.hardware_fd is not None and not is_stalled:
+                try:
+                    os.write(self.hardware_fd, b'\0')
+                except OSError:
+                    self.module_logger.exception('unable to feed the hardware watchdog')
+
+    def _report_stall(self, heartbeat, time_now):
+        time_due = heartbeat.time_due
+        blocked_call, stacks = _capture_stacks(heartbeat.thread_id)
+        stall = StallReport(heartbeat.name, time_due, blocked_call, stacks)
+        with self.lock:
+            if heartbeat.time_due != time_due:
+                # the loop has beaten in the meantime
+                return
+            heartbeat.stall = stall
+            if len(self.stall_reports) < _MAX_STALL_REPORTS:
+                self.stall_reports.append(stall)
+        self.module_logger.warning('loop %s stalled for more than %.1fs in %s\n%s',
+                                   heartbeat.name, time_now - time_due, blocked_call, stacks)
+
+    def stop(self):
+        self.event_stop.set()
+        self.thread.join()
+        if self.hardware_fd is not None:
+            try:
+                # magic close, disarms the hardware watchdog
+                os.write(self.hardware_fd, b'V')
+            except OSError:
+                pass
+            os.close(self.hardware_fd)
+            self.hardware_fd = None
+
+    def report(self) -> str:
+        """heartbeat histograms of all loops and the stall reports"""
+        out = io.StringIO()
+        with self.lock:
+            out.write('watchdog report, {:.1f}s check interval, {:.1f}s grace\n'.format(self.check_interval,
+                                                                                       self.grace))
+            for heartbeat in self.heartbeats.values():
+                out.write('\n== {} ==\n{} heartbeats, {} stalls\njitter:\n{}overrun:\n{}'.format(
+                    heartbeat.name, heartbeat.beats, heartbeat.overrun.total,
+                    heartbeat.jitter.format(), heartbeat.overrun.format()))
+            for stall in self.stall_reports:
+                duration = 'unfinished' if stall.duration is None else '{:.1f}s'.format(stall.duration)
+                out.write('\n== stall of {} for {} in {} ==\n{}'.format(
+                    stall.loop, duration, stall.blocked_call, stall.stacks))
+        return out.getvalue()
+
+
+def setup_watchdog(swconfig):
+    """start the watchdog if it is enabled in the SoftwareConfig"""
+    global _watchdog
+    if not swconfig.watchdog_enabled:
+        return None
+    _watchdog = Watchdog(swconfig.watchdog_check_interval, swconfig.watchdog_grace,
+                         swconfig.watchdog_hardware_device, swconfig.watchdog_hardware_timeout)
+    return _watchdog
+
+
+def is_enabled() -> bool:
+    return _watchdog is not None
+
+
+def beat(name, interval=None):
+    """heartbeat of a loop, a no-op without watchdog"""
+    if _watchdog is not None:
+        _watchdog.beat(name, interval)
+
+
+def retire(name):
+    if _watchdog is not None:
+        _watchdog.retire(name)
+
+
+def write_report(file_path):
+    """stop the watchdog and write its report, returns the report or None if the watchdog is disabled"""
+    global _watchdog
+    if _watchdog is None:
+        return None
+    _watchdog.stop()
+    report = _watchdog.report()
+    _watchdog = None
+    with open(file_path, 'w', encoding='utf-8') as fd:
+        fd.write(report)
+    return report